@@ -0,0 +1,54 @@
+import numpy as np
+
+"""
+The fixed vocabulary of tea aspects. Every amount of aspects in the game (what a spell adds, what a tea has been given so
+far, what a customer orders) is a NumPy vector with one whole number per aspect, in VOCABULARY order, so adding a cast to
+a tea or checking it against an order is a single vector operation. Vectors are only turned back into names and numbers
+to be drawn.
+"""
+
+VOCABULARY = ("Sweet", "Bitter", "Spice", "Citrus", "Tea", "Herbal", "Mint", "Creamy")
+
+# position of each aspect in a vector
+INDEX = {name: index for index, name in enumerate(VOCABULARY)}
+
+AMOUNT_TYPE = np.int16
+
+
+def zeros():
+    """
+    :return: a new vector with none of any aspect
+    """
+    return np.zeros(len(VOCABULARY), dtype=AMOUNT_TYPE)
+
+
+def vector(amounts):
+    """
+    Make a vector from named amounts.
+
+    :param amounts: A dictionary mapping aspect names to amounts, or a list of (name, amount) pairs
+    :return: a vector with those amounts and 0 of every other aspect
+    :raise ValueError: if a name isn't in VOCABULARY
+    """
+    result = zeros()
+    for name, amount in dict(amounts).items():
+        if name not in INDEX:
+            raise ValueError(f"unknown aspect {name!r}, the aspects are {', '.join(VOCABULARY)}")
+        result[INDEX[name]] = amount
+    return result
+
+
+def items(amounts):
+    """
+    :param amounts: A vector
+    :return: a list of (name, amount) pairs of the aspects it has any of, in VOCABULARY order
+    """
+    return [(VOCABULARY[index], int(amounts[index])) for index in np.flatnonzero(amounts)]
+
+
+def describe(amounts):
+    """
+    :param amounts: A vector
+    :return: the amounts as text, e.g. "Sweet: 1, Bitter: 1"
+    """
+    return ", ".join(f"{name}: {amount}" for name, amount in items(amounts))
@@ -0,0 +1,92 @@
+import argparse
+import hashlib
+import json
+import os
+
+import pygame
+import assets
+
+"""
+Offline bake of the scaled image variants the game draws, so the runtime can load them directly instead of decoding the
+full size source and scaling it every time.
+
+Each variant is written to assets.BAKE_DIR under a name made from the source file's SHA-1 and the target size, and
+listed in the bake manifest together with the source's hash, size and modification time. Running the bake again only
+redoes variants whose source changed and deletes baked files nothing refers to any more.
+
+Run with `python asset_bake.py`, before `python asset_pack.py` if you ship a pack.
+"""
+
+GLYPH_DIR = "Spell_Assets/Spell Glyphs"
+
+# (path, size, alpha mode) of every scaled image the game asks the asset registry for
+VARIANTS = [
+    ("Spell_Assets/Magic_Bg.jpg", (1280, 720), assets.OPAQUE),
+    ("Spell_Assets/Spellbook_Transparent.png", (800, 500), assets.PREMULTIPLIED),
+    ("Spell_Assets/Teacup.png", (120, 120), assets.PREMULTIPLIED),
+    ("Spell_Assets/GoldStar.png", (24, 24), assets.PREMULTIPLIED),
+    ("Spell_Assets/RedX.png", (32, 32), assets.PREMULTIPLIED),
+    ("images/textBubble.png", (600, 350), assets.PREMULTIPLIED),
+] + [
+    (f"{GLYPH_DIR}/{name}", (160, 160), assets.PREMULTIPLIED) for name in sorted(os.listdir(GLYPH_DIR))
+    if name.endswith(".png")
+]
+
+
+def bake(variants):
+    """
+    Write every variant that is missing or out of date, then drop the baked files of variants that went away.
+
+    :param variants: A list of (path, size, alpha mode) tuples
+    :return: a tuple of (number of variants baked, number reused, number of stale files removed)
+    """
+    os.makedirs(assets.BAKE_DIR, exist_ok=True)
+    try:
+        with open(assets.BAKE_MANIFEST) as file:
+            old_manifest = json.load(file)
+    except (OSError, ValueError):
+        old_manifest = {}
+
+    manifest = {}
+    baked = reused = 0
+    for path, size, alpha in variants:
+        key = assets.variant_key(path, size, alpha)
+        with open(path, "rb") as file:
+            sha1 = hashlib.sha1(file.read()).hexdigest()  # always hash the loose file, never a possibly older pack
+        name = f"{sha1[:16]}_{size[0]}x{size[1]}_{alpha}.png"
+        output = f"{assets.BAKE_DIR}/{name}"
+
+        old = old_manifest.get(key)
+        if old is not None and old["sha1"] == sha1 and os.path.exists(output):
+            reused += 1
+        else:
+            surface = assets.prepare_surface(pygame.image.load(path), size, alpha)
+            pygame.image.save(surface, output)
+            baked += 1
+
+        stat = os.stat(path)
+        manifest[key] = {"file": output, "sha1": sha1, "mtime_ns": stat.st_mtime_ns, "bytes": stat.st_size}
+
+    # anything in the bake folder the new manifest does not point at was made from an old version of a source
+    keep = {entry["file"] for entry in manifest.values()} | {assets.BAKE_MANIFEST}
+    removed = 0
+    for name in os.listdir(assets.BAKE_DIR):
+        if f"{assets.BAKE_DIR}/{name}" not in keep:
+            os.remove(f"{assets.BAKE_DIR}/{name}")
+            removed += 1
+
+    with open(assets.BAKE_MANIFEST, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    return baked, reused, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake the scaled image variants the game uses.")
+    parser.parse_args()
+
+    baked, reused, removed = bake(VARIANTS)
+    print(f"baked {baked} variants, {reused} up to date, removed {removed} stale files")
+
+
+if __name__ == "__main__":
+    main()
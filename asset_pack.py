@@ -0,0 +1,168 @@
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+
+"""
+Packs every game asset into a single archive file so a cold start opens one file instead of ~50.
+
+The archive starts with an 8 byte magic string and the length of a JSON index, followed by the index itself and the
+file contents. The index maps each asset path (spelled exactly like the game spells it) to its offset, size, format
+and SHA-1. At runtime the archive is memory-mapped and each asset is read straight out of the mapping.
+
+Build it with `python asset_pack.py`.
+"""
+
+MAGIC = b"TEAPACK1"
+HEADER = struct.Struct("<8sI")  # magic, index length in bytes
+ALIGNMENT = 16  # every file starts on a 16 byte boundary
+
+# the archive the game looks for next to main.py
+PACK_PATH = "assets.pack"
+
+
+class AssetPack:
+    def __init__(self, path):
+        """
+        The AssetPack class gives read access to a packed archive. The file is memory-mapped once and every asset is
+        served as a slice of that mapping, so nothing is copied until pygame actually reads it.
+
+        :param path: The path of the archive file
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, index_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a teashop asset pack")
+        self.index = json.loads(bytes(self._view[HEADER.size:HEADER.size + index_size]))
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def open(self, path):
+        """
+        Open a packed asset for reading.
+
+        :param path: The asset path, e.g. "images/zhao0.png"
+        :return: a read-only, seekable file object over the asset's bytes
+        """
+        entry = self.index[path]
+        return SliceReader(self._view[entry["offset"]:entry["offset"] + entry["size"]])
+
+    def sha1(self, path):
+        return self.index[path]["sha1"]
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+
+class SliceReader(io.RawIOBase):
+    def __init__(self, view):
+        """
+        A minimal file object over a memoryview. pygame only ever asks it for small chunks, so the asset is copied
+        chunk by chunk straight into the decoder instead of being copied into a bytes object first.
+
+        :param view: A memoryview of the asset's bytes
+        """
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._view) + offset
+        self._pos = max(0, min(self._pos, len(self._view)))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def build_pack(output, paths):
+    """
+    Write every file in paths into a new archive.
+
+    :param output: The path of the archive to write
+    :param paths: A list of asset paths
+    :return: the index that was written
+    """
+    contents = []
+    for path in paths:
+        with open(path, "rb") as file:
+            contents.append(file.read())
+
+    # the index holds the offsets, which depend on the size of the index, so lay it out until it stops growing
+    index = {}
+    data_start = 0
+    while True:
+        offset = data_start
+        for path, data in zip(paths, contents):
+            index[path] = {
+                "offset": offset,
+                "size": len(data),
+                "format": os.path.splitext(path)[1][1:].lower(),
+                "sha1": hashlib.sha1(data).hexdigest(),
+            }
+            offset = _align(offset + len(data))
+        index_bytes = json.dumps(index, sort_keys=True).encode("utf-8")
+        if _align(HEADER.size + len(index_bytes)) == data_start:
+            break
+        data_start = _align(HEADER.size + len(index_bytes))
+
+    # write to a temporary file first so a running game never sees a half written archive
+    temp = output + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(index_bytes)))
+        file.write(index_bytes)
+        for path, data in zip(paths, contents):
+            file.write(b"\0" * (index[path]["offset"] - file.tell()))
+            file.write(data)
+    os.replace(temp, output)
+    return index
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def main():
+    import assets
+
+    parser = argparse.ArgumentParser(description="Pack every game asset into a single archive.")
+    parser.add_argument("--output", default=PACK_PATH, help="where to write the archive")
+    args = parser.parse_args()
+
+    paths = assets.asset_files()
+    if os.path.exists(assets.BAKE_MANIFEST):
+        # ship the baked variants too, so the pack holds everything the game loads
+        paths += assets.asset_files((assets.BAKE_DIR,)) + [assets.BAKE_MANIFEST]
+    index = build_pack(args.output, paths)
+    total = sum(entry["size"] for entry in index.values())
+    print(f"packed {len(index)} files ({total / 1e6:.1f} MB) into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import pygame
+import asset_pack
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Shared asset registry for the teashop, the spellbook minigame and the spell caster.
+Every image, font and sound is loaded through here so that it is only read from disk and decoded once per process.
+"""
+
+# alpha modes for images: ALPHA keeps per-pixel transparency, OPAQUE drops it for faster blits, PREMULTIPLIED keeps
+# transparency with the colours already multiplied by alpha; blit those with special_flags=pygame.BLEND_PREMULTIPLIED
+ALPHA = "alpha"
+OPAQUE = "opaque"
+PREMULTIPLIED = "premul"
+
+# the folders that hold every asset the game ships with
+ASSET_ROOTS = ("Spell_Assets", "images", "sounds")
+
+# file extensions we know how to load, grouped by kind
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+SOUND_EXTENSIONS = (".mp3", ".ogg", ".wav")
+FONT_EXTENSIONS = (".ttf", ".otf")
+
+# long tracks played through pygame.mixer.music; these are streamed, so we only keep their bytes in memory
+MUSIC_FILES = ("sounds/startBGM.mp3", "sounds/doorBell.mp3", "Spell_Assets/spell_background.mp3")
+
+# set TEASHOP_LOOSE_ASSETS=1 to ignore a built asset pack and read the loose files while editing assets
+LOOSE_ASSETS = os.environ.get("TEASHOP_LOOSE_ASSETS") == "1"
+
+# where match_sysfont() remembers which file each system font name resolved to
+FONT_CACHE = ".font_cache.json"
+
+# pre-scaled image variants written by asset_bake.py, and the manifest describing which source each was made from
+BAKE_DIR = "baked"
+BAKE_MANIFEST = BAKE_DIR + "/manifest.json"
+
+
+class AssetCache:
+    def __init__(self, max_entries=None):
+        """
+        The AssetCache class memoizes loaded assets. Each lookup is keyed on the kind of asset, its path and the options
+        used to prepare it (target size and alpha mode for images, point size for fonts), so two callers asking for the
+        same thing share one object.
+
+        :param max_entries: The number of assets to keep before the least recently used one is dropped, None for no limit
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # futures for files that a Preloader is decoding in the background, keyed by path
+        self._pending = {}
+        # raw file contents that were preloaded, for fonts and music which pygame reads from a file object
+        self._raw = {}
+        # keeps the current music stream alive while pygame.mixer.music is reading from it
+        self._music_stream = None
+
+    def _lookup(self, key, loader):
+        """
+        Return the cached value for key, calling loader() to create it on a miss.
+
+        :param key: A hashable key describing the asset
+        :param loader: A function with no arguments that loads the asset
+        :return: the cached asset
+        """
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)  # mark as most recently used
+            return self._entries[key]
+
+        self.misses += 1
+        value = loader()
+        self._entries[key] = value
+        self._trim()
+        return value
+
+    def _trim(self):
+        # drop the least recently used entries until we are back under the limit
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def image(self, path, size=None, alpha=ALPHA):
+        """
+        Load an image, convert it to the display's pixel format and optionally scale it.
+
+        :param path: The path of the image file
+        :param size: A (width, height) tuple to scale the image to, or None to keep its original size
+        :param alpha: ALPHA to keep transparency (convert_alpha()), OPAQUE to drop it (convert()), PREMULTIPLIED to
+                      keep transparency with premultiplied colours
+        :return: a pygame Surface
+        """
+        size = tuple(size) if size else None
+        if pygame.display.get_surface() is None:
+            # without a display we cannot convert, so hand back a plain surface and don't cache it
+            return prepare_surface(self._decode(path, _load_image), size, alpha)
+        return self._lookup(("image", path, size, alpha), lambda: self._load_variant(path, size, alpha))
+
+    def _load_variant(self, path, size, alpha):
+        """
+        Load a scaled image variant, using the baked copy when there is an up to date one so we skip decoding the
+        full size source and scaling it.
+
+        :param path: The path of the source image
+        :param size: A (width, height) tuple or None
+        :param alpha: ALPHA, OPAQUE or PREMULTIPLIED
+        :return: the prepared Surface
+        """
+        baked = baked_variant(path, size, alpha)
+        if baked is not None:
+            surface = self._decode(baked, _load_image)
+            return surface.convert() if alpha == OPAQUE else surface.convert_alpha()
+        return prepare_surface(self._decode(path, _load_image), size, alpha)
+
+    def font(self, path, size):
+        """
+        Load a font file at a given point size.
+
+        :param path: The path of the .ttf file
+        :param size: The point size of the font
+        :return: a pygame Font
+        """
+        def load():
+            if path in self._pending:
+                self._raw[path] = self._pending.pop(path).result()
+            if path in self._raw:
+                return pygame.font.Font(io.BytesIO(self._raw[path]), size)
+            return pygame.font.Font(open_asset(path), size)
+
+        _start_font()
+        return self._lookup(("font", path, size), load)
+
+    def sysfont(self, name, size):
+        """
+        Load a system font by name at a given point size. The font file is looked up through match_sysfont(), which
+        remembers the answer on disk instead of scanning the system font list on every start.
+
+        :param name: The system font name, e.g. "arial"
+        :param size: The point size of the font
+        :return: a pygame Font
+        """
+        _start_font()
+        return self._lookup(("sysfont", name, size), lambda: pygame.font.Font(match_sysfont(name), size))
+
+    def sound(self, path):
+        """
+        Load a sound effect.
+
+        :param path: The path of the sound file
+        :return: a pygame Sound
+        """
+        _start_mixer()
+        return self._lookup(("sound", path), lambda: self._decode(path, _load_sound))
+
+    def music(self, path):
+        """
+        Load a music track into pygame.mixer.music, streaming it from memory if it was preloaded.
+
+        :param path: The path of the music file
+        :return: None
+        """
+        _start_mixer()
+        if path in self._pending:
+            self._raw[path] = self._pending.pop(path).result()
+        self._music_stream = io.BytesIO(self._raw[path]) if path in self._raw else open_asset(path)
+        pygame.mixer.music.load(self._music_stream, os.path.splitext(path)[1][1:])
+
+    def _decode(self, path, loader):
+        """
+        Return the decoded file at path, using the result of a background preload if there is one.
+
+        :param path: The path of the file
+        :param loader: The function that decodes the file when it was not preloaded
+        :return: the decoded asset
+        """
+        if path in self._pending:
+            # hand the decoded copy over to the cache; it is prepared once and then not needed any more
+            return self._pending.pop(path).result()
+        return loader(path)
+
+    def evict(self, path):
+        """
+        Forget every cached variant of one file, along with anything preloaded for it.
+
+        :param path: The path of the file
+        :return: None
+        """
+        for key in [key for key in self._entries if key[1] == path]:
+            del self._entries[key]
+        self._pending.pop(path, None)
+        self._raw.pop(path, None)
+
+    def set_max_entries(self, max_entries):
+        """
+        Change the size limit of the cache, dropping the least recently used entries if it is now over the limit.
+
+        :param max_entries: The new limit, or None for no limit
+        :return: None
+        """
+        self.max_entries = max_entries
+        self._trim()
+
+    def clear(self):
+        """
+        Forget every cached asset and reset the counters.
+
+        :return: None
+        """
+        self._entries.clear()
+        self._pending.clear()
+        self._raw.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of hits, misses and currently cached entries
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class Preloader:
+    def __init__(self, cache, paths, workers=None):
+        """
+        The Preloader class decodes a list of asset files on a pool of worker threads so the main loop can keep drawing.
+        Decoded files are handed to the cache, which converts and scales them on the main thread the first time they are
+        asked for. Asking for a file that is still being decoded simply waits for that one file.
+
+        :param cache: The AssetCache that receives the decoded files
+        :param paths: A list of asset paths to decode
+        :param workers: The number of worker threads, None to let ThreadPoolExecutor decide
+        """
+        self.cache = cache
+        self.paths = list(paths)
+        self.workers = workers
+        self._futures = []
+
+    def start(self):
+        """
+        Submit every file to the worker pool. Files the cache has already loaded are skipped.
+
+        :return: None
+        """
+        if any(_is_decodable(path) and not path.lower().endswith(IMAGE_EXTENSIONS) for path in self.paths):
+            _start_mixer()  # sounds can only be decoded once the mixer is running
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preload")
+        loaded = {key[1] for key in self.cache._entries}
+        for path in self.paths:
+            if path in loaded or path in self.cache._pending or path in self.cache._raw:
+                continue
+            if is_packed(path) and not _is_decodable(path):
+                continue  # fonts and music are read straight out of the mapped pack, there is nothing to do ahead
+            future = executor.submit(_decode_file, path)
+            self.cache._pending[path] = future
+            self._futures.append(future)
+        # let the workers finish the queue on their own, we never wait on the pool itself
+        executor.shutdown(wait=False)
+
+    @property
+    def total(self):
+        return len(self._futures)
+
+    @property
+    def done(self):
+        return sum(1 for future in self._futures if future.done())
+
+    @property
+    def progress(self):
+        """
+        :return: the fraction of files decoded so far, from 0.0 to 1.0
+        """
+        return self.done / self.total if self._futures else 1.0
+
+    @property
+    def finished(self):
+        return all(future.done() for future in self._futures)
+
+    def wait(self):
+        """
+        Block until every file has been decoded.
+
+        :return: None
+        """
+        for future in self._futures:
+            future.result()
+
+
+def _decode_file(path):
+    """
+    Decode one asset file on a worker thread. Images become surfaces and sound effects become Sounds; fonts and
+    music are kept as bytes because pygame reads them lazily from a file object.
+
+    :param path: The path of the asset
+    :return: the decoded asset
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return _load_image(path)
+    if _is_decodable(path):
+        return _load_sound(path)
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def _is_decodable(path):
+    # images and sound effects get decoded ahead of time, fonts and streamed music do not
+    extension = os.path.splitext(path)[1].lower()
+    return extension in IMAGE_EXTENSIONS or (extension in SOUND_EXTENSIONS and path not in MUSIC_FILES)
+
+
+def _load_image(path):
+    return pygame.image.load(open_asset(path), path)
+
+
+def _load_sound(path):
+    return pygame.mixer.Sound(open_asset(path))
+
+
+def _start_font():
+    # the font module is only started once something actually needs a font
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+
+def _start_mixer():
+    # the mixer is the slowest subsystem to open, so it is only started once something actually needs a sound
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+
+
+_font_paths = None
+_missing_fonts = set()  # fonts not found this run; not saved, so a font installed later is found on the next start
+
+
+def match_sysfont(name):
+    """
+    Find the file of a system font. pygame.font.SysFont() scans every installed font the first time it is used,
+    which is slow on a fresh machine, so the path is saved in FONT_CACHE and reused on later starts.
+
+    :param name: The system font name, e.g. "timesnewroman"
+    :return: the path of the font file, or None to use pygame's default font
+    """
+    global _font_paths
+    if _font_paths is None:
+        try:
+            with open(FONT_CACHE) as file:
+                # only found paths are kept; older caches also saved the misses
+                _font_paths = {font: path for font, path in json.load(file).items() if path}
+        except (OSError, ValueError, AttributeError):
+            _font_paths = {}
+
+    if name in _missing_fonts:
+        return None
+    path = _font_paths.get(name)
+    if path is None or not os.path.exists(path):
+        # never looked up, or the font was uninstalled since
+        path = pygame.font.match_font(name)
+        if path is None:
+            _missing_fonts.add(name)
+            if _font_paths.pop(name, None) is None:
+                return None  # nothing saved for it, so FONT_CACHE is already right
+        else:
+            _font_paths[name] = path
+        try:
+            with open(FONT_CACHE, "w") as file:
+                json.dump(_font_paths, file, indent=1)
+        except OSError:
+            pass  # a read-only install just looks the font up again next time
+    return path
+
+
+_pack = None
+_pack_checked = False
+_pack_lock = threading.Lock()  # the Preloader's threads ask for the pack at the same time as the main thread
+
+
+def get_pack():
+    """
+    Open the asset pack the first time it is needed. Safe to call from the Preloader's threads: every caller waits
+    until the pack is open, so none of them falls back to loose files while another is still opening it.
+
+    :return: the AssetPack, or None when there is no pack (or LOOSE_ASSETS is set) and loose files should be used
+    """
+    global _pack, _pack_checked
+    if not _pack_checked:
+        with _pack_lock:
+            if not _pack_checked:
+                if not LOOSE_ASSETS and os.path.exists(asset_pack.PACK_PATH):
+                    _pack = asset_pack.AssetPack(asset_pack.PACK_PATH)
+                _pack_checked = True  # only once _pack is set, so a caller that sees it checked also sees the pack
+    return _pack
+
+
+def is_packed(path):
+    pack = get_pack()
+    return pack is not None and path in pack
+
+
+def open_asset(path):
+    """
+    Find an asset either in the pack or on disk.
+
+    :param path: The asset path, e.g. "images/zhao0.png"
+    :return: a file object reading the asset out of the pack, or the path itself when it is a loose file
+    """
+    if is_packed(path):
+        return get_pack().open(path)
+    return path
+
+
+def asset_files(roots=ASSET_ROOTS):
+    """
+    List every loadable asset file below the given folders.
+
+    :param roots: A tuple of folder paths
+    :return: a sorted list of paths using forward slashes, the same way the game spells them
+    """
+    extensions = IMAGE_EXTENSIONS + SOUND_EXTENSIONS + FONT_EXTENSIONS
+    paths = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]  # skip editor folders like .idea
+            for name in filenames:
+                if name.lower().endswith(extensions):
+                    paths.append(os.path.join(dirpath, name).replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def prepare_surface(surface, size, alpha):
+    """
+    Convert a freshly loaded surface to the display format (when there is a display), scale it and premultiply it.
+    asset_bake.py uses this too, so baked variants are exactly what the game would have made itself.
+
+    :param surface: The loaded pygame Surface
+    :param size: A (width, height) tuple or None
+    :param alpha: ALPHA, OPAQUE or PREMULTIPLIED
+    :return: the prepared Surface
+    """
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert() if alpha == OPAQUE else surface.convert_alpha()
+    if size:
+        surface = pygame.transform.scale(surface, size)
+    if alpha == PREMULTIPLIED:
+        surface = surface.premul_alpha()
+    return surface
+
+
+def variant_key(path, size, alpha):
+    """
+    :return: the key of an image variant in the bake manifest, e.g. "Spell_Assets/Teacup.png|120x120|premul"
+    """
+    return f"{path}|{size[0]}x{size[1]}|{alpha}"
+
+
+def file_sha1(path):
+    """
+    :return: the SHA-1 hex digest of an asset, taken from the pack index when the asset is packed
+    """
+    if is_packed(path):
+        return get_pack().sha1(path)
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+_manifest = None
+
+
+def bake_manifest():
+    """
+    Read the bake manifest the first time it is needed.
+
+    :return: a dictionary mapping variant keys to their baked file, or an empty one when nothing has been baked
+    """
+    global _manifest
+    if _manifest is None:
+        _manifest = {}
+        source = open_asset(BAKE_MANIFEST)
+        if not isinstance(source, str) or os.path.exists(source):
+            with (open(source, "rb") if isinstance(source, str) else source) as file:
+                _manifest = json.loads(file.read())
+    return _manifest
+
+
+def baked_variant(path, size, alpha):
+    """
+    Find the baked copy of an image variant. A baked copy is only used while its source is unchanged: the source's
+    size and modification time are compared to the manifest first, and if those differ the source is hashed, so an
+    edited source always falls back to decoding and scaling it at runtime until the bake is run again.
+
+    :param path: The path of the source image
+    :param size: A (width, height) tuple or None
+    :param alpha: ALPHA, OPAQUE or PREMULTIPLIED
+    :return: the path of the baked image, or None when there is no up to date one
+    """
+    if size is None:
+        return None
+    entry = bake_manifest().get(variant_key(path, size, alpha))
+    if entry is None or not bake_is_fresh(path, entry):
+        return None
+    return entry["file"]
+
+
+def bake_is_fresh(path, entry):
+    """
+    :param path: The path of the source image
+    :param entry: The source's entry in the bake manifest
+    :return: whether the baked file exists and was made from the source as it is now
+    """
+    if is_packed(path):
+        fresh = get_pack().sha1(path) == entry["sha1"]
+    else:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        fresh = (stat.st_mtime_ns, stat.st_size) == (entry["mtime_ns"], entry["bytes"]) or file_sha1(path) == entry["sha1"]
+    return fresh and (is_packed(entry["file"]) or os.path.exists(entry["file"]))
+
+
+# the registry shared by every module in the game
+cache = AssetCache()
+
+
+def image(path, size=None, alpha=ALPHA):
+    return cache.image(path, size, alpha)
+
+
+def font(path, size):
+    return cache.font(path, size)
+
+
+def sysfont(name, size):
+    return cache.sysfont(name, size)
+
+
+def sound(path):
+    return cache.sound(path)
+
+
+def music(path):
+    cache.music(path)
+
+
+def preload(paths=None, workers=None, exclude=()):
+    """
+    Start decoding assets in the background on the shared cache.
+
+    :param paths: A list of asset paths, or None for every file in the pack (or under ASSET_ROOTS without one)
+    :param workers: The number of worker threads
+    :param exclude: Paths to leave out, for assets that are loaded on demand instead
+    :return: the running Preloader
+    """
+    if paths is None:
+        paths = sorted(get_pack().index) if get_pack() is not None else asset_files()
+        # sources that were baked are only ever drawn scaled, so decode their small baked copies instead; a source
+        # with a stale bake is decoded itself, since baked_variant() will turn its baked copy down
+        manifest = bake_manifest()
+        fresh = {key: bake_is_fresh(key.split("|")[0], entry) for key, entry in manifest.items()}
+        baked_sources = {key.split("|")[0] for key in manifest}
+        stale_sources = {key.split("|")[0] for key in manifest if not fresh[key]}
+        baked_files = {entry["file"] for entry in manifest.values()}
+        fresh_files = sorted({manifest[key]["file"] for key in manifest if fresh[key]})
+        paths = [path for path in paths
+                 if (path not in baked_sources or path in stale_sources) and path not in baked_files] + fresh_files
+    preloader = Preloader(cache, [path for path in paths if path not in exclude], workers)
+    preloader.start()
+    return preloader
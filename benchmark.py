@@ -0,0 +1,28 @@
+import argparse
+import time
+
+# taken before pygame and the game are imported, so startup timings include the imports
+PROCESS_START = time.perf_counter()
+
+from benchmarks import casting, grading, loading, scenes, screens, soak
+
+"""
+Timing reports for the teashop. Run with `python benchmark.py <report>`; see `python benchmark.py --help` for the
+reports and `python benchmark.py <report> --help` for each one's options. The reports themselves live in the
+benchmarks package, one module per part of the game.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timing reports for the teashop.")
+    reports = parser.add_subparsers(dest="report", required=True, metavar="report", help="which timing report to run")
+    for module in (loading, screens, casting, scenes, soak, grading):
+        module.add_reports(reports)
+    # the fresh process loading.startup() times; not listed in --help
+    reports.add_parser("_startup-child").set_defaults(run=lambda args: loading.startup_child(PROCESS_START))
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
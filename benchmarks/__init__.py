@@ -0,0 +1,20 @@
+import os
+
+"""
+The timing reports of benchmark.py. Each module measures one part of the game and registers its reports, with their
+options, as subcommands of `python benchmark.py`:
+
+runners: what every report shares: stopping a game loop, clocks that time its frames and printing timings
+loading: how long the game and the spellbook take to open (minigame-entry, catalog, startup)
+screens: the main loop's static screens and the spellbook (idle-cpu, spellbook)
+casting: the parts of a cast on their own (particles, hit-test)
+scenes: every scene's frame time against a saved baseline (scenes)
+soak: endless mode over thousands of customers (soak)
+grading: the batch scorer against main.valueCheck() (scoring)
+
+A new report goes in the module it measures, or a new one, with an add_reports() that benchmark.py calls.
+"""
+
+# run offscreen unless the caller asked for a real window; set before any report imports pygame
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
@@ -0,0 +1,123 @@
+import time
+import pygame
+import assets
+from benchmarks import runners
+
+"""
+The parts of a cast on their own: drawing the particles of its effects, and finding the nodes the mouse passed over.
+"""
+
+
+def particle_frames(count, frames):
+    """
+    Compare the frame time of count fading gold stars drawn by a ParticleSystem against drawing each star from its own
+    faded copy, the way cast_spell used to.
+
+    :param count: The number of particles
+    :param frames: The number of frames to time
+    :return: a dictionary mapping the case name to a list of frame timings in seconds
+    """
+    import random
+    import main
+    import particles
+
+    main.startup()
+    screen = main.mainScreen
+    background = assets.image("Spell_Assets/Magic_Bg.jpg", screen.get_size(), assets.OPAQUE)
+    star = assets.image("Spell_Assets/GoldStar.png", (24, 24), assets.PREMULTIPLIED)
+    width, height = screen.get_size()
+    random.seed(0)
+    positions = [(random.uniform(0, width), random.uniform(0, height)) for _ in range(count)]
+    velocities = [(0, -random.uniform(0.5, 1.5)) for _ in range(count)]
+    delays = [random.randint(0, 30) for _ in range(count)]
+    timings = {"particle system": [], "copy per star": []}
+
+    system = particles.ParticleSystem(star)
+    system.emit(positions, velocities, delays, fade=1)
+    for _ in range(frames):
+        start = time.perf_counter()
+        screen.blit(background, (0, 0))
+        system.update()
+        system.draw(screen)
+        timings["particle system"].append(time.perf_counter() - start)
+
+    effects = [{"pos": list(pos), "vy": vy, "spawn_delay": delay, "alpha": 255} for pos, (_, vy), delay in zip(positions, velocities, delays)]
+    for _ in range(frames):
+        start = time.perf_counter()
+        screen.blit(background, (0, 0))
+        for e in effects:
+            if e["spawn_delay"] > 0:
+                e["spawn_delay"] -= 1
+                continue
+            e["pos"][1] += e["vy"]
+            e["alpha"] = max(e["alpha"] - 1, 0)
+            if e["alpha"] <= 0:
+                continue
+            star_surf = star.copy()
+            star_surf.fill((e["alpha"],) * 4, special_flags=pygame.BLEND_RGBA_MULT)
+            screen.blit(star_surf, (e["pos"][0] - 12, e["pos"][1] - 12), special_flags=pygame.BLEND_PREMULTIPLIED)
+        timings["copy per star"].append(time.perf_counter() - start)
+    return timings
+
+
+def hit_test(frames):
+    """
+    Measure how long finding the entered nodes takes per frame, for a mouse that moves through 8 motion events a frame,
+    with the NodeGrid and with a scan over every node, for spells with 12 and 500 nodes.
+
+    :param frames: The number of frames to time
+    :return: a dictionary mapping the case name to a list of per-frame timings in seconds
+    """
+    import random
+    from spellcaster import SpellNode, NodeGrid
+
+    random.seed(0)
+    timings = {}
+    for count in (12, 500):
+        nodes = [SpellNode((random.randint(0, 1280), random.randint(0, 720)), i) for i in range(count)]
+        grid = NodeGrid(nodes)
+        paths = []
+        for _ in range(frames):
+            x, y = random.uniform(0, 1280), random.uniform(0, 720)
+            path = [(x, y)]
+            for _ in range(8):
+                x, y = x + random.uniform(-40, 40), y + random.uniform(-40, 40)
+                path.append((x, y))
+            paths.append(path)
+
+        timings[f"grid, {count} nodes"] = []
+        for path in paths:
+            start = time.perf_counter()
+            for a, b in zip(path, path[1:]):
+                grid.crossed(a, b)
+            timings[f"grid, {count} nodes"].append(time.perf_counter() - start)
+
+        # what cast_spell used to do, once per motion event instead of once per frame
+        timings[f"scan, {count} nodes"] = []
+        for path in paths:
+            start = time.perf_counter()
+            for point in path[1:]:
+                for n in nodes:
+                    if n.is_hover(point):
+                        break
+            timings[f"scan, {count} nodes"].append(time.perf_counter() - start)
+    return timings
+
+
+def add_reports(reports):
+    report = reports.add_parser("particles", help="fading particles drawn by a ParticleSystem and one copy at a time")
+    report.add_argument("--particles", type=int, default=5000, help="how many particles to draw")
+    report.add_argument("--frames", type=int, default=240, help="how many frames to time")
+    report.set_defaults(run=report_particles)
+
+    report = reports.add_parser("hit-test", help="finding the nodes the mouse passed over, with the grid and a scan")
+    report.add_argument("--frames", type=int, default=600, help="how many frames to time")
+    report.set_defaults(run=report_hit_test)
+
+
+def report_particles(args):
+    runners.print_timings(f"{args.particles} fading particles, frame time", particle_frames(args.particles, args.frames))
+
+
+def report_hit_test(args):
+    runners.print_timings("hit-testing 8 mouse movements per frame", hit_test(args.frames))
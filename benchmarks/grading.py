@@ -0,0 +1,113 @@
+import statistics
+import sys
+import time
+from benchmarks import runners
+
+"""
+The batch scorer (scoring.grade()) against main.valueCheck(): first that they agree on every pair, including amounts at
+the edge of what the packed comparison handles, then how many pairs a second each grades.
+"""
+
+
+def scoring_parity(count=300, seed=0):
+    """
+    Grade random formulations against random orders with scoring.grade() and with main.valueCheck() one pair at a time,
+    and find every pair where they disagree. The amounts include 0s and values on both sides of the order, so every
+    grade and every edge between them comes up, and amounts at the edge of what fits in a packed byte (127 and 128).
+
+    :param count: The number of formulations and of orders, so count * count pairs are checked on each path
+    :param seed: The seed for the random amounts
+    :return: a tuple of (a dictionary mapping each grade name to how often it came up, a list of mismatched
+             (formulation, order, batch grade, valueCheck grade))
+    """
+    import numpy as np
+    import main
+    import scoring
+
+    rng = np.random.default_rng(seed)
+    formulations, orders = _random_amounts(rng, count), _random_amounts(rng, count)
+    counts = {}
+    mismatches = []
+    # the amounts as they are take the packed path; multiplied up they no longer fit in a byte and take the other one.
+    # Raised to the top of a byte they still take the packed path, where a borrow between bytes would show, and one
+    # past it they don't
+    edge = scoring.PACKED_MAX - 3
+    cases = [(formulations.astype(np.int32) * scale, orders.astype(np.int32) * scale) for scale in (1, 1000)]
+    for extra in (0, 1):
+        raised = [amounts.astype(np.int32) + (amounts > 0) * (edge + extra) for amounts in (formulations, orders)]
+        cases.append(tuple(raised))
+    for scaled_formulations, scaled_orders in cases:
+        batch = scoring.grade(scaled_formulations, scaled_orders)
+        for i, formulation in enumerate(scaled_formulations):
+            for j, order in enumerate(scaled_orders):
+                expected = main.valueCheck(order, formulation)
+                counts[expected] = counts.get(expected, 0) + 1
+                if scoring.GRADES[batch[i, j]] != expected:
+                    mismatches.append((formulation.tolist(), order.tolist(), scoring.GRADES[batch[i, j]], expected))
+    return counts, mismatches
+
+
+def _random_amounts(rng, count):
+    # aspect vectors with about half the aspects at 0 and the rest from 1 to 3
+    import aspects
+    amounts = rng.integers(1, 4, size=(count, len(aspects.VOCABULARY)), dtype=aspects.AMOUNT_TYPE)
+    amounts[rng.random(amounts.shape) < 0.5] = 0
+    return amounts
+
+
+def scoring_throughput(pairs, repeats):
+    """
+    Time scoring.grade() on about pairs formulation/order pairs (1000 orders, pairs / 1000 formulations), and
+    main.valueCheck() on a sample of them for comparison.
+
+    :param pairs: The number of pairs to grade per repeat
+    :param repeats: The number of times to grade them
+    :return: the number of pairs, and a dictionary mapping the case name to a list of timings in seconds, each for
+             all the pairs
+    """
+    import numpy as np
+    import main
+    import scoring
+
+    rng = np.random.default_rng(1)
+    orders = _random_amounts(rng, 1000)
+    formulations = _random_amounts(rng, max(pairs // len(orders), 1))
+    total = len(formulations) * len(orders)
+    timings = {"batch": [], "batch, unpacked": [], "valueCheck": []}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        scoring.grade(formulations, orders)
+        timings["batch"].append(time.perf_counter() - start)
+
+        # amounts that don't fit in a byte take the aspect by aspect path
+        start = time.perf_counter()
+        scoring.grade(formulations.astype(np.int32) * 2 ** 10, orders.astype(np.int32) * 2 ** 10)
+        timings["batch, unpacked"].append(time.perf_counter() - start)
+
+        # a pair at a time is far too slow for all of them, so time 10000 and scale up
+        sample = 10000
+        start = time.perf_counter()
+        for k in range(sample):
+            main.valueCheck(orders[k % len(orders)], formulations[k % len(formulations)])
+        timings["valueCheck"].append((time.perf_counter() - start) * total / sample)
+    return total, timings
+
+
+def add_reports(reports):
+    report = reports.add_parser("scoring", help="the batch scorer's parity with valueCheck, then its throughput")
+    report.add_argument("--pairs", type=int, default=10 ** 7, help="how many formulation/order pairs to grade")
+    report.add_argument("--repeats", type=int, default=5, help="how many times to grade them")
+    report.set_defaults(run=report_scoring)
+
+
+def report_scoring(args):
+    counts, mismatches = scoring_parity()
+    print(f"batch grades against valueCheck: {sum(counts.values())} pairs ({counts}), {len(mismatches)} mismatches")
+    for formulation, order, batch, expected in mismatches[:10]:
+        print(f"MISMATCH formulation {formulation} order {order}: batch {batch}, valueCheck {expected}")
+    if mismatches:
+        sys.exit(1)  # timing a scorer that gives wrong grades means nothing
+    total, timings = scoring_throughput(args.pairs, args.repeats)
+    runners.print_timings(f"grading {total} pairs", timings)
+    for case, values in timings.items():
+        print(f"  {case:<20} {total / statistics.median(values) / 1e6:8.1f} million pairs/s")
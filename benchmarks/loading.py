@@ -0,0 +1,166 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import pygame
+import assets
+from benchmarks import runners
+
+"""
+How long the game and the spellbook take to open: a cold start of the whole game, and the spellbook's first frame with
+and without its assets preloaded and with a small and a large spell catalog.
+"""
+
+# the script startup() starts fresh processes of, which notes the time before it imports anything
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark.py")
+
+
+def minigame_entry(repeats):
+    """
+    Compare time-to-first-interactive-frame of run_minigame3 with a cold asset cache against one that was preloaded
+    the way the start screen does it.
+
+    :param repeats: The number of times to measure each case
+    :return: a dictionary mapping the case name to a list of timings in seconds
+    """
+    import main
+    from minigame3 import run_minigame3
+
+    main.startup()
+    clock = pygame.time.Clock()
+    timings = {"cold": [], "preloaded": []}
+    for _ in range(repeats):
+        assets.cache.clear()
+        timings["cold"].append(runners.time_to_first_frame(lambda: run_minigame3(main.mainScreen, clock)))
+
+        assets.cache.clear()
+        assets.preload().wait()
+        timings["preloaded"].append(runners.time_to_first_frame(lambda: run_minigame3(main.mainScreen, clock)))
+    return timings
+
+
+def catalog_entry(repeats, count=100):
+    """
+    Compare the shipped spell catalog against a catalog of count spells (the shipped ones repeated under new names):
+    how long reading, checking and compiling each takes, which happens once at startup, and the time-to-first-
+    interactive-frame of run_minigame3 afterwards.
+
+    :param repeats: The number of times to measure each case
+    :param count: The number of spells in the large catalog
+    :return: a dictionary mapping the case name to a list of timings in seconds
+    """
+    import tempfile
+    import main
+    import minigame3
+    import spell_catalog
+    from minigame3 import run_minigame3
+
+    main.startup()
+    clock = pygame.time.Clock()
+    size = main.mainScreen.get_size()
+    with open(spell_catalog.CATALOG_PATH) as file:
+        shipped = json.load(file)
+    large = dict(shipped, spells=[dict(spell, name=f"{spell['name']} {number // len(shipped['spells']) + 1}")
+                                  for number, spell in zip(range(count), _cycle(shipped["spells"]))])
+
+    shipped_path = spell_catalog.CATALOG_PATH
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        json.dump(large, file)
+    cases = {f"{len(shipped['spells'])} spells": shipped_path, f"{count} spells": file.name}
+    timings = {f"{case}, {step}": [] for case in cases for step in ("compile", "entry")}
+    try:
+        assets.preload().wait()
+        for _ in range(repeats):
+            for case, path in cases.items():
+                spell_catalog.clear()
+                minigame3.pages.clear()
+                spell_catalog.CATALOG_PATH = path
+                start = time.perf_counter()
+                spell_catalog.spells(size)
+                timings[f"{case}, compile"].append(time.perf_counter() - start)
+                timings[f"{case}, entry"].append(runners.time_to_first_frame(lambda: run_minigame3(main.mainScreen, clock)))
+    finally:
+        spell_catalog.CATALOG_PATH = shipped_path
+        spell_catalog.clear()
+        os.remove(file.name)
+    return timings
+
+
+def _cycle(items):
+    while True:
+        yield from items
+
+
+def startup(repeats):
+    """
+    Measure a cold start of the game, each repeat in a fresh Python process.
+
+    :param repeats: The number of processes to start
+    :return: a dictionary mapping "import", "first frame" and "start clickable" to lists of timings in seconds,
+             all measured from the moment the process started running Python code
+    """
+    timings = {"import": [], "first frame": [], "start clickable": []}
+    for _ in range(repeats):
+        child = subprocess.run([sys.executable, SCRIPT, "_startup-child"], capture_output=True, text=True, check=True)
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        for case in timings:
+            timings[case].append(result[case])
+    return timings
+
+
+def startup_child(process_start):
+    # runs in the fresh process started by startup(): import the game, run main() and click the start button;
+    # process_start is when the process started running Python code
+    import main
+    imported = time.perf_counter()
+
+    result = {"import": imported - process_start}
+    flip = pygame.display.flip
+
+    def timed_flip(*args):
+        flip()
+        now = time.perf_counter() - process_start
+        if "first frame" not in result:
+            result["first frame"] = now
+            # click the start button as soon as it is on screen
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(650, 600)))
+        elif main.gameState == "inGame":
+            # the click below was handled, so the start button was clickable by now
+            result["start clickable"] = now
+            raise runners.FirstFrame()
+
+    pygame.display.flip = timed_flip
+    pygame.display.update = timed_flip  # a full update() is how the first dirty rectangle frame is presented
+    try:
+        main.main()
+    except runners.FirstFrame:
+        pass
+    print(json.dumps(result))
+
+
+def add_reports(reports):
+    report = reports.add_parser("minigame-entry", help="the spellbook's first frame, with a cold and a preloaded cache")
+    report.add_argument("--repeats", type=int, default=5, help="how many times to measure each case")
+    report.set_defaults(run=report_minigame_entry)
+
+    report = reports.add_parser("catalog", help="compiling a small and a large spell catalog")
+    report.add_argument("--repeats", type=int, default=5, help="how many times to measure each case")
+    report.set_defaults(run=report_catalog)
+
+    report = reports.add_parser("startup", help="a cold start of the game, each in a fresh process")
+    report.add_argument("--repeats", type=int, default=5, help="how many processes to start")
+    report.set_defaults(run=report_startup)
+
+
+def report_minigame_entry(args):
+    runners.print_timings("run_minigame3 time to first interactive frame", minigame_entry(args.repeats))
+
+
+def report_catalog(args):
+    runners.print_timings("spell catalog compile time, and run_minigame3 time to first interactive frame",
+                          catalog_entry(args.repeats))
+
+
+def report_startup(args):
+    runners.print_timings("game startup, from process start", startup(args.repeats))
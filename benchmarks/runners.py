@@ -0,0 +1,97 @@
+import statistics
+import time
+import pygame
+
+"""
+What the reports share: exceptions that stop a game loop from inside it, a clock that times a loop's frames, and
+printing timings.
+"""
+
+
+class FirstFrame(Exception):
+    # raised from inside a game loop to stop it as soon as it presents its first frame
+    pass
+
+
+def time_to_first_frame(run):
+    """
+    Time how long a game loop takes from being called until it presents its first frame.
+
+    :param run: A function with no arguments that starts the game loop
+    :return: the elapsed time in seconds
+    """
+    flip = pygame.display.flip
+    update = pygame.display.update
+
+    def first_flip(*args):
+        flip()
+        raise FirstFrame()
+
+    def first_update(*args):
+        update(*args)
+        raise FirstFrame()
+
+    # a frame is presented with flip(), or with update() in dirty rectangle mode
+    pygame.display.flip = first_flip
+    pygame.display.update = first_update
+    start = time.perf_counter()
+    try:
+        run()
+    except FirstFrame:
+        pass
+    finally:
+        pygame.display.flip = flip
+        pygame.display.update = update
+    return time.perf_counter() - start
+
+
+class Stop(Exception):
+    # raised from inside a game loop to stop it once a measurement is over
+    pass
+
+
+class FrameClock:
+    def __init__(self, frames, on_frame=None):
+        """
+        Stands in for the pygame Clock of a game loop: it records how long each frame took to update and draw (the
+        time between the end of one tick() and the start of the next) and stops the loop after a number of frames.
+
+        :param frames: The number of frames to run
+        :param on_frame: A function called with the frame number at the start of every frame
+        """
+        self.frames = frames
+        self.on_frame = on_frame
+        self.times = []
+        self._start = None
+
+    def tick(self, framerate=0):
+        now = time.perf_counter()
+        if self._start is not None:
+            self.times.append(now - self._start)
+        if len(self.times) >= self.frames:
+            raise Stop()
+        if self.on_frame is not None:
+            self.on_frame(len(self.times))
+        self._start = time.perf_counter()
+        return 0
+
+
+def print_timings(title, timings):
+    """
+    Print the median and best time of each case in milliseconds.
+
+    :param title: The heading of the report
+    :param timings: A dictionary mapping the case name to a list of timings in seconds
+    :return: None
+    """
+    print(title)
+    for case, values in timings.items():
+        print(f"  {case:<20} median {statistics.median(values) * 1000:8.3f} ms   best {min(values) * 1000:8.3f} ms")
+
+
+def p99(times):
+    """
+    :param times: A sorted list of timings
+    :return: the 99th percentile of the timings
+    """
+    return times[max(-(-99 * len(times) // 100) - 1, 0)]
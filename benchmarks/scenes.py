@@ -0,0 +1,233 @@
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+import pygame
+import assets
+import latency
+from benchmarks import runners
+
+"""
+The frame time and allocations of every scene of the game, driven offscreen by scripted input, compared against a JSON
+baseline so that a change that makes a scene slower fails the report.
+"""
+
+
+class _SceneClock:
+    def __init__(self, scene, frames, warmup=5, allocations=False):
+        """
+        Stands in for the game's clock while a scene is benchmarked. Every tick() ends a frame: frames drawn while the
+        game is in the given latency scene are timed (after a few warm-up frames), and the loop is stopped once enough
+        of them have been.
+
+        :param scene: The latency scene name to time, e.g. "spellbook"
+        :param frames: The number of frames to time
+        :param warmup: The number of frames of the scene to run before timing
+        :param allocations: Whether to record how much memory each frame allocates (needs tracemalloc running)
+        """
+        import headless
+        self.virtual = headless.VirtualClock()
+        self.scene = scene
+        self.frames = frames
+        self.warmup = warmup
+        self.allocations = allocations
+        self.times = []
+        self.allocated = []
+        self._start = None
+
+    def tick(self, framerate=0):
+        now = time.perf_counter()
+        if self._start is not None and latency.tracker.current_scene == self.scene:
+            if self.warmup:
+                self.warmup -= 1
+            elif self.allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                self.allocated.append(peak - self._memory)
+            else:
+                self.times.append(now - self._start)
+        if max(len(self.times), len(self.allocated)) >= self.frames:
+            raise runners.Stop()
+        if self.allocations:
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self.virtual.tick(framerate)
+
+    def __getattr__(self, name):
+        return getattr(self.virtual, name)
+
+
+def _scene_cases():
+    """
+    The scenes scene_frames() drives: (name, latency scene to time, function that runs the game loop with a clock,
+    script of input for one pass of the loop), all offscreen through headless.ScriptedInput.
+    """
+    import bot
+    import headless
+    import inputs
+    import main
+    import spellcaster
+    from minigame3 import run_minigame3, make_spells, cast_start_pos
+    from spellcaster import cast_spell
+
+    screen = main.mainScreen
+    background = assets.image("Spell_Assets/Magic_Bg.jpg", screen.get_size(), assets.OPAQUE)
+    spell = make_spells(screen.get_size())[2]  # Citrus Pulse, one of the spells with the most nodes
+    start = cast_start_pos(screen.get_size())
+    # the bot's path around the nodes a straight line would touch, so the cast really succeeds
+    trace, _ = bot.Bot(jitter=0, seed=0).trace(spell.node_positions, start)
+
+    def main_loop(state, dialogue):
+        def run(clock):
+            main.gameState, main.dialogueNum = state, dialogue
+            main.main()
+        return run
+
+    def casts(expected=None, cast=()):
+        def run(clock):
+            # a cast that ends the wrong way would time the wrong effects, so one cast is played first, untimed and
+            # with short effects, to check how it ends
+            if expected is not None:
+                check = headless.ScriptedInput(cast)
+                old = inputs.use(check)
+                try:
+                    with bot.fast_casts():
+                        inputs.set_mouse_pos(start)
+                        result = cast_spell(screen, check.clock(), spell, background)
+                finally:
+                    inputs.use(old)
+                if result != expected:
+                    raise RuntimeError(f"casting {spell.name} {'failed' if expected else 'succeeded'}, so the scene "
+                                       f"would time the wrong effects")
+            # then the spell is cast over and over until the clock has timed enough frames, each time from where the
+            # spellbook parks the mouse
+            while True:
+                inputs.set_mouse_pos(start)
+                cast_spell(screen, clock, spell, background)
+        return run
+
+    # the mouse circles around the bottom of the screen without touching a node
+    wander = [(100 + 40 * (i % 20), 650 + (i % 2) * 10) for i in range(400)]
+    success = [("wait", 2), ("trace", trace), ("wait", spellcaster.EFFECT_FRAMES + 5)]
+    failure = [("wait", 2), ("trace", [spell.node_positions[1]]), ("wait", spellcaster.EFFECT_FRAMES + 5)]
+    return [
+        ("start screen", "startScreen", main_loop("startScreen", 0), [("wait", 10000)]),
+        ("dialogue", "dialogue", main_loop(main.customerOrder[0], 1), [("wait", 10000)]),
+        ("spellbook", "spellbook", lambda clock: run_minigame3(screen, clock), [("move", (150, 150)), ("wait", 10000)]),
+        ("tracing", "tracing", casts(), [("trace", wander)] * 25),
+        ("success effects", "effects", casts(True, success), success * 100),
+        ("failure effects", "effects", casts(False, failure), failure * 100),
+    ]
+
+
+def scene_frames(frames):
+    """
+    Run every scene of the game offscreen for a number of frames and measure each one's frame time and how much memory
+    a frame allocates.
+
+    :param frames: The number of frames to time per scene
+    :return: a dictionary mapping each scene name to a dictionary with "mean_ms", "p99_ms" and "alloc_kib"
+    """
+    import random
+    import headless
+    import inputs
+    import main
+    import pacing
+
+    main.startup()
+    assets.preload().wait()
+    pacing.IDLE_SUPPRESSION = False  # static screens have to be drawn every frame to be timed
+
+    results = {}
+    for name, scene, run, script in _scene_cases():
+        measured = {}
+        # time the frames first, then run again under tracemalloc (which slows everything down) for the allocations
+        for allocations in (False, True):
+            random.seed(0)
+            clock = _SceneClock(scene, frames if not allocations else min(frames, 60), allocations=allocations)
+            source = headless.ScriptedInput(script)
+            source.virtual_clock = clock
+            old = inputs.use(source)
+            if allocations:
+                tracemalloc.start()
+            try:
+                run(clock)
+            except (runners.Stop, headless.ScriptFinished):
+                pass
+            finally:
+                inputs.use(old)
+                tracemalloc.stop()
+                latency.scene("game")
+            measured[allocations] = clock
+
+        times = sorted(measured[False].times)
+        if not times:
+            raise RuntimeError(f"the {name} scene never ran")
+        results[name] = {
+            "mean_ms": round(statistics.fmean(times) * 1000, 3),
+            "p99_ms": round(runners.p99(times) * 1000, 3),
+            "alloc_kib": round(statistics.fmean(measured[True].allocated) / 1024, 1),
+        }
+    pygame.mixer.music.stop()
+    return results
+
+
+def compare_scenes(results, baseline, threshold, slack_ms=1.0, slack_kib=4.0):
+    """
+    Find the scenes that got slower, or allocate more, than the baseline allows.
+
+    :param results: The results of scene_frames()
+    :param baseline: Earlier results of scene_frames() to compare against
+    :param threshold: How much worse a number may get before it counts as a regression, e.g. 0.2 for 20%
+    :param slack_ms: Timing changes smaller than this are noise and never count
+    :param slack_kib: Allocation changes smaller than this are noise and never count
+    :return: a list of (scene, metric, baseline value, new value) of every regression
+    """
+    regressions = []
+    for name, numbers in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in numbers.items():
+            old = baseline[name][metric]
+            slack = slack_kib if metric == "alloc_kib" else slack_ms
+            if value > old * (1 + threshold) and value - old > slack:
+                regressions.append((name, metric, old, value))
+    return regressions
+
+
+def add_reports(reports):
+    report = reports.add_parser("scenes", help="every scene's frame time and allocations, against a saved baseline")
+    report.add_argument("--frames", type=int, default=600, help="how many frames to time per scene")
+    report.add_argument("--baseline", default="benchmark_baseline.json", help="the JSON baseline to compare against")
+    report.add_argument("--threshold", type=float, default=0.2, help="how much worse (0.2 = 20%%) a scene may get before the report fails")
+    report.add_argument("--slack-ms", type=float, default=1.0, help="timing changes smaller than this never fail the report")
+    report.add_argument("--update-baseline", action="store_true", help="save the results as the new baseline")
+    report.set_defaults(run=report_scenes)
+
+
+def report_scenes(args):
+    results = scene_frames(args.frames)
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        baseline = {}
+
+    print(f"frame time and allocations per scene over {args.frames} frames")
+    for name, numbers in results.items():
+        old = baseline.get(name)
+        print(f"  {name:<16} mean {numbers['mean_ms']:7.3f} ms   p99 {numbers['p99_ms']:7.3f} ms   "
+              f"alloc {numbers['alloc_kib']:7.1f} KiB/frame"
+              + (f"   (baseline {old['mean_ms']:.3f} / {old['p99_ms']:.3f} ms, {old['alloc_kib']:.1f} KiB)" if old else ""))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print(f"saved baseline to {args.baseline}")
+        return
+    regressions = compare_scenes(results, baseline, args.threshold, args.slack_ms)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old} -> {new}")
+    if regressions:
+        sys.exit(1)
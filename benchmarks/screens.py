@@ -0,0 +1,129 @@
+import time
+import pygame
+import assets
+from benchmarks import runners
+
+"""
+The main loop's static screens, which should cost next to no CPU while nothing changes, and the frames of the
+spellbook, whose pages are drawn once and cached.
+"""
+
+
+def idle_cpu(seconds):
+    """
+    Measure how much CPU the main loop burns while each static screen just sits there, with idle frame suppression
+    turned off and on.
+
+    :param seconds: How long to leave each screen running
+    :return: a dictionary mapping "<state> (off|on)" to the CPU use as a fraction of one core
+    """
+    import main
+    import pacing
+
+    main.startup()
+    assets.preload().wait()  # so the start screen's loading bar is already full and the screen is static
+
+    states = {"startScreen": 0, "howToPlay": 0, "inGame": 0, "Zhao": 2, "gameComplete": 0}
+    get = pygame.event.get
+    wait = pygame.event.wait
+    usage = {}
+    for suppression in (False, True):
+        pacing.IDLE_SUPPRESSION = suppression
+        for state, dialogue in states.items():
+            main.gameState = state
+            main.dialogueNum = dialogue
+            deadline = time.perf_counter() + seconds
+
+            # the loop polls or waits on the event queue every frame, which is where we stop it
+            def check():
+                if time.perf_counter() >= deadline:
+                    raise runners.Stop()
+
+            pygame.event.get = lambda *args, **kwargs: (check(), get(*args, **kwargs))[1]
+            pygame.event.wait = lambda *args, **kwargs: (check(), wait(*args, **kwargs))[1]
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            try:
+                main.main()
+            except runners.Stop:
+                pass
+            finally:
+                pygame.event.get = get
+                pygame.event.wait = wait
+            usage[f"{state} ({'on' if suppression else 'off'})"] = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+    return usage
+
+
+def spellbook(frames, flip_every=30):
+    """
+    Measure the frame time of the spellbook scene of run_minigame3, with the mouse resting on the page and with the
+    right arrow clicked every flip_every frames.
+
+    :param frames: The number of frames to run
+    :param flip_every: How many frames to wait between page flips
+    :return: a dictionary mapping "steady frame", "page flip" and the time to the first frame with the first page
+             drawn and cached to lists of timings in seconds
+    """
+    import main
+    import minigame3
+    from minigame3 import run_minigame3
+
+    main.startup()
+    assets.preload().wait()
+    minigame3.pages.clear()
+    width, height = main.mainScreen.get_size()
+    arrow = ((width - 800) // 2 + 800 - 45, (height - 500) // 2 + 37)  # the middle of right_btn
+    flips = set()
+
+    def on_frame(number):
+        if number and number % flip_every == 0:
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=arrow))
+            flips.add(number)
+
+    # the loop reads the mouse position instead of the event's, so keep it on the arrow
+    get_pos = pygame.mouse.get_pos
+    pygame.mouse.get_pos = lambda: arrow
+    clock = runners.FrameClock(frames, on_frame)
+    try:
+        run_minigame3(main.mainScreen, clock)
+    except runners.Stop:
+        pass
+    finally:
+        pygame.mouse.get_pos = get_pos
+        pygame.mixer.music.stop()
+
+    # a click posted at the start of a frame is handled in the frame that follows it
+    timings = {"steady frame": [], "page flip": []}
+    for number, elapsed in enumerate(clock.times[1:], start=1):
+        timings["page flip" if number in flips else "steady frame"].append(elapsed)
+
+    # entering the scene with and without its first page already drawn; the difference is what drawing a page costs,
+    # which is roughly what every frame cost before pages were cached
+    timings["entry, page drawn"] = []
+    timings["entry, page cached"] = []
+    for _ in range(10):
+        minigame3.pages.clear()
+        timings["entry, page drawn"].append(runners.time_to_first_frame(lambda: run_minigame3(main.mainScreen, clock)))
+        timings["entry, page cached"].append(runners.time_to_first_frame(lambda: run_minigame3(main.mainScreen, clock)))
+    pygame.mixer.music.stop()
+    return timings
+
+
+def add_reports(reports):
+    report = reports.add_parser("idle-cpu", help="CPU use of the static screens, idle suppression off and on")
+    report.add_argument("--seconds", type=float, default=3.0, help="how long to run each screen")
+    report.set_defaults(run=report_idle_cpu)
+
+    report = reports.add_parser("spellbook", help="the spellbook's frame time, at rest and flipping pages")
+    report.add_argument("--frames", type=int, default=600, help="how many frames to time")
+    report.set_defaults(run=report_spellbook)
+
+
+def report_idle_cpu(args):
+    print("main loop CPU use per static screen, idle suppression off and on")
+    for case, fraction in idle_cpu(args.seconds).items():
+        print(f"  {case:<24} {fraction * 100:6.1f} % of one core")
+
+
+def report_spellbook(args):
+    runners.print_timings("spellbook scene frame time", spellbook(args.frames))
@@ -0,0 +1,253 @@
+import os
+import statistics
+import sys
+import time
+import assets
+from benchmarks import runners
+
+"""
+Endless mode over thousands of customers, sampling frame time, memory, and the surfaces made and assets loaded per
+customer as it goes, so that anything the game holds on to or remakes for every customer shows up as growth.
+"""
+
+
+class _SoakClock:
+    def __init__(self, block):
+        """
+        Stands in for the game's clock during the soak. Every tick() ends a frame; each time another block of customers
+        has been served, the frame times since the last sample, the memory in use, and how many surfaces were made and
+        assets loaded per customer are recorded.
+
+        :param block: The number of customers between samples
+        """
+        import headless
+        import profiler
+        self.virtual = headless.VirtualClock()
+        self.block = block
+        self.samples = []
+        self._times = []
+        self._last = None
+        profiler.keep_totals()
+        self._surfaces = profiler.totals()["surfaces"]
+        self._loads = assets.cache.stats()["misses"]
+        self._block_start = time.perf_counter()
+
+    def tick(self, framerate=0):
+        import main
+        now = time.perf_counter()
+        if self._last is not None:
+            self._times.append(now - self._last)
+        if main.customersServed >= (len(self.samples) + 1) * self.block:
+            self.samples.append(self._sample(main))
+            self._times = []
+        self._last = time.perf_counter()  # the sample itself isn't part of any frame
+        return self.virtual.tick(framerate)
+
+    def _sample(self, main):
+        import gc
+        import minigame3
+        import profiler
+        import text_render
+        gc.collect()
+        times = sorted(self._times)
+        surfaces, loads = profiler.totals()["surfaces"], assets.cache.stats()["misses"]
+        served = main.customersServed - (self.samples[-1]["served"] if self.samples else 0)
+        sample = {
+            "served": main.customersServed,
+            "mean_ms": statistics.fmean(times) * 1000,
+            "p99_ms": runners.p99(times) * 1000,
+            "rss_mib": _rss_mib(),
+            "objects": len(gc.get_objects()),
+            "text_cache": text_render.cache.stats()["entries"],
+            "assets": assets.cache.stats()["entries"],
+            "surfaces": (surfaces - self._surfaces) / served,
+            "loads": (loads - self._loads) / served,
+            "casts_per_min": served * minigame3.CASTS / (time.perf_counter() - self._block_start) * 60,
+        }
+        self._surfaces, self._loads = surfaces, loads
+        self._block_start = time.perf_counter()
+        return sample
+
+    def __getattr__(self, name):
+        return getattr(self.virtual, name)
+
+
+def _rss_mib():
+    # the memory the process is using right now, Python objects and SDL surfaces alike; None where /proc doesn't exist
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def soak(customers, block=100, bot=None, fast=False, seed=0):
+    """
+    Play endless mode offscreen for a number of customers, sampling frame time and memory after every block of them.
+
+    :param customers: The number of customers to serve
+    :param block: The number of customers between samples
+    :param bot: A bot.Bot to choose and trace the spells, None to cast the first spell three times for everyone with
+                straight strokes
+    :param fast: Whether to show each cast's effects and result message for only a couple of frames (see
+                 bot.fast_casts()), so many more casts fit in the same time
+    :param seed: The seed for the endless customers
+    :return: a list of dictionaries with "served", "mean_ms", "p99_ms", "rss_mib", "objects" (Python objects alive),
+             "text_cache" and "assets" (entries in the caches), "surfaces" (made per customer), "loads" (assets loaded
+             per customer) and "casts_per_min" (in real time)
+    """
+    import headless
+    import inputs
+    import main
+
+    main.startup()
+    main.startEndless(seed)
+    clock = _SoakClock(block)
+    size = main.mainScreen.get_size()
+    source = headless.ScriptedInput(bot.script(size, customers) if bot else headless.endless_script(size, customers))
+    source.virtual_clock = clock
+    old = inputs.use(source)
+    try:
+        if fast:
+            import bot as bot_module
+            with bot_module.fast_casts():
+                main.main()
+        else:
+            main.main()
+    except headless.ScriptFinished:
+        pass
+    finally:
+        inputs.use(old)
+    return clock.samples
+
+
+def _bot_soak(options):
+    # one process of soak --bot: (customers, block, mistake rate, fast, seed)
+    import bot
+    customers, block, mistakes, fast, seed = options
+    return soak(customers, block, bot.Bot(mistake_rate=mistakes, seed=seed), fast, seed)
+
+
+def bot_soaks(customers, block, mistakes, fast, processes):
+    """
+    Run soak() with a bot in several processes at once, each with its own seed, for many more casts in the same time.
+
+    :param customers: The number of customers each process serves
+    :param block: The number of customers between samples
+    :param mistakes: The bot's mistake rate
+    :param fast: Whether to play under bot.fast_casts()
+    :param processes: How many processes to run
+    :return: the list of samples of each process
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    runs = [(customers, block, mistakes, fast, seed) for seed in range(processes)]
+    if processes == 1:
+        return [_bot_soak(runs[0])]
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(_bot_soak, runs))
+
+
+def combine_soaks(runs):
+    """
+    Put the samples of several soaks side by side: the casts per minute add up, and every other number is the worst
+    of any process.
+
+    :param runs: The list of samples of each soak
+    :return: a list of samples like soak()'s
+    """
+    combined = []
+    for samples in zip(*runs):
+        sample = {key: max(values) if None not in values else None
+                  for key, values in ((key, [sample[key] for sample in samples]) for key in samples[0])}
+        sample["casts_per_min"] = sum(sample["casts_per_min"] for sample in samples)
+        combined.append(sample)
+    return combined
+
+
+def soak_growth(samples, threshold, slack_ms=1.0, slack_mib=16.0):
+    """
+    Find what grew between the first and the last sample of a soak by more than the noise allows. The first sample is
+    taken once the caches have filled up, so a game that holds a bounded amount shouldn't grow after it.
+
+    :param samples: The samples from soak()
+    :param threshold: How much a number may grow, e.g. 0.2 for 20%
+    :param slack_ms: Frame time changes smaller than this never count
+    :param slack_mib: Memory changes smaller than this never count
+    :return: a list of (metric, first value, last value) of everything that grew
+    """
+    if len(samples) < 2:
+        return []
+    first, last = samples[0], samples[-1]
+    # the caches fill up to their limits over the first customers, so their sizes are shown but not checked
+    slack = {"mean_ms": slack_ms, "p99_ms": slack_ms, "rss_mib": slack_mib, "objects": 0}
+    grown = []
+    for metric, allowed in slack.items():
+        if first[metric] is None or last[metric] is None:
+            continue
+        if last[metric] > first[metric] * (1 + threshold) and last[metric] - first[metric] > allowed:
+            grown.append((metric, first[metric], last[metric]))
+    return grown
+
+
+def soak_reloads(samples, budget):
+    """
+    Find the samples of a soak that loaded more assets per customer than the game should. Once everything has been
+    loaded the first time (the first sample), the only assets loaded again are the portraits of each new customer, so
+    an asset that is loaded again for every cast or every frame shows up here even when the cache keeps the memory flat.
+
+    :param samples: The samples from soak()
+    :param budget: The most assets a customer may load, e.g. one set of portraits
+    :return: a list of (served, loads per customer) of the samples over the budget
+    """
+    return [(sample["served"], sample["loads"]) for sample in samples[1:] if sample["loads"] > budget]
+
+
+def add_reports(reports):
+    report = reports.add_parser("soak", help="endless mode over many customers, watching frame time and memory grow")
+    report.add_argument("--customers", type=int, default=2000, help="how many endless mode customers to serve")
+    report.add_argument("--threshold", type=float, default=0.2, help="how much (0.2 = 20%%) a number may grow before the report fails")
+    report.add_argument("--slack-ms", type=float, default=1.0, help="frame time changes smaller than this never fail the report")
+    report.add_argument("--bot", action="store_true", help="let bot.Bot choose and trace the spells")
+    report.add_argument("--processes", type=int, help="how many bot games to run at once, one per CPU by default")
+    report.add_argument("--full-effects", action="store_true", help="with --bot, show each cast's effects and result message for their full length")
+    report.add_argument("--mistakes", type=float, default=0.1, help="the chance of each of the bot's casts going to a wrong node")
+    report.set_defaults(run=report_soak)
+
+
+def report_soak(args):
+    import main
+
+    block = max(args.customers // 20, 1)
+    fast = args.bot and not args.full_effects
+    if args.bot:
+        runs = bot_soaks(args.customers, block, args.mistakes, fast, args.processes or os.cpu_count() or 1)
+    else:
+        runs = [soak(args.customers, block)]
+    samples = combine_soaks(runs)
+    print(f"endless mode soak, {args.customers} customers, sampled every {block}"
+          + (f", bot with {args.mistakes:g} mistake rate in {len(runs)} process(es)" if args.bot else "")
+          + (", fast casts" if fast else ""))
+    if len(runs) > 1:
+        print("  (casts/min added up over the processes, everything else the worst of them)")
+    print(f"  {'served':>7} {'mean ms':>8} {'p99 ms':>8} {'RSS MiB':>8} {'objects':>8} {'texts':>6} {'assets':>6} "
+          f"{'surf/c':>7} {'loads/c':>7} {'casts/min':>9}")
+    for sample in samples:
+        rss = f"{sample['rss_mib']:8.1f}" if sample["rss_mib"] is not None else f"{'-':>8}"
+        print(f"  {sample['served']:7} {sample['mean_ms']:8.3f} {sample['p99_ms']:8.3f} {rss} {sample['objects']:8} "
+              f"{sample['text_cache']:6} {sample['assets']:6} {sample['surfaces']:7.1f} {sample['loads']:7.2f} "
+              f"{sample['casts_per_min']:9.0f}")
+    rate = statistics.median(sample["casts_per_min"] for sample in samples)
+    print(f"  {rate:.0f} casts/min in all, {rate / len(runs):.0f} per process")
+
+    failed = False
+    for process, run in enumerate(runs):
+        where = f" in process {process}" if len(runs) > 1 else ""
+        for metric, first, last in soak_growth(run, args.threshold, args.slack_ms):
+            print(f"GROWTH {metric}{where}: {first:.1f} -> {last:.1f}")
+            failed = True
+        for served, loads in soak_reloads(run, len(main.expressions)):
+            print(f"RELOADS{where} at {served} customers: {loads:.2f} assets loaded per customer, more than a set of portraits")
+            failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,358 @@
+import argparse
+import heapq
+import math
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import headless  # sets up the dummy display and sound before pygame starts
+import aspects
+import hints
+import inputs
+import minigame3
+import spell_catalog
+import spellcaster
+from spellcaster import NodeGrid, SpellNode
+
+"""
+A bot that plays the game by itself, for soak tests that need real casts rather than a fixed script.
+
+The bot reads a spell's node_positions and traces it the way a player would: it moves the mouse from node to node at a
+set speed, with a little jitter, going around nodes that a straight line would touch, and now and then (at its mistake
+rate) it heads for the wrong node on purpose. It picks its spells from the order in front of it with the spellbook's
+hint, flips the pages and presses the cast button, and presses Enter through the dialogue, all through a ScriptedInput
+on a VirtualClock (see headless.py), so the game runs as fast as the CPU allows.
+
+A cast normally spends 3.5 seconds of frames on its effects and result message. With fast_casts() (--fast) both are
+still drawn, but only for a couple of frames, so a soak still makes and frees everything a cast does. Measured on one
+CPU, one game plays about 200 casts a minute, about 450 with --fast and about 1000 with --fast and
+TEASHOP_DIRTY_RECTS=1. Thousands of casts a minute take several games at once: --processes here, or
+`python benchmark.py soak --bot`, which plays fast casts in one game per CPU and reports the casts per minute of all of
+them together.
+
+`python bot.py` plays the story; `python bot.py --endless 500` serves 500 customers of endless mode, and --processes plays
+several games side by side. For memory, surface counts and frame times over a long run, see the soak report.
+"""
+
+# how far the bot's path stays from the nodes it isn't heading for, in pixels
+CLEARANCE = 10
+
+# how many points around each node a path may turn at, to get around the nodes in its way
+WAYPOINTS = 16
+
+# how many planned paths are remembered, see Bot.route()
+MAX_ROUTES = 256
+_routes = OrderedDict()
+
+# how many frames a cast's effects and its result message are shown for under fast_casts()
+FAST_FRAMES = 2
+
+
+class Bot:
+    def __init__(self, speed=30, jitter=2.0, mistake_rate=0.0, seed=None):
+        """
+        The Bot class makes the mouse movements and choices of a player.
+        It has four methods:
+        route() which plans a path through the nodes of a spell that only touches them in order
+        trace() which turns that path into one mouse position per frame, with jitter and mistakes
+        choose() which picks the next spell to cast for an order
+        script() which makes the script actions that play the game, for a ScriptedInput
+
+        :param speed: How far the mouse moves each frame, in pixels
+        :param jitter: How far the mouse strays from the path, the standard deviation in pixels; it never strays far
+                       enough to touch a node it is going around
+        :param mistake_rate: The chance of each cast going to a wrong node, failing the cast
+        :param seed: The seed for the bot's own random, None for a different game every time
+        """
+        self.speed = speed
+        self.jitter = jitter
+        self.mistake_rate = mistake_rate
+        self.rng = random.Random(seed)
+        self.casts = 0
+        self.mistakes = 0
+
+    def route(self, positions, start, stop=None):
+        """
+        Plan a path from start through the nodes in order, going around the nodes that a straight line between two
+        nodes would touch (cast_spell() fails a spell for touching a node out of order or twice). Paths only depend on
+        their arguments, so the last MAX_ROUTES are remembered.
+
+        :param positions: The (x, y) screen coordinates of the nodes, in tracing order
+        :param start: Where the mouse is when the cast starts
+        :param stop: The number of nodes to go through, all of them by default
+        :return: a list of the points the path goes through, ending at the center of each node in turn
+        """
+        key = (tuple(positions), tuple(start), stop)
+        if key in _routes:
+            _routes.move_to_end(key)  # mark as most recently used
+            return list(_routes[key])
+
+        grid = _clearance_grid(positions)
+        path = []
+        for target in range(len(positions) if stop is None else stop):
+            path += self._stroke(grid, path[-1] if path else start, positions[target], target)
+        _routes[key] = tuple(path)
+        if len(_routes) > MAX_ROUTES:
+            _routes.popitem(last=False)
+        return path
+
+    def _stroke(self, grid, start, end, target):
+        # the shortest path from start to end that touches no node but the target, and that only on its last line: a
+        # straight line when nothing is in the way, otherwise a search over the points just outside every node's
+        # clearance; a straight line if even that finds nothing
+        def clear(a, b, last):
+            return all(last and i == target for i in grid.crossed(a, b))
+
+        if clear(start, end, True):
+            return [end]
+        points = [start] + _waypoints(grid) + [end]
+        finish = len(points) - 1
+        distances = {0: 0.0}
+        previous = {}
+        done = set()
+        # A*: the points nearest to the end along the shortest paths so far are looked at first
+        queue = [(math.dist(start, end), 0)]
+        while queue:
+            _, i = heapq.heappop(queue)
+            if i in done:
+                continue
+            done.add(i)
+            if i == finish:
+                break
+            for j in range(1, len(points)):
+                through = distances[i] + math.dist(points[i], points[j])
+                # only the lines that would make a path shorter are checked, which skips most of them
+                if j not in done and through < distances.get(j, math.inf) and clear(points[i], points[j], j == finish):
+                    distances[j] = through
+                    previous[j] = i
+                    heapq.heappush(queue, (through + math.dist(points[j], end), j))
+        if finish not in previous:
+            return [end]
+        path = [finish]
+        while path[-1] != 0:
+            path.append(previous[path[-1]])
+        return [points[i] for i in reversed(path[:-1])]
+
+    def trace(self, positions, start):
+        """
+        Make the mouse positions that trace a spell, one per frame. With probability mistake_rate the trace heads for
+        a wrong node partway through and stops there, which fails the cast.
+
+        :param positions: The (x, y) screen coordinates of the nodes, in tracing order
+        :param start: Where the mouse is when the cast starts
+        :return: a tuple of the list of mouse positions and whether the cast will succeed
+        """
+        self.casts += 1
+        path = self._mistake(positions, start) if self.rng.random() < self.mistake_rate else None
+        clean = path is None
+        if clean:
+            path = self.route(positions, start)
+        else:
+            self.mistakes += 1
+
+        # a point every speed pixels along the path and at every corner of it, each strayed by the jitter; the
+        # straying is capped so it can't reach a node the path goes around, or make a point go backwards
+        limit = max(min(CLEARANCE - 2, self.speed / 2 - 1.5), 0)
+        points = []
+        for a, b in zip([start] + path, path):
+            steps = max(math.ceil(math.dist(a, b) / self.speed), 1)
+            for step in range(1, steps + 1):
+                dx, dy = self._stray(limit)
+                points.append((round(a[0] + (b[0] - a[0]) * step / steps + dx), round(a[1] + (b[1] - a[1]) * step / steps + dy)))
+        return points, clean
+
+    def _mistake(self, positions, start):
+        # a path through the first nodes, then to a node that isn't the next one (or the one the mouse is in, which
+        # doesn't count as touching it), checked so that no detour touches the next node on the way; None if there is
+        # no such path
+        grid = _clearance_grid(positions)
+        nodes = NodeGrid([SpellNode(pos, i, spell_catalog.NODE_RADIUS) for i, pos in enumerate(positions)])
+        mistakes = [(wrong, target) for wrong in range(len(positions)) for target in range(len(positions))
+                    if target not in (wrong - 1, wrong)]
+        self.rng.shuffle(mistakes)
+        for wrong, target in mistakes:
+            path = self.route(positions, start, wrong)
+            line = [path[-1] if path else start] + self._stroke(grid, path[-1] if path else start, positions[target], target)
+            touched = [i for a, b in zip(line, line[1:]) for i in nodes.crossed(a, b)]
+            if touched and touched[0] != wrong:
+                return path + line[1:]
+        return None
+
+    def _stray(self, limit):
+        # how far one point strays, at most limit pixels in any direction
+        if not self.jitter:
+            return 0, 0
+        dx, dy = self.rng.gauss(0, self.jitter), self.rng.gauss(0, self.jitter)
+        scale = min(limit / max(math.hypot(dx, dy), 1e-9), 1.0)
+        return dx * scale, dy * scale
+
+    def choose(self, spells, recipes, order, formulation, casts_left):
+        """
+        Pick the next spell: one the hint suggests, or when there is no Perfect left to make, one that adds an aspect
+        the tea still lacks, or any spell.
+
+        :param spells: The spells of the spellbook, in page order
+        :param recipes: The hints.RecipeIndex of the spells
+        :param order: The aspect vector the customer ordered
+        :param formulation: The aspect vector brewed so far
+        :param casts_left: The number of casts left, including this one
+        :return: the page number of the spell
+        """
+        hinted = {spell.name for spell in recipes.perfect_spells(order, formulation, casts_left)}
+        pages = [page for page, spell in enumerate(spells) if spell.name in hinted]
+        if not pages:
+            lacking = order - formulation > 0
+            pages = [page for page, spell in enumerate(spells) if (spell.effect[lacking] > 0).any()]
+        return self.rng.choice(pages or range(len(spells)))
+
+    def script(self, screen_size, customers=None):
+        """
+        Make the script that plays the game from the start screen: the dialogue of each customer, then their three
+        casts, and on to the next. The spells are chosen as the script is read, once the game has reached each
+        customer's spellbook, so the bot sees the order it is brewing for.
+
+        :param screen_size: The (width, height) of the game window
+        :param customers: The number of customers to serve, None to never stop (endless mode)
+        :return: a generator of script actions for ScriptedInput
+        """
+        import main
+
+        spells = minigame3.make_spells(screen_size)
+        recipes = hints.index_for(spells, minigame3.CASTS)
+        # the spellbook moves the mouse away from the spell when the cast starts, so every trace starts there
+        start = minigame3.cast_start_pos(screen_size)
+
+        yield from headless.start_actions()
+        served = 0
+        while customers is None or served < customers:
+            yield from headless.dialogue_actions()
+            order = main.orderList[main.gameState]
+            formulation = aspects.zeros()
+            page = 0
+            for cast in range(minigame3.CASTS):
+                target = self.choose(spells, recipes, order, formulation, minigame3.CASTS - cast)
+                points, clean = self.trace(spells[target].node_positions, start)
+                if clean:
+                    formulation = formulation + spells[target].effect
+                yield from headless.cast_actions(screen_size, page, target, points)
+                page = target
+            yield from headless.farewell_actions()
+            served += 1
+
+
+@contextmanager
+def fast_casts(frames=FAST_FRAMES):
+    """
+    Shorten the effects of every cast and the result message after it to a few frames while the block runs. The
+    scripts of headless.py and the bot wait for however long they are, so they stay in step with the game.
+
+    :param frames: How many frames each is shown for
+    """
+    old = spellcaster.EFFECT_FRAMES, minigame3.RESULT_FRAMES
+    spellcaster.EFFECT_FRAMES = minigame3.RESULT_FRAMES = frames
+    try:
+        yield
+    finally:
+        spellcaster.EFFECT_FRAMES, minigame3.RESULT_FRAMES = old
+
+
+def _clearance_grid(positions):
+    # the nodes grown by CLEARANCE, for finding what a path passes too close to
+    return NodeGrid([SpellNode(pos, i, spell_catalog.NODE_RADIUS + CLEARANCE) for i, pos in enumerate(positions)])
+
+
+def _waypoints(grid):
+    # WAYPOINTS points in a ring just outside each node of a clearance grid, leaving out those inside another node's
+    # clearance; a line between two neighbouring points of a ring stays outside the ring's node
+    points = []
+    for node in grid.nodes:
+        for step in range(WAYPOINTS):
+            angle = 2 * math.pi * step / WAYPOINTS
+            point = (node.pos[0] + (node.radius + 2) * math.cos(angle), node.pos[1] + (node.radius + 2) * math.sin(angle))
+            if not grid.at(point):
+                points.append(point)
+    return points
+
+
+def play(bot, endless=None, seed=0, fast=False):
+    """
+    Let a bot play the game headlessly.
+
+    :param bot: A Bot
+    :param endless: The number of endless mode customers to serve, None to play the story
+    :param seed: The seed for random and the endless customers
+    :param fast: Whether to play under fast_casts()
+    :return: a dictionary with the number of customers served and made happy, the casts and mistakes, how many casts
+             failed in the game, the number of frames and the real time it took
+    """
+    import main
+
+    failed_before = minigame3.cast_counts["failed"]
+    main.startup()
+    random.seed(seed)
+    if endless:
+        main.startEndless(seed)
+    customers = endless or len(main.customerOrder)
+    source = headless.ScriptedInput(bot.script(main.mainScreen.get_size(), customers))
+    old = inputs.use(source)
+    start = time.perf_counter()
+    try:
+        if fast:
+            with fast_casts():
+                main.main()
+        else:
+            main.main()
+    except headless.ScriptFinished:
+        pass
+    finally:
+        inputs.use(old)
+    return {
+        "served": main.customersServed if endless else customers,
+        "happy": main.professors_helped,
+        "casts": bot.casts,
+        "mistakes": bot.mistakes,
+        "failed": minigame3.cast_counts["failed"] - failed_before,
+        "frames": source.virtual_clock.frames,
+        "real_seconds": time.perf_counter() - start,
+    }
+
+
+def _play_game(options):
+    # one game of a process pool: (speed, jitter, mistake rate, endless customers, seed, fast)
+    speed, jitter, mistakes, endless, seed, fast = options
+    return play(Bot(speed, jitter, mistakes, seed), endless, seed, fast)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Let a bot play the game without a window.")
+    parser.add_argument("--endless", type=int, metavar="CUSTOMERS", help="serve this many customers in endless mode instead of the story")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the bot, random and the endless customers")
+    parser.add_argument("--speed", type=float, default=30, help="how far the mouse moves each frame, in pixels")
+    parser.add_argument("--jitter", type=float, default=2.0, help="how far the mouse strays from its path, in pixels")
+    parser.add_argument("--mistakes", type=float, default=0.0, help="the chance of each cast going to a wrong node")
+    parser.add_argument("--fast", action="store_true", help="show each cast's effects and result message for only a couple of frames")
+    parser.add_argument("--processes", type=int, default=1, help="how many games to play side by side, each in its own process with the next seed")
+    args = parser.parse_args()
+
+    games = [(args.speed, args.jitter, args.mistakes, args.endless, args.seed + game, args.fast) for game in range(args.processes)]
+    start = time.perf_counter()
+    if args.processes == 1:
+        results = [_play_game(games[0])]
+    else:
+        with ProcessPoolExecutor(args.processes) as pool:
+            results = list(pool.map(_play_game, games))
+    elapsed = time.perf_counter() - start
+
+    total = {key: sum(result[key] for result in results) for key in ("served", "happy", "casts", "mistakes", "failed", "frames")}
+    print(f"served {total['served']} customers, {total['happy']} happy: {total['casts']} casts "
+          f"({total['mistakes']} with mistakes, {total['failed']} failed), {total['frames']} frames in {elapsed:.1f} s, "
+          f"{total['casts'] / elapsed * 60:.0f} casts per minute in all, "
+          f"{total['casts'] / elapsed * 60 / args.processes:.0f} per process")
+    # only the bot's mistakes should fail, and without mistakes the bot brews every order Perfect
+    if total["failed"] != total["mistakes"] or (args.mistakes == 0 and total["happy"] != total["served"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
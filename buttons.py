@@ -1,4 +1,5 @@
 import pygame
+import text_render
 
 """
 Written by Bruce Roy Harold Legge
@@ -17,7 +18,7 @@ def draw_button(button, screen, font, color):
     (dict, Surface, Font, tuple) -> None
     """
     pygame.draw.rect(screen, color, button["rect"])  # drawing a rectangular button on the screen.
-    text = font.render(button["text"], True, (0, 0, 0))  # Render text.
+    text = text_render.render(font, button["text"], True, (0, 0, 0))  # Render text.
     buttonText = text.get_rect(center=button["rect"].center)  # Centering the text inside the button.
     screen.blit(text, buttonText)  # Draws the text on screen.
 
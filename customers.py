@@ -0,0 +1,100 @@
+import random
+from collections import namedtuple
+import aspects
+
+"""
+Customers for endless mode. Instead of the four professors of the story, endless mode gets its customers from
+generate(), which keeps making new ones forever: each is one of the professors (same portraits, same way of talking)
+coming back with a new order, written into dialogue drawn from that professor's lines below.
+
+The generator only makes a customer when it is asked for one, so the game decides how many upcoming customers it keeps.
+"""
+
+# the lines each professor picks from: dialogue line 1, 2 and 3 (which ends with the order), then the reactions to a
+# perfect, good and bad drink. Lines may contain \n to break them over lines in the text bubble.
+TEMPLATES = (
+    {
+        "name": "Zhao",
+        "portrait": 0,
+        "greeting": ["Hello, hello.", "Hello again.", "Me again. Hello."],
+        "request": ["My order: simple!", "Same as always. Simple!", "Something strong today."],
+        "detail": ["Just tea. Strong.", "Quick, quick.", "No fancy stuff."],
+        "perfect": ["Wow, wonderful.", "Excellent. Thank you."],
+        "good": ["It's okay.", "Hmm. Acceptable."],
+        "bad": ["No, not good.", "This is not my order."],
+    },
+    {
+        "name": "Hamilton",
+        "portrait": 1,
+        "greeting": ["Hey barista!", "Barista! My favourite!", "Back again, barista!"],
+        "request": ["Give me a tea with a \nlittle something in it,", "Surprise me, but \nnot too much,"],
+        "detail": ["Stir it 6 or 7 times", "Stir it the other way", "Don't forget to stir it"],
+        "perfect": ["Cool!", "Nailed it!"],
+        "good": ["You're almost there...", "Close enough!"],
+        "bad": ["No, that's not it.", "Nope, try again tomorrow."],
+    },
+    {
+        "name": "Mintah",
+        "portrait": 2,
+        "greeting": ["Hello CHEMICAL, \nI have not ordered anything yet.", "Hello again, colleague."],
+        "request": ["I would like something \nsimilar to last time.", "I would like a tea \nworthy of a chemist."],
+        "detail": ["I don't care \nif you have to do any magic.", "Measure it precisely."],
+        "perfect": ["Thank you colleague, that is correct!", "Correct, as expected."],
+        "good": ["Those in the back might like this, not me...", "The ratios are slightly off."],
+        "bad": ["I could've made tea better \nthan this when I was two years old.", "This reaction has failed."],
+    },
+    {
+        "name": "Pendar",
+        "portrait": 3,
+        "greeting": ["Good mornin'", "Mornin' again!", "Good afternoon!"],
+        "request": ["I would like a tricky tea today.", "Something new for me, please."],
+        "detail": ["Good luck, this is tricky!", "Don't rush it!"],
+        "perfect": ["That's right! Good job!", "Perfect, just perfect!"],
+        "good": ["Not quite...", "Almost!"],
+        "bad": ["Hmmmm, that's not it.", "That's not what I asked for."],
+    },
+)
+
+# one generated customer: their unique name ("Zhao #37"), the index of their portraits, their order and their 6
+# dialogue lines, in the same shapes as main.customerIndexMap, main.orderList and main.dialogue
+Customer = namedtuple("Customer", ["name", "portrait", "order", "dialogue"])
+
+
+def make_order(rng):
+    """
+    Make an order of 1 to 3 different aspects, each wanted 1 or 2 times.
+
+    :param rng: The random.Random to draw from
+    :return: an aspect vector (see aspects.py)
+    """
+    wanted = rng.sample(aspects.VOCABULARY, rng.randint(1, 3))
+    return aspects.vector({aspect: rng.randint(1, 2) for aspect in wanted})
+
+
+def generate(seed=None, can_make=None):
+    """
+    Make customers forever, one each time the generator is asked for the next.
+
+    :param seed: The seed for the customers' orders and lines, None for different customers every game
+    :param can_make: A function that tells whether an order can be made, e.g. RecipeIndex.can_make; orders it
+                     rejects are drawn again
+    :return: a generator of Customers, numbered from 1
+    """
+    rng = random.Random(seed)  # its own random, so the spell effects stay the same for the same seed
+    number = 0
+    while True:
+        number += 1
+        template = rng.choice(TEMPLATES)
+        order = make_order(rng)
+        while can_make is not None and not can_make(order):
+            order = make_order(rng)
+        wanted = aspects.describe(order)
+        lines = [
+            rng.choice(template["greeting"]),
+            rng.choice(template["request"]),
+            f"{rng.choice(template['detail'])}\n{wanted}",
+            rng.choice(template["perfect"]),
+            rng.choice(template["good"]),
+            rng.choice(template["bad"]),
+        ]
+        yield Customer(f"{template['name']} #{number}", template["portrait"], order, lines)
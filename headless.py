@@ -0,0 +1,342 @@
+import argparse
+import os
+import random
+import time
+from collections import deque
+
+# no window and no sound card: SDL's dummy drivers, set before pygame opens either
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import pygame
+import inputs
+
+"""
+Headless, deterministic runs of the game. A VirtualClock stands in for the pygame Clock and never sleeps, so frames run
+as fast as the CPU allows while the game still sees 1/60th of a second pass per frame, and a ScriptedInput feeds the
+game a fixed list of events and mouse positions instead of the real queue. With random seeded too, the same script
+always plays out the same way.
+
+`python headless.py` plays a whole session, from the start screen through every customer to the end screen.
+`python headless.py --endless 100` serves 100 customers of endless mode instead.
+"""
+
+SCREEN_SIZE = (1280, 720)
+
+
+class ScriptFinished(Exception):
+    # raised from inside a game loop once the script has no input left
+    pass
+
+
+class VirtualClock:
+    def __init__(self):
+        """
+        The VirtualClock class has the same methods as a pygame Clock, but time only moves when the game ticks it (or
+        waits for input), by exactly the frame length it asked for.
+        """
+        self.time = 0.0  # milliseconds since the clock was made
+        self.frames = 0
+        self._last_frame = 0.0
+
+    def tick(self, framerate=0):
+        self._last_frame = 1000 / framerate if framerate else 0.0
+        self.time += self._last_frame
+        self.frames += 1
+        return round(self._last_frame)
+
+    def advance(self, milliseconds):
+        self.time += milliseconds
+
+    def get_time(self):
+        return round(self._last_frame)
+
+    def get_rawtime(self):
+        return 0
+
+    def get_fps(self):
+        return 1000 / self._last_frame if self._last_frame else 0.0
+
+
+class ScriptedInput:
+    def __init__(self, script, start_pos=(0, 0)):
+        """
+        The ScriptedInput class replaces the event queue and the mouse with a script. Each time a game loop asks for
+        events it gets the next step of the script, so the script is written in frames rather than in seconds.
+
+        A script is a list of actions:
+        ("wait", n) gives n frames without any input
+        ("move", (x, y)) moves the mouse
+        ("click", (x, y)) moves the mouse, then presses and releases the left button on the next frame (the spellbook
+        reads where the mouse was on the frame before the click)
+        ("key", key) presses and releases a key, e.g. pygame.K_RETURN
+        ("trace", [(x, y), ...]) moves the mouse through each point, one per frame
+
+        :param script: The list (or any iterable) of actions
+        :param start_pos: Where the mouse starts
+        """
+        self.pos = start_pos
+        self.virtual_clock = VirtualClock()
+        self._actions = iter(script)  # read one at a time, so a script can be a generator that never ends
+        self._steps = deque()  # (mouse position, events) for each frame of the actions read so far
+        self._posted = []  # events the game caused itself, like the motion from set_mouse_pos()
+
+    def _add(self, kind, value):
+        if kind == "wait":
+            self._steps.extend([None] * value)
+        elif kind == "move":
+            self._steps.append((value, [_motion(value)]))
+        elif kind == "click":
+            self._steps.append((value, [_motion(value)]))
+            self._steps.append((value, [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=value, button=1),
+                                        pygame.event.Event(pygame.MOUSEBUTTONUP, pos=value, button=1)]))
+        elif kind == "key":
+            self._steps.append((None, [pygame.event.Event(pygame.KEYDOWN, key=value, mod=0, unicode=""),
+                                       pygame.event.Event(pygame.KEYUP, key=value, mod=0, unicode="")]))
+        elif kind == "trace":
+            for point in value:
+                self._add("move", point)
+        else:
+            raise ValueError(f"unknown script action {kind!r}")
+
+    def events(self):
+        while not self._steps:
+            action = next(self._actions, None)
+            if action is None:
+                raise ScriptFinished()
+            self._add(*action)
+        step = self._steps.popleft()
+        events, self._posted = self._posted, []
+        if step is not None:
+            pos, step_events = step
+            if pos is not None:
+                self.pos = pos
+            events += step_events
+        return events
+
+    def wait(self, timeout):
+        events = self.events()
+        if not events:
+            self.virtual_clock.advance(timeout)  # nothing happened, so the whole timeout passed
+        return events
+
+    def mouse_pos(self):
+        return self.pos
+
+    def set_mouse_pos(self, pos):
+        # like SDL, moving the mouse from code produces a motion event
+        self.pos = tuple(pos)
+        self._posted.append(_motion(self.pos))
+
+    def clock(self):
+        return self.virtual_clock
+
+
+def _motion(pos):
+    return pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0))
+
+
+def session_script(screen_size=SCREEN_SIZE, casts=None):
+    """
+    Make a script that plays the whole game: start the game, talk to every customer, cast three spells for each and
+    finish on the end screen.
+
+    :param screen_size: The (width, height) of the game window
+    :param casts: For each customer, the three page numbers of the spells to cast; by default spells that make their
+                  order Perfect
+    :return: a list of script actions for ScriptedInput
+    """
+    import main
+
+    casts = casts or [recipe_pages(screen_size, main.orderList[name]) for name in main.customerOrder]
+    script = start_actions()
+    for pages in casts:
+        script += customer_actions(screen_size, pages)
+    return script
+
+
+def endless_script(screen_size=SCREEN_SIZE, customers=None):
+    """
+    Make a script for endless mode (see main.startEndless()) that serves customers one after another, casting the first
+    spell three times for each. The actions are made as they are read, so the script takes no more memory for
+    thousands of customers than for one.
+
+    :param screen_size: The (width, height) of the game window
+    :param customers: The number of customers to serve, None to never stop
+    :return: a generator of script actions for ScriptedInput
+    """
+    yield from start_actions()
+    served = 0
+    while customers is None or served < customers:
+        yield from customer_actions(screen_size, [0, 0, 0])
+        served += 1
+
+
+def recipe_pages(screen_size, order):
+    """
+    :param screen_size: The (width, height) of the game window
+    :param order: The aspect vector a customer ordered
+    :return: the page numbers of spells that make the order Perfect, the ones the spellbook's hint points to first
+    """
+    import aspects
+    import hints
+    import minigame3
+
+    spells = minigame3.make_spells(screen_size)
+    recipes = hints.index_for(spells, minigame3.CASTS)
+    formulation = aspects.zeros()
+    pages = []
+    for cast in range(minigame3.CASTS):
+        hinted = recipes.perfect_spells(order, formulation, minigame3.CASTS - cast)
+        page = spells.index(hinted[0]) if hinted else 0
+        formulation = formulation + spells[page].effect
+        pages.append(page)
+    return pages
+
+
+def start_actions():
+    # click the start button, then enter the shop
+    return [("wait", 2), ("click", (650, 606)), ("wait", 2), ("key", pygame.K_RETURN)]
+
+
+def customer_actions(screen_size, pages):
+    """
+    Make the actions that serve one customer: read their dialogue, cast the spells on the given pages of the spellbook,
+    and send them off after their reaction.
+
+    :param screen_size: The (width, height) of the game window
+    :param pages: The page numbers of the three spells to cast
+    :return: a list of script actions
+    """
+    import bot
+    import minigame3
+
+    spells = minigame3.make_spells(screen_size)
+    # the bot's path goes around the nodes a straight line would touch, without any jitter or mistakes
+    tracer = bot.Bot(jitter=0, seed=0)
+    script = dialogue_actions()
+    page = 0
+    for target in pages:
+        trace, _ = tracer.trace(spells[target].node_positions, minigame3.cast_start_pos(screen_size))
+        script += cast_actions(screen_size, page, target, trace)
+        page = target
+    return script + farewell_actions()
+
+
+def dialogue_actions():
+    # read the customer's dialogue, which starts the minigame
+    return [("wait", 2)] + [("key", pygame.K_RETURN), ("wait", 2)] * 4
+
+
+def farewell_actions():
+    # the customer's reaction, then on to the next one
+    return [("wait", 3), ("key", pygame.K_RETURN), ("wait", 3)]
+
+
+def spellbook_buttons(screen_size):
+    """
+    :param screen_size: The (width, height) of the game window
+    :return: the screen coordinates of the middle of the spellbook's cast button, right arrow and left arrow
+    """
+    width, height = screen_size
+    # the same layout as run_minigame3
+    book_x, book_y = (width - 800) // 2, (height - 500) // 2
+    return (book_x + 430 + 110, book_y + 10 + 350 + 27), (book_x + 800 - 45, book_y + 37), (book_x + 45, book_y + 37)
+
+
+def cast_actions(screen_size, page, target, trace):
+    """
+    Make the actions that cast one spell from the spellbook: flip from the open page to the spell's page, press the
+    cast button, trace the spell and wait for the cast's effects and the result message to finish.
+
+    :param screen_size: The (width, height) of the game window
+    :param page: The page number the spellbook is open at
+    :param target: The page number of the spell to cast
+    :param trace: The mouse positions to trace the spell with, one per frame, from where the cast moves the mouse to
+                  (minigame3.cast_start_pos())
+    :return: a list of script actions
+    """
+    import minigame3
+    import spellcaster
+
+    pages = len(minigame3.make_spells(screen_size))
+    cast_button, right_arrow, left_arrow = spellbook_buttons(screen_size)
+
+    # flip to the spell's page the shorter way round
+    script = []
+    forward = (target - page) % pages
+    arrow, flips = (right_arrow, forward) if forward <= pages // 2 else (left_arrow, pages - forward)
+    for _ in range(flips):
+        script += [("click", arrow), ("wait", 1)]
+
+    script += [("click", cast_button), ("wait", 2), ("trace", trace)]
+    # the cast's effects, then the result message in the book, each with a few frames to spare
+    script += [("wait", spellcaster.EFFECT_FRAMES + 5), ("wait", minigame3.RESULT_FRAMES + 5)]
+    return script
+
+
+def run_session(seed=0, script=None):
+    """
+    Play a scripted session of the whole game headlessly.
+
+    :param seed: The seed for random, which decides the spell effects
+    :param script: The script to play, session_script() by default
+    :return: a dictionary with the final game state, the number of professors helped and customers served, the number
+             of spells cast and of casts that failed, the number of frames, the virtual time that passed and the real
+             time it took
+    """
+    import main
+    import minigame3
+
+    casts_before = dict(minigame3.cast_counts)
+    main.startup()  # open the window first, so the spell icons session_script() loads are made for it
+    random.seed(seed)
+    source = ScriptedInput(script if script is not None else session_script(main.mainScreen.get_size()))
+    old = inputs.use(source)
+    start = time.perf_counter()
+    try:
+        main.main()
+    except ScriptFinished:
+        pass
+    finally:
+        inputs.use(old)
+    return {
+        "gameState": main.gameState,
+        "professors_helped": main.professors_helped,
+        "customers_served": main.customersServed,
+        "casts": minigame3.cast_counts["cast"] - casts_before["cast"],
+        "failed_casts": minigame3.cast_counts["failed"] - casts_before["failed"],
+        "frames": source.virtual_clock.frames,
+        "virtual_seconds": source.virtual_clock.time / 1000,
+        "real_seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a scripted session of the game without a window.")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random spell effects")
+    parser.add_argument("--endless", type=int, metavar="CUSTOMERS", help="serve this many customers in endless mode instead")
+    args = parser.parse_args()
+
+    if args.endless:
+        import main as game
+        game.startup()
+        game.startEndless(args.seed)
+        result = run_session(args.seed, endless_script(game.mainScreen.get_size(), args.endless))
+        print(f"served {game.customersServed} endless customers, {result['professors_helped']} happy, "
+              f"{result['failed_casts']}/{result['casts']} casts failed: "
+              f"{result['frames']} frames, {result['virtual_seconds']:.1f} s of game time in {result['real_seconds']:.1f} s")
+        # the script's traces never touch a node out of order, so any failed cast is a bug
+        if game.customersServed != args.endless or result["failed_casts"]:
+            raise SystemExit(1)
+        return
+
+    result = run_session(args.seed)
+    print(f"reached {result['gameState']} with {result['professors_helped']}/{result['customers_served']} professors happy, "
+          f"{result['failed_casts']}/{result['casts']} casts failed: "
+          f"{result['frames']} frames, {result['virtual_seconds']:.1f} s of game time in {result['real_seconds']:.1f} s")
+    if result["gameState"] != "gameComplete" or result["failed_casts"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
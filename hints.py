@@ -0,0 +1,187 @@
+import numpy as np
+import aspects
+
+"""
+What can be brewed with the spells in the spellbook, worked out once instead of by trying spells.
+
+A RecipeIndex is built from a list of spells and a number of casts. It knows every aspect vector the spells can make
+within that many casts and the smallest combinations of spells that make each one, whether an order can be made
+Perfect, and, for the hint in the spellbook, which spells still lead to a Perfect from the tea brewed so far.
+
+Amounts are saturated: once a tea has as much of an aspect as an order asks for, more of it makes no difference to
+that order. The index saturates every aspect at a cap (the most any order asks for), and the hints only look at what
+the tea still lacks for one order. Both are dynamic programs over these saturated states, each state worked out once
+and remembered, so they grow with the number of different states and not with the number of ways to cast spells.
+"""
+
+
+class RecipeIndex:
+    def __init__(self, spells, casts=3, cap=None):
+        """
+        Build the index of every aspect vector the spells can make within the given number of casts.
+
+        :param spells: The spells that can be cast, anything with .name and .effect (an aspect vector), e.g. the
+                       CatalogSpells from spell_catalog.spells()
+        :param casts: The most spells that can be cast for one tea
+        :param cap: The amount each aspect is saturated at, the largest amount an order asks for; by default nothing
+                    is saturated (the most a single spell adds, times casts)
+        """
+        self.spells = tuple(spells)
+        self.casts = casts
+        self.effects = np.array([spell.effect for spell in self.spells], dtype=aspects.AMOUNT_TYPE)
+        self.effects = self.effects.reshape(-1, len(aspects.VOCABULARY))
+        if cap is None:
+            cap = int(self.effects.max(initial=0)) * casts
+        self.cap = cap
+
+        # breadth first over the number of casts: depth[state] is the fewest casts that make a state, and
+        # parents[state] the (state, spell index) pairs one cast before it at that depth
+        zero = tuple(aspects.zeros().tolist())
+        self.depth = {zero: 0}
+        self._parents = {zero: []}
+        frontier = [zero]
+        for cast in range(1, casts + 1):
+            following = []
+            for state in frontier:
+                made = np.minimum(np.asarray(state) + self.effects, cap)
+                for spell, after in enumerate(map(tuple, made.tolist())):
+                    if after not in self.depth:
+                        self.depth[after] = cast
+                        self._parents[after] = [(state, spell)]
+                        following.append(after)
+                    elif self.depth[after] == cast:
+                        self._parents[after].append((state, spell))
+            frontier = following
+
+        self._combinations = {zero: {()}}
+        self._needed = {}  # deficit -> fewest casts that cover it, None when no number of casts does
+        self._hints = {}  # order -> {(deficit, casts left): spells}
+
+    def __len__(self):
+        return len(self.depth)
+
+    def _key(self, amounts):
+        return tuple(np.minimum(amounts, self.cap).tolist())
+
+    def combinations(self, amounts):
+        """
+        :param amounts: An aspect vector
+        :return: the smallest combinations of spells that make exactly these (saturated) amounts, as a sorted list of
+                 tuples of spell names; empty when the amounts can't be made
+        """
+        key = self._key(amounts)
+        if key not in self.depth:
+            return []
+        return sorted(tuple(self.spells[index].name for index in combination) for combination in self._combos(key))
+
+    def _combos(self, state):
+        if state not in self._combinations:
+            self._combinations[state] = {tuple(sorted(combination + (spell,)))
+                                         for parent, spell in self._parents[state] for combination in self._combos(parent)}
+        return self._combinations[state]
+
+    def casts_needed(self, order, formulation=None):
+        """
+        :param order: The aspect vector a customer ordered
+        :param formulation: The aspect vector brewed so far, nothing by default
+        :return: the fewest further casts that make the tea Perfect for the order, or None if no number of casts can
+        """
+        return self._casts_needed(self._deficit(order, formulation))
+
+    def _deficit(self, order, formulation=None):
+        # what the tea still lacks of each aspect, which is all that matters for reaching a Perfect
+        deficit = np.asarray(order) if formulation is None else np.asarray(order) - formulation
+        return tuple(np.maximum(deficit, 0).tolist())
+
+    def _casts_needed(self, deficit):
+        # fewest casts to cover a deficit: 0 for none, otherwise 1 + the best of what each helpful spell leaves
+        if deficit not in self._needed:
+            if not any(deficit):
+                self._needed[deficit] = 0
+            else:
+                best = None
+                missing = np.asarray(deficit)
+                for effect in self.effects:
+                    if not (effect[missing > 0] > 0).any():
+                        continue  # doesn't help with anything still missing (so every spell tried shrinks the deficit)
+                    after = self._casts_needed(tuple(np.maximum(missing - effect, 0).tolist()))
+                    if after is not None and (best is None or after + 1 < best):
+                        best = after + 1
+                self._needed[deficit] = best
+        return self._needed[deficit]
+
+    def can_make(self, order, casts=None):
+        """
+        :param order: The aspect vector a customer ordered
+        :param casts: The number of casts available, self.casts by default
+        :return: whether some spells cast at most that many times make the tea Perfect
+        """
+        needed = self.casts_needed(order)
+        return needed is not None and needed <= (self.casts if casts is None else casts)
+
+    def perfect_spells(self, order, formulation, casts_left):
+        """
+        The hint: which spells, cast next, still let the tea be made Perfect in the casts that are left. The answers
+        for an order are all worked out the first time it is asked about, after which this is a lookup.
+
+        :param order: The aspect vector the customer ordered
+        :param formulation: The aspect vector brewed so far
+        :param casts_left: The number of casts left, including the next one
+        :return: a tuple of the spells, in spellbook order; empty if a Perfect can't be reached any more, every
+                 spell if the tea is already Perfect
+        """
+        order_key = tuple(np.asarray(order).tolist())
+        if order_key not in self._hints:
+            self._hints[order_key] = self._hint_table(order_key)
+        return self._hints[order_key].get((self._deficit(order, formulation), casts_left), ())
+
+    def _hint_table(self, order):
+        # every deficit the order can be left with, and for each number of casts left, the spells worth casting
+        table = {}
+        for deficit in np.ndindex(*[max(amount, 0) + 1 for amount in order]):
+            missing = np.asarray(deficit)
+            # the casts each spell would still need after it, None where it leads nowhere
+            after = [self._casts_needed(tuple(np.maximum(missing - effect, 0).tolist())) for effect in self.effects]
+            for casts_left in range(1, self.casts + 1):
+                table[(deficit, casts_left)] = tuple(spell for spell, needed in zip(self.spells, after)
+                                                     if needed is not None and needed <= casts_left - 1)
+        return table
+
+
+def check_orders(orders, index):
+    """
+    Make sure every order can be made Perfect with the spells and casts of an index.
+
+    :param orders: A dictionary mapping customer names to the aspect vectors they order
+    :param index: A RecipeIndex
+    :return: None
+    :raise ValueError: naming every order that can't be made, and how many casts it would need
+    """
+    problems = []
+    for name, order in orders.items():
+        if not index.can_make(order):
+            needed = index.casts_needed(order)
+            problems.append(f"{name}'s order ({aspects.describe(order)}) "
+                            + ("can't be made with these spells" if needed is None else f"needs {needed} casts"))
+    if problems:
+        raise ValueError(f"{len(problems)} order(s) can't be made Perfect in {index.casts} casts:\n  " + "\n  ".join(problems))
+
+
+# indexes already built, keyed by the identity of their spell tuple and the number of casts
+_indexes = {}
+
+
+def index_for(spells, casts=3, cap=None):
+    """
+    Get the RecipeIndex of a tuple of spells, building it the first time. The compiled spell tuples from spell_catalog
+    are shared, so every visit to the spellbook gets the same index.
+
+    :param spells: The tuple of spells, e.g. from spell_catalog.spells()
+    :param casts: The most spells that can be cast for one tea
+    :param cap: The amount each aspect is saturated at, see RecipeIndex
+    :return: a RecipeIndex
+    """
+    key = (id(spells), casts, cap)
+    if key not in _indexes or _indexes[key][0] is not spells:
+        _indexes[key] = (spells, RecipeIndex(spells, casts, cap))
+    return _indexes[key][1]
@@ -0,0 +1,77 @@
+import pygame
+import profiler
+
+"""
+Everything the game loops read from the outside world: input events, the mouse position and the frame clock. The loops
+ask this module instead of calling pygame directly, so a different source (like the scripted input and virtual clock in
+headless.py) can be swapped in with use().
+"""
+
+
+class PygameInput:
+    """
+    The PygameInput class is the normal source: the real event queue, the real mouse and a wall clock pygame Clock.
+    """
+
+    def events(self):
+        """
+        :return: the list of pygame Events waiting on the queue
+        """
+        return pygame.event.get()
+
+    def wait(self, timeout):
+        """
+        Block until there is at least one event, or until timeout milliseconds have passed.
+
+        :param timeout: The longest time to wait in milliseconds
+        :return: the list of pygame Events that arrived, empty if none did
+        """
+        event = pygame.event.wait(timeout)
+        events = [event] if event.type != pygame.NOEVENT else []
+        return events + pygame.event.get()
+
+    def mouse_pos(self):
+        return pygame.mouse.get_pos()
+
+    def set_mouse_pos(self, pos):
+        pygame.mouse.set_pos(pos)
+
+    def clock(self):
+        return pygame.time.Clock()
+
+
+# the source every game loop reads from
+source = PygameInput()
+
+
+def use(new_source):
+    """
+    Make every game loop read from new_source from now on.
+
+    :param new_source: An object with the same methods as PygameInput
+    :return: the source that was in use before
+    """
+    global source
+    old, source = source, new_source
+    return old
+
+
+# every event passes by the profiler, which shows or hides its overlay when F3 is pressed
+def events():
+    return profiler.watch(source.events())
+
+
+def wait(timeout):
+    return profiler.watch(source.wait(timeout))
+
+
+def mouse_pos():
+    return source.mouse_pos()
+
+
+def set_mouse_pos(pos):
+    source.set_mouse_pos(pos)
+
+
+def clock():
+    return source.clock()
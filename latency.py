@@ -0,0 +1,193 @@
+import atexit
+import csv
+import math
+import os
+import time
+import pygame
+
+"""
+Input latency measurement. Every input event is timestamped when a game loop takes it off the event queue, and the
+time until the first frame presented after it ("present") and until the first sound effect played in reaction to it
+("sound") is recorded for the scene the event arrived in. The 50th, 95th and 99th percentiles per scene can be printed
+or written to a CSV file.
+
+Measurement is off by default. Set TEASHOP_LATENCY to the path of a CSV file to measure a play session; the report is
+printed and written there when the game exits.
+"""
+
+LATENCY_CSV = os.environ.get("TEASHOP_LATENCY", "")
+
+# the events a player causes
+INPUT_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION)
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyTracker:
+    def __init__(self, enabled=False):
+        """
+        The LatencyTracker class pairs input events with the presents and sounds that show the game's reaction to them.
+
+        Game loops pass the events they take off the queue through track(), tell the tracker which scene they are in
+        with scene(), and call sound() right after playing a sound effect in reaction to input. The Renderer calls
+        presented() after each frame it shows. A loop whose reaction to this frame's input only appears on screen in
+        the frame after the next present calls hold(), and a loop that skips drawing a frame because nothing changed
+        calls discard(), since that input had nothing to show.
+
+        :param enabled: Whether to measure; while disabled every method returns straight away
+        """
+        self.enabled = enabled
+        self.current_scene = "game"
+        self.samples = []  # (scene, "present" or "sound", seconds)
+        self._pending = []  # [scene, dequeue time, presents still to skip] of events not shown yet
+        self._batch = []  # the input events taken off the queue this frame, which a sound can react to
+
+    def scene(self, name):
+        self.current_scene = name
+
+    def track(self, events):
+        """
+        Timestamp the input events a game loop just took off the event queue.
+
+        :param events: The list of pygame Events from pygame.event.get()
+        :return: the same list of events
+        """
+        if not self.enabled:
+            return events
+        now = time.perf_counter()
+        self._batch = [[self.current_scene, now, 0] for event in events if event.type in INPUT_EVENTS]
+        self._pending += self._batch
+        return events
+
+    def hold(self):
+        """
+        The reaction to the input taken so far will only be visible one present later than usual.
+
+        :return: None
+        """
+        for pending in self._pending:
+            pending[2] = 1
+
+    def presented(self):
+        """
+        A frame was just shown: it reflects every pending event that isn't held back.
+
+        :return: None
+        """
+        if not self.enabled or not self._pending:
+            return
+        now = time.perf_counter()
+        waiting = []
+        for pending in self._pending:
+            if pending[2]:
+                pending[2] -= 1
+                waiting.append(pending)
+            else:
+                self.samples.append((pending[0], "present", now - pending[1]))
+        self._pending = waiting
+
+    def discard(self):
+        """
+        The frame was not drawn because it would look the same, so the input pending for it changed nothing on screen.
+
+        :return: None
+        """
+        self._pending = [pending for pending in self._pending if pending[2]]
+
+    def sound(self):
+        """
+        A sound effect was just played in reaction to this frame's input. Only the first sound after an input counts.
+
+        :return: None
+        """
+        if not self.enabled or not self._batch:
+            return
+        first = self._batch[0]
+        self.samples.append((first[0], "sound", time.perf_counter() - first[1]))
+        self._batch = []
+
+    def summary(self):
+        """
+        :return: a list of dictionaries with the scene, the metric, the number of samples and the p50, p95 and p99
+                 latencies in milliseconds, sorted by scene and metric
+        """
+        grouped = {}
+        for scene, metric, seconds in self.samples:
+            grouped.setdefault((scene, metric), []).append(seconds * 1000)
+        rows = []
+        for (scene, metric), values in sorted(grouped.items()):
+            values.sort()
+            row = {"scene": scene, "metric": metric, "count": len(values)}
+            for p in PERCENTILES:
+                row[f"p{p}_ms"] = round(percentile(values, p), 3)
+            rows.append(row)
+        return rows
+
+    def write_csv(self, path):
+        """
+        Write summary() to a CSV file.
+
+        :param path: The path of the CSV file
+        :return: None
+        """
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, ["scene", "metric", "count"] + [f"p{p}_ms" for p in PERCENTILES])
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+    def report(self):
+        """
+        Print summary() as a table.
+
+        :return: None
+        """
+        print("input latency (ms)")
+        for row in self.summary():
+            print(f"  {row['scene']:<14} {row['metric']:<8} n={row['count']:<6}"
+                  + "".join(f" p{p} {row[f'p{p}_ms']:8.1f}" for p in PERCENTILES))
+
+
+def percentile(values, p):
+    """
+    :param values: A sorted list of numbers
+    :param p: The percentile, from 0 to 100
+    :return: the smallest value that at least p percent of the values are less than or equal to
+    """
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+# the tracker shared by every game loop
+tracker = LatencyTracker(enabled=bool(LATENCY_CSV))
+
+
+def scene(name):
+    tracker.scene(name)
+
+
+def track(events):
+    return tracker.track(events)
+
+
+def hold():
+    tracker.hold()
+
+
+def presented():
+    tracker.presented()
+
+
+def discard():
+    tracker.discard()
+
+
+def sound():
+    tracker.sound()
+
+
+def _export():
+    tracker.report()
+    tracker.write_csv(LATENCY_CSV)
+
+
+if LATENCY_CSV:
+    atexit.register(_export)
@@ -1,6 +1,19 @@
+import os
 import pygame
 import sys
 import buttons
+import assets
+import text_render
+import renderer
+import pacing
+import latency
+import inputs
+import profiler
+import spell_catalog
+import customers
+import aspects
+import hints
+import minigame3
 
 from minigame3 import run_minigame3
 
@@ -8,49 +21,27 @@ from minigame3 import run_minigame3
 Written by Albert Hwang and Bruce Roy Harold Legge
 """
 
-pygame.init()
-
 # Window 
 width = 1280
 height = 720
-mainScreen = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Pygame GUI")
-
-# Font
-defaultFont = pygame.font.SysFont("arial", 30)
-dialogueFont = pygame.font.SysFont("timesnewroman", 28)
-
-# Images
-startImage = pygame.image.load("images/startScreen.png")
-inGameImage = pygame.image.load("images/ingame.png")
-textBubble = pygame.image.load("images/textBubble.png")
-textBubble = pygame.transform.scale(textBubble, (600, 350))
-
-professors = [
-    [pygame.image.load("images/zhao0.png")],      # 0 - Zhao (neutral)
-    [pygame.image.load("images/hamilton0.png")],  # 1 - Hamilton (neutral)
-    [pygame.image.load("images/mintah0.png")],    # 2 - Mintah (neutral)
-    [pygame.image.load("images/pendar0.png")]     # 3 - Pendar (neutral)
-]
-
-# Reaction images
-angry = [
-    pygame.image.load("images/zhao2.png"),
-    pygame.image.load("images/hamilton2.png"),
-    pygame.image.load("images/mintah2.png"),
-    pygame.image.load("images/pendar2.png")
-]
 
-happy = [
-    pygame.image.load("images/zhao1.png"),
-    pygame.image.load("images/hamilton1.png"),
-    pygame.image.load("images/mintah1.png"),
-    pygame.image.load("images/pendar1.png")
-]
-
-# Sounds
-dialogueSound = pygame.mixer.Sound("sounds/talking.mp3")
-dialogueSound.set_volume(0.5)
+# The window, fonts, images and sounds are created by startup() rather than at import, so importing this module
+# (from a tool or a benchmark) doesn't boot the whole game
+mainScreen = None
+frame = None
+defaultFont = None
+dialogueFont = None
+startImage = None
+inGameImage = None
+textBubble = None
+dialogueSound = None
+
+# Customer portraits are loaded on demand, one set per customer index (see customerIndexMap) holding the
+# "neutral", "happy" and "angry" images, so only the current and the next customer are ever in memory
+portraitNames = ["zhao", "hamilton", "mintah", "pendar"]
+expressions = ["neutral", "happy", "angry"]
+portraitSets = {}
+prefetchedPortraits = set()
 
 # Where to draw the bubble
 bubbleX = 430
@@ -67,6 +58,13 @@ customerIndexMap = {
 # Customer order
 customerOrder = ["Zhao", "Hamilton", "Mintah", "Pendar"]
 
+# Endless mode: set TEASHOP_ENDLESS=1 to serve generated customers forever instead of the four professors (see
+# startEndless()). Only customerWindow customers, the current one and those right behind them, are kept at a time.
+ENDLESS = os.environ.get("TEASHOP_ENDLESS") == "1"
+customerWindow = 3
+customerSource = None
+customersServed = 0  # in both modes, for the end screen and the soak report
+
 # Game State
 gameState = "startScreen"
 dialogueNum = 0
@@ -115,14 +113,78 @@ dialogue = {
         "I could've made tea better \nthan this when I was two years old."
     ]
 }
-# AH: Target ingredient amounts for each customer
+#BRHL: Explanation of how to play
+instructions = [
+    "HOW TO PLAY",
+    "",
+    "Press ENTER to advance dialogue, and H in the spellbook for a hint.",
+    "Your goal is to prepare each customer's drink",
+    "by casting spells to add ingredients to tea mixtures.",
+    "",
+    "The minigame works like an Euler Trail:",
+    "you must trace edges exactly once",
+    "to choose the ingredients. ",
+    "",
+    "Be sure you dont trace the same node twice!",
+    "",
+    "Meet or exceed their ingredients to get a perfect score! You get 3 casts per ccustomer!",
+    "",
+    "Press ENTER to begin."
+]
+
+# AH: Target ingredient amounts for each customer, as aspect vectors (see aspects.py)
 orderList = {
-    "Zhao": {"Sweet": 1, "Bitter": 1},
-    "Hamilton": {"Bitter": 2, "Spice": 1, "Sweet": 1},
-    "Mintah": {"Creamy": 1, "Sweet": 2, "Tea": 2},
-    "Pendar": {"Mint": 2, "Spice": 1, "Citrus": 1, "Sweet": 1}
+    "Zhao": aspects.vector({"Sweet": 1, "Bitter": 1}),
+    "Hamilton": aspects.vector({"Bitter": 2, "Spice": 1, "Sweet": 1}),
+    "Mintah": aspects.vector({"Creamy": 1, "Sweet": 2, "Tea": 2}),
+    "Pendar": aspects.vector({"Mint": 2, "Spice": 1, "Citrus": 1, "Sweet": 1})
 }
 
+def startup():
+    """
+    () -> None
+    Open the window and load the fonts, images and sounds the main loop draws. Only the display and font
+    subsystems are started here; the mixer starts the first time a sound is loaded. Safe to call more than once.
+    """
+    global mainScreen
+    global frame
+    global defaultFont
+    global dialogueFont
+    global startImage
+    global inGameImage
+    global textBubble
+    global dialogueSound
+
+    if (mainScreen is not None):
+        return
+
+    pygame.display.init()
+    pygame.font.init()
+    mainScreen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("Pygame GUI")
+    # shared by every screen main() draws (see renderer.py)
+    frame = renderer.Renderer(mainScreen)
+
+    # Font
+    defaultFont = assets.sysfont("arial", 30)
+    dialogueFont = assets.sysfont("timesnewroman", 28)
+
+    # Images
+    startImage = assets.image("images/startScreen.png", alpha=assets.OPAQUE)
+    inGameImage = assets.image("images/ingame.png")
+    textBubble = assets.image("images/textBubble.png", (600, 350), assets.PREMULTIPLIED)
+
+    # Sounds
+    dialogueSound = assets.sound("sounds/talking.mp3")
+    dialogueSound.set_volume(0.5)
+
+    # Spells: read and check the spell catalog now, so a broken catalog stops the game at startup instead of in the
+    # spellbook, and opening the spellbook doesn't have to read it
+    spells = spell_catalog.spells((width, height))
+
+    # Recipes: index what the spells can brew, and make sure every customer's order can be made Perfect with them
+    hints.check_orders(orderList, hints.index_for(spells, minigame3.CASTS))
+
 # By: AH
 def enterReleased(event):#AH
     '''
@@ -135,19 +197,15 @@ def enterReleased(event):#AH
     )
 
 # By: AH
-def valueCheck(order: dict, result: dict):#AH
+def valueCheck(order, result):#AH
     """
-    (dict, dict) -> str
-    Compare the required order with the minigame result.
+    (ndarray, ndarray) -> str
+    Compare the required order with the minigame result, both aspect vectors.
+    Missing any aspect of the order is Bad, having at least as much of every aspect is Perfect, anything else is Good.
     """
-    for key in order:
-        if key not in result:
-            return "Bad"
-    perfect = True
-    for key in order:
-        if result[key] < order[key]:
-            perfect = False
-    if (perfect):
+    if ((order > 0) & (result <= 0)).any():
+        return "Bad"
+    if ((result >= order).all()):
         return "Perfect"
     return "Good"
 
@@ -160,24 +218,21 @@ def drawCustomerDialogue(customerName):#AH
     global dialogueNum  
     global currentExpression
 
-    mainScreen.blit(inGameImage, (0, 0))
-
-    customerIndex = customerIndexMap[customerName]
+    frame.blit(inGameImage, (0, 0))
 
     # Choose image based on expression
-    if (currentExpression == "happy"):
-        profImage = happy[customerIndex]
-    elif (currentExpression == "angry"):
-        profImage = angry[customerIndex]
-    else:
-        profImage = professors[customerIndex][0]
+    profImage = getPortraits(customerName)[currentExpression]
 
-    mainScreen.blit(profImage, (0, -10))
+    frame.blit(profImage, (0, -10))
+
+    # Start decoding the next customer's portraits while this one talks
+    if (currentCustomerIndex + 1 < len(customerOrder)):
+        prefetchPortraits(customerOrder[currentCustomerIndex + 1])
 
     currentLines = dialogue[customerName]
 
     if (dialogueNum >= 1):
-        mainScreen.blit(textBubble, (bubbleX, bubbleY))
+        frame.blit(textBubble, (bubbleX, bubbleY), special_flags=pygame.BLEND_PREMULTIPLIED)
 
         lineIndex = dialogueNum - 1
 
@@ -189,10 +244,82 @@ def drawCustomerDialogue(customerName):#AH
             lineSpacing = 35
 
             for i, line in enumerate(lines):
-                textSurface = dialogueFont.render(line, True, (0, 0, 0))
+                textSurface = text_render.render(dialogueFont, line, True, (0, 0, 0))
                 textX = bubbleX + (textBubble.get_width() - textSurface.get_width()) // 2
                 textY = baseY + i * lineSpacing + 30
-                mainScreen.blit(textSurface, (textX, textY))
+                frame.blit(textSurface, (textX, textY))
+
+def portraitPaths(customerIndex):
+    """
+    (int) -> list
+    Return the image paths of a customer's neutral, happy and angry portraits.
+    """
+    return [f"images/{portraitNames[customerIndex]}{i}.png" for i in range(len(expressions))]
+
+def getPortraits(customerName):
+    """
+    (str) -> dict
+    Return the customer's portraits keyed by expression, loading them the first time they are needed.
+    """
+    customerIndex = customerIndexMap[customerName]
+    if (customerIndex not in portraitSets):
+        images = [assets.image(path) for path in portraitPaths(customerIndex)]
+        portraitSets[customerIndex] = dict(zip(expressions, images))
+    return portraitSets[customerIndex]
+
+def prefetchPortraits(customerName):
+    """
+    (str) -> None
+    Start decoding a customer's portraits in the background so they are ready when the customer walks in.
+    """
+    customerIndex = customerIndexMap[customerName]
+    if (customerIndex not in portraitSets and customerIndex not in prefetchedPortraits):
+        prefetchedPortraits.add(customerIndex)
+        assets.preload(portraitPaths(customerIndex))
+
+def evictPortraits(keepNames):
+    """
+    (list) -> None
+    Drop the portraits of every customer not named in keepNames.
+    """
+    keep = {customerIndexMap[name] for name in keepNames}
+    for customerIndex in list(portraitSets) + list(prefetchedPortraits):
+        if (customerIndex not in keep):
+            portraitSets.pop(customerIndex, None)
+            prefetchedPortraits.discard(customerIndex)
+            for path in portraitPaths(customerIndex):
+                assets.cache.evict(path)
+
+def allPortraitPaths():
+    """
+    () -> list
+    Return the portrait paths of every customer, which are loaded on demand rather than preloaded.
+    """
+    return [path for customerIndex in range(len(portraitNames)) for path in portraitPaths(customerIndex)]
+
+def drawLoadingBar(progress):
+    """
+    (float) -> None
+    Draw a thin progress bar along the bottom of the screen while assets are preloading.
+    """
+    frame.rect((60, 40, 30), (0, height - 6, width, 6))
+    frame.rect((255, 220, 180), (0, height - 6, int(width * progress), 6))
+
+def drawHowToPlay():
+    """
+    () -> None
+    Draw the how to play instructions.
+    """
+    frame.fill((0, 0, 0))
+
+    base_y = 100
+    spacing = 40
+
+    for i, line in enumerate(instructions):
+        textSurface = text_render.render(dialogueFont, line, True, (255, 255, 255))
+        textX = (width - textSurface.get_width()) // 2
+        textY = base_y + i * spacing
+        frame.blit(textSurface, (textX, textY))
 
 # By: AH
 def goToNextCustomer():
@@ -205,12 +332,17 @@ def goToNextCustomer():
     global gameState
     global dialogueNum
     global currentExpression
+    global customersServed
 
-    pygame.mixer.music.load("sounds/doorBell.mp3")
+    assets.music("sounds/doorBell.mp3")
     pygame.mixer.music.set_volume(0.25)
     pygame.mixer.music.play()
+    latency.sound()
 
     currentCustomerIndex += 1
+    customersServed += 1
+    if (customerSource is not None):
+        refillCustomers()
 
     if (currentCustomerIndex >= len(customerOrder)):
         gameState = "gameComplete"
@@ -224,6 +356,52 @@ def goToNextCustomer():
         dialogueNum = 0
         currentExpression = "neutral"
 
+    # Customers who have left won't be back, keep only the current and next customer's portraits
+    evictPortraits(customerOrder[currentCustomerIndex:currentCustomerIndex + 2])
+
+def startEndless(seed=None):
+    """
+    (int) -> None
+    Switch to endless mode: replace the four professors with customers from customers.generate(), which keeps
+    making new ones with orders and dialogue drawn from templates. Call before main().
+    """
+    global customerSource
+    global currentCustomerIndex
+    global currentCustomer
+
+    # only orders that can be made Perfect with the spellbook
+    recipes = hints.index_for(spell_catalog.spells((width, height)), minigame3.CASTS)
+    customerSource = customers.generate(seed, recipes.can_make)
+    customerOrder.clear()
+    orderList.clear()
+    dialogue.clear()
+    customerIndexMap.clear()
+    currentCustomerIndex = 0
+    refillCustomers()
+    currentCustomer = customerOrder[currentCustomerIndex]
+
+def refillCustomers():
+    """
+    () -> None
+    Endless mode: forget the customers who have been served, then fill the window of upcoming customers back up
+    from the generator, so customerOrder, orderList, dialogue and customerIndexMap never grow.
+    """
+    global currentCustomerIndex
+
+    while (currentCustomerIndex > 0):
+        name = customerOrder.pop(0)
+        del orderList[name]
+        del dialogue[name]
+        del customerIndexMap[name]
+        currentCustomerIndex -= 1
+
+    while (len(customerOrder) < customerWindow):
+        customer = next(customerSource)
+        customerOrder.append(customer.name)
+        orderList[customer.name] = customer.order
+        dialogue[customer.name] = customer.dialogue
+        customerIndexMap[customer.name] = customer.portrait
+
 # By: AH
 def main():
     """
@@ -238,18 +416,30 @@ def main():
     global waitingForNextCustomer
     global currentExpression
     global professors_helped
-    clock = pygame.time.Clock()
+    startup()
+    if (ENDLESS and customerSource is None):
+        startEndless()
+    clock = inputs.clock()
+    # skips redrawing screens that haven't changed and sleeps until the player does something
+    pacer = pacing.Pacer(clock, 60, frame)
+
+    preloader = None
 
     if (gameState == "startScreen"):
-        mainScreen.blit(startImage, (0, 0))
-        pygame.mixer.music.load("sounds/startBGM.mp3")
+        frame.blit(startImage, (0, 0))
+        # decode the minigame and spell assets in the background while the player reads the start screen
+        preloader = assets.preload(exclude=allPortraitPaths())
+        prefetchPortraits(customerOrder[0])
+        assets.music("sounds/startBGM.mp3")
         pygame.mixer.music.play(-1)
         pygame.mixer.music.set_volume(0.5)
         startButton = buttons.create_button(554, 582, 193, 48, "")
         howtoPlayButton = buttons.create_button(554,641,193,48, "")
 
     while True:
-        for event in pygame.event.get():
+        profiler.begin_frame("main")
+        latency.scene("dialogue" if gameState in customerIndexMap else gameState)
+        for event in pacer.events():
             if (event.type == pygame.QUIT):
                 pygame.quit()
                 sys.exit()
@@ -257,51 +447,24 @@ def main():
             if (gameState == "startScreen"):
                 if (buttons.button_clicked(startButton, event)):
                     pygame.mixer.music.stop()
-                    pygame.mixer.music.load("sounds/doorBell.mp3")
+                    assets.music("sounds/doorBell.mp3")
                     pygame.mixer.music.set_volume(0.25)
                     gameState = "inGame"
                 if(buttons.button_clicked(howtoPlayButton,event)):
                     gameState = "howToPlay"
             elif (gameState == "howToPlay"):
-                mainScreen.fill((0, 0, 0))
-
-                instructions = [#BRHL: Explanation of how to play
-                    "HOW TO PLAY",
-                    "",
-                    "Press ENTER to advance dialogue.",
-                    "Your goal is to prepare each customer's drink",
-                    "by casting spells to add ingredients to tea mixtures.",
-                    "",
-                    "The minigame works like an Euler Trail:",
-                    "you must trace edges exactly once",
-                    "to choose the ingredients. ",
-                    "",
-                    "Be sure you dont trace the same node twice!",
-                    "",
-                    "Meet or exceed their ingredients to get a perfect score! You get 3 casts per ccustomer!",
-                    "",
-                    "Press ENTER to begin."
-                ]
-
-                base_y = 100
-                spacing = 40
-
-                for i, line in enumerate(instructions):
-                    textSurface = dialogueFont.render(line, True, (255, 255, 255))
-                    textX = (width - textSurface.get_width()) // 2
-                    textY = base_y + i * spacing
-                    mainScreen.blit(textSurface, (textX, textY))
                 if(enterReleased(event)):
                     gameState = "inGame"
                 
             elif (gameState == "inGame"):
                 if (enterReleased(event)):
                     pygame.mixer.music.play()
+                    latency.sound()
                     gameState = currentCustomer
                     dialogueNum = 0
                     currentExpression = "neutral"
 
-            elif (gameState in ["Zhao", "Hamilton", "Mintah", "Pendar"]):
+            elif (gameState in customerIndexMap):
 
                 if (waitingForNextCustomer): #AH: After result line, wait for Enter to go to next customer
                     if (enterReleased(event)):
@@ -316,15 +479,16 @@ def main():
                         if (dialogueNum > 3):#AH: Starting minigame 
                             dialogueNum = 3
                             minigame = True
-                            output = run_minigame3(mainScreen, clock)
+                            output = run_minigame3(mainScreen, clock, orderList[gameState])
+                            pacer.invalidate()  # the minigame drew over the whole screen
 
                         if (dialogueNum != oldNum and (dialogueNum - 1) <= 2):
                             dialogueSound.play()
+                            latency.sound()
 
                     if ((gameState in orderList) and minigame and (output is not None)):#AH: Result checking 
                         prof = gameState
                         result = valueCheck(orderList[prof], output)
-                        print(result)
 
                         if (result == "Perfect"):
                             dialogueNum = 4
@@ -343,24 +507,41 @@ def main():
                         waitingForNextCustomer = True
                         output = None
 
+        profiler.phase("update")
+
+        # everything the screens below draw depends on these, so if none of them changed the frame looks the same
+        # (the profiler overlay changes every frame while it is shown)
+        loading = preloader is not None and not preloader.finished
+        view = (gameState, dialogueNum, currentExpression, professors_helped, loading)
+        if (not pacer.should_draw(view, animating=(gameState == "startScreen" and loading) or profiler.overlay_visible())):
+            profiler.end_frame()
+            pacer.tick()
+            continue
+
+        profiler.phase("draw")
+
         if (gameState == "startScreen"):
-            mainScreen.blit(startImage, (0, 0))
+            frame.blit(startImage, (0, 0))
+            if (preloader is not None and not preloader.finished):
+                drawLoadingBar(preloader.progress)
+
+        elif (gameState == "howToPlay"):
+            drawHowToPlay()
 
         elif (gameState == "inGame"):
-            mainScreen.blit(inGameImage, (0, 0))
+            frame.blit(inGameImage, (0, 0))
 
-        elif (gameState in ["Zhao", "Hamilton", "Mintah", "Pendar"]):
+        elif (gameState in customerIndexMap):
             drawCustomerDialogue(gameState)
 
         elif (gameState == "gameComplete"):
-            mainScreen.fill((0, 0, 0))
-            textSurface = dialogueFont.render(f"Thank you for playing! You made {professors_helped}/4 professors happy!", True, (255, 255, 255))
-            textX = (width - textSurface.get_width()) // 2
-            textY = (height - textSurface.get_height()) // 2
-            mainScreen.blit(textSurface, (textX, textY))
-
-        pygame.display.flip()
-        clock.tick(60)
+            frame.fill((0, 0, 0))
+            text_render.draw_text(frame, dialogueFont, f"Thank you for playing! You made {professors_helped}/{customersServed} professors happy!", (width // 2, height // 2), (255, 255, 255), center=True)
+
+        profiler.phase("present")
+        frame.present()
+        profiler.end_frame()
+        pacer.tick()
 
 if __name__ == "__main__":
     main()
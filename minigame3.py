@@ -1,7 +1,16 @@
 import pygame
 import sys
+from collections import OrderedDict
+import assets
+import text_render
+import renderer
+import latency
+import inputs
+import profiler
+import spell_catalog
+import aspects
+import hints
 
-from spellcaster import Spell
 from spellcaster import cast_spell
 
 """
@@ -9,42 +18,131 @@ Written by Royce Malikov
 ID: 21180984
 """
 
-def run_minigame3(screen, clock):
+class PageCache:
+    def __init__(self, max_pages=5):
+        """
+        The PageCache class keeps fully drawn pages of the spellbook, so a frame of the spellbook scene is one blit of
+        the current page instead of drawing the background, the book and every piece of text again. Pages are drawn
+        the first time they are needed and the least recently used one is dropped once max_pages are kept (each page
+        is a screen sized surface).
+
+        :param max_pages: The number of pages to keep
+        """
+        self.max_pages = max_pages
+        self.built = 0
+        self._pages = OrderedDict()
+
+    def page(self, spell, compose):
+        """
+        Get the page of a spell, drawing it with compose if it isn't cached.
+
+        :param spell: The Spell shown on the page
+        :param compose: A function that takes a Spell and returns its drawn page as a Surface
+        :return: a pygame Surface the size of the screen
+        """
+        key = (spell.name, pygame.display.get_surface().get_size())
+        if key in self._pages:
+            self._pages.move_to_end(key) # mark as most recently used
+            return self._pages[key]
+
+        self.built += 1
+        page = self._pages[key] = compose(spell)
+        if len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def prefetch(self, spells, compose):
+        """
+        Draw the first page of spells that isn't cached yet. Only one page is drawn per call so getting pages ready
+        never makes a single frame noticeably slower.
+
+        :param spells: The Spells whose pages will probably be needed soon
+        :param compose: A function that takes a Spell and returns its drawn page as a Surface
+        :return: None
+        """
+        size = pygame.display.get_surface().get_size()
+        for spell in spells:
+            if (spell.name, size) not in self._pages:
+                self.page(spell, compose)
+                return
+
+    def clear(self):
+        self._pages.clear()
+
+
+# the pages drawn so far, shared between visits to the spellbook
+pages = PageCache()
+
+# the number of spells cast for every tea
+CASTS = 3
+
+# how many frames the result of a cast is shown in the book before it can be used again, 1.5 seconds; tools may shorten it
+RESULT_FRAMES = 90
+
+# press H in the spellbook to show or hide which spells can still make the customer's tea Perfect
+HINT_KEY = pygame.K_h
+show_hint = False
+
+# how many spells have been cast since the game started, and how many of them failed, for scripted runs to check
+cast_counts = {"cast": 0, "failed": 0}
+
+
+def cast_start_pos(screen_size):
+    """
+    :param screen_size: The (width, height) of the screen
+    :return: where the mouse is moved when a cast starts, below and to the right of the spell's nodes
+    """
+    return (screen_size[0] // 2 + 200, screen_size[1] // 2 + 200)
+
+
+def make_spells(screen_size):
+    """
+    Gets the list of spells in the spellbook from the spell catalog, with their nodes laid out around the center of a
+    screen of the given size. All spells were first hand drawn on grid paper and then transferred into the catalog.
+
+    :param screen_size: The (width, height) of the screen the spells will be cast on
+    :return: a tuple of CatalogSpells, in page order
+    """
+    return spell_catalog.spells(screen_size)
+
+
+def run_minigame3(screen, clock, order=None):
     """
     This is the main function of the minigame. It takes a pygame Screen and Clock and draws the entirety of the minigame.
     This includes the spellbook, all buttons, and the spell itself as it is being cast using the cast_spell() function
 
     :param screen: The pygasme Screen that the minigame is drawn onto
     :param clock: The pygame Clock for ticking the game
-    :return: a dictionary containing the aspects created by the tea and the amount of each aspect
+    :param order: The aspect vector the customer ordered, which the hint is worked out for; None for no hint
+    :return: an aspect vector (see aspects.py) containing the amount of each aspect created by the tea
     """
+    global show_hint
 
     # load background image to fit the screen
-    background_image = pygame.transform.scale(pygame.image.load("Spell_Assets/Magic_Bg.jpg").convert(), screen.get_size())
+    background_image = assets.image("Spell_Assets/Magic_Bg.jpg", screen.get_size(), assets.OPAQUE)
 
     # load spellbook image and set the scale
-    spellbook_image = pygame.image.load("Spell_Assets/Spellbook_Transparent.png").convert_alpha()
-    spellbook_image = pygame.transform.scale(spellbook_image, (800, 500))
+    spellbook_image = assets.image("Spell_Assets/Spellbook_Transparent.png", (800, 500), assets.PREMULTIPLIED)
 
     # load the page flip cound effect
-    page_flip = pygame.mixer.Sound("Spell_Assets/page_flip.mp3")
+    page_flip = assets.sound("Spell_Assets/page_flip.mp3")
 
     # load and begin the background music, set loops to -1 to keep it always looping
-    pygame.mixer.music.load("Spell_Assets/spell_background.mp3")
+    assets.music("Spell_Assets/spell_background.mp3")
     pygame.mixer.music.play(loops=-1)
 
     # width and height of the screen
     WIDTH, HEIGHT = screen.get_size()
 
     # setting the font size for every font type, different texts in the game all need different fonts
-    title_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 70)
-    aspects_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 30)
-    words_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 60)
-    button_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 32)
-    arrow_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 22)
-    result_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 52)
-    casts_remaining_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 90)
-    formulation_f = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 35)
+    title_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 70)
+    aspects_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 30)
+    words_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 60)
+    button_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 32)
+    arrow_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 22)
+    result_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 52)
+    casts_remaining_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 90)
+    formulation_f = assets.font("Spell_Assets/MagicSchoolOne.ttf", 35)
 
 
     # setting book position and boundaries of the pages
@@ -61,300 +159,173 @@ def run_minigame3(screen, clock):
     left_btn = pygame.Rect(book_x + 20, book_y + 20, 50, 35)
     right_btn = pygame.Rect(book_x + book_w - 70, book_y + 20, 50, 35)
 
-    # center of screen
-    center = (WIDTH // 2, HEIGHT // 2)
-    cx, cy = center
-
-    # small helper function for the nodes; given an integer offset dx and dy, multiply it by 20 add it to the center coords
-    # this keeps all spell nodes centered on the screen
-    def rel(dx, dy):
-        return cx + dx*20, cy + dy*20
-
-    # creating the list of spells
-    spells = [
-        Spell(
-            "Honeywisp", # set the name of the spell
-            "Aspects: Sweet +2", # set the aspects of the spell
-            ["Mellino", "Honstar", "Cortegen","Unfluxia"], # set the magic words of the spell
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/HoneyWhisper.png").convert_alpha(),
-                                   (160, 160)), # set the glyph of the spell
-            [
-                rel(-5,5), rel(0,-8), rel(5,5), rel(-6,-5), rel(6, -5), rel(-3,3)
-            ] # set the coordinates of each node, in order. The numbers are multiples of 20 pixels offset from the center of the screen.
-            # all spells were first hand drawn on grid paper and then transferred into the game
-        ),
-
-        Spell(
-            "Sugar Sigil",
-            "Aspects: Sweet +1",
-            ["Astralis", "Penthera", "Lumistar", "Sucrama"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/SugarSigil.png").convert_alpha(), (160, 160)),
-            [
-                rel(-7, -5), rel(0,5), rel(7,-5), rel(7, 5), rel(0,-5), rel(-7,5)
-            ]
-        ),
-
-        Spell(
-            "Citrus Pulse",
-            "Aspects: Citrus +2",
-            ["Lemoana", "Spiraflux", "Helixor", "Fluxia"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/CitrusPulse.png").convert_alpha(), (160, 160)),
-            [
-                rel(6,-3), rel(3,-5), rel(0,-6), rel(-3,-5), rel(-6,-3),
-                rel(-6,0), rel(6,0), rel(6,3), rel(3,5), rel(0,6), rel(-3,5),
-                rel(-6,3)
-            ]
-        ),
-
-        Spell(
-            "Lemonflare",
-            "Aspects: Citrus +1, Sweet +1",
-            ["Ragamorg", "Ravelis", "Skratcha", "Citraline"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/Lemonflare.png").convert_alpha(), (160, 160)),
-            [
-                rel(-8,0), rel(-4,6), rel(4,6), rel(8,0), rel(2,2),
-                rel(0,-9), rel(-2,2), rel(-6,1)
-            ]
-        ),
-
-        Spell(
-            "Tealeaf Rite",
-            "Aspects: Tea +2",
-            ["Seraphae", "Sinuara", "Silvena", "Invoka"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/TealeafInvocation.png").convert_alpha(), (160, 160)),
-            [
-                rel(-5,7), rel(-9,-4), rel(-3,-7), rel(-7,1), rel(3,-2), rel(0,7), rel(-3,-2),
-                rel(7,1), rel(3,-7), rel(9,-4), rel(5,7)
-            ]
-        ),
-
-        Spell(
-            "Earl Echo",
-            "Aspects: Tea +1, Citrus +1",
-            ["Earlis", "Resona", "Citralux", "Echovera"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/EarlgreyEcho.png").convert_alpha(), (160, 160)),
-            [
-                rel(-7,-10), rel(7,-10), rel(-7,-5), rel(7,-5), rel(-7,0), rel(7,0),
-                rel(0,7), rel(0,-14)
-            ]
-        ),
-
-        Spell(
-            "Chai Ember",
-            "Aspects: Spice +2, Tea +1",
-            ["Chalon", "Emberyx", "Masalir", "Flaretea"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/ChaiEmber.png").convert_alpha(), (160, 160)),
-            [
-                rel(0,-10), rel(-6,-4), rel(4,-4), rel(9,3), rel(-6,3), rel(9,-4),
-                rel(0,7), rel(0,-7), rel(9,-7)
-            ]
-        ),
-
-        Spell(
-            "Cinnamon",
-            "Aspects: Spice +1",
-            ["Cinnaar", "Spiralux", "Brashava", "Scorchine"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/CinnamonWeave.png").convert_alpha(), (160, 160)),
-            [
-                rel(0, -10), rel(-2, -4), rel(-8, -10), rel(-4, -2),
-                rel(0, 6), rel(4, -2), rel(8, -10), rel(2, -4)
-            ]
-        ),
-
-        Spell(
-            "Herb Bloom",
-            "Aspects: Herbal +2",
-            ["Herbalis", "Florien", "Sprouthex", "Budmora"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/HerbalBloom.png").convert_alpha(), (160, 160)),
-            [
-                rel(0, -8), rel(6, 0), rel(0, 8), rel(-6, 0),
-                rel(3, -3), rel(-3, -3), rel(3, 3), rel(-3, 3),
-            ]
-        ),
-
-        Spell(
-            "Ley Garden",
-            "Aspects: Herbal +1, Tea +1",
-            ["Leyward", "Gardenis", "Verdalux", "Infusara"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/GardenDraught.png").convert_alpha(), (160, 160)),
-            [
-                rel(-8, 6), rel(-4, -10), rel(-1, -4),
-                rel(1, -4), rel(4, -10), rel(8, 6),
-                rel(0, -2), rel(0, 4)
-            ]
-        ),
-
-        Spell(
-            "Mintwhirl",
-            "Aspects: Mint +2",
-            ["Freskal", "Whirleaf", "Mentara", "Gustine"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/Mintwhirl.png").convert_alpha(), (160, 160)),
-            [
-                rel(6, -2), rel(4, -6), rel(0, -8), rel(-4, -6), rel(-6, -2), rel(-4, 4),
-                rel(0, 6), rel(4, 4), rel(6, 0)
-            ]
-        ),
-
-        Spell(
-            "Frost Snap",
-            "Aspects: Mint +1, Citrus +1",
-            ["Frigidis", "Zintrix", "Snaplemon", "Chillara"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/FrostmintSnap.png").convert_alpha(), (160, 160)),
-            [
-                rel(0, -8), rel(0, 8), rel(-8, 0), rel(8, 0), rel(-4, -4), rel(4, -4),
-                rel(4, 4), rel(-4, 4)
-            ]
-        ),
-
-        Spell(
-            "Creamweave",
-            "Aspects: Creamy +2",
-            ["Creamora", "Velastrid", "Silkalux", "Bindara"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/CreamyWeave.png").convert_alpha(), (160, 160)),
-            [
-                rel(-10, 0), rel(-8, -4), rel(-4, -7), rel(0, -8),
-                rel(4, -7), rel(8, -4), rel(10, 0),
-                rel(6, 2), rel(3, 4), rel(0, 6), rel(-3, 4), rel(-6, 2)
-            ]
-        ),
-
-        Spell(
-            "Velvetfoam",
-            "Aspects: Creamy +1, Sweet +1",
-            ["Velveta", "Suavine", "Foamara", "Sugrith"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/Velvetfoam.png").convert_alpha(), (160, 160)),
-            [
-                rel(-10, -8), rel(-6, -4), rel(-2, 0),
-                rel(2, -4), rel(6, -8),
-                rel(0, 2), rel(0, 6)
-            ]
-        ),
-
-        Spell(
-            "Dark Surge",
-            "Aspects: Bitter +2",
-            ["Darkara", "Survex", "Ravenero", "Nightbrew"],
-            pygame.transform.scale(pygame.image.load("Spell_Assets/Spell Glyphs/DarkroastSurge.png").convert_alpha(), (160, 160)),
-            [
-                rel(0, -16), rel(-4, -10), rel(-2, -5), rel(0, -1), rel(2, -5), rel(4, -10),
-                rel(0, -12), rel(0, -6), rel(0, 4), rel(0, 10)
-            ]
-        ),
-    ]
+    # the list of spells in the book
+    spells = make_spells(screen.get_size())
 
     # current page of the book
     current_page = 0
 
-    # dictionary for storing the prepared formulation
-    tea_formulation = {}
+    # aspect vector for storing the prepared formulation (see aspects.py)
+    tea_formulation = aspects.zeros()
 
     # spells remaining
-    spells_remaining = 3
+    spells_remaining = CASTS
+
+    # which spells can still make a Perfect tea is looked up in the recipe index of the spellbook
+    recipes = hints.index_for(spells, CASTS) if order is not None else None
+
+    # the text of the hint for the tea brewed so far
+    def hint_text():
+        perfect = recipes.perfect_spells(order, tea_formulation, spells_remaining)
+        if not perfect:
+            return "Hint: a Perfect tea is out of reach"
+        if len(perfect) == len(spells):
+            return "Hint: any spell keeps the tea Perfect"
+        names = [spell.name for spell in perfect]
+        return "Hint: " + ", ".join(names[:4]) + (f" and {len(names) - 4} more" if len(names) > 4 else "")
 
     # message after succeeding or failing a spell
     post_result_text = ""
     post_result_timer = 0
 
+    # draws everything on a page that only changes when the page is flipped onto a new surface
+    def compose_page(spell):
+        page = pygame.Surface(screen.get_size()).convert()
+        profiler.count("surfaces")
+
+        # draw background
+        page.blit(background_image, (0, 0))
+
+        page.blit(spellbook_image, (book_x, book_y), special_flags=pygame.BLEND_PREMULTIPLIED) # draw the spellbook
+
+        # draw tea formulation caption
+        page.blit(text_render.render(formulation_f, "Tea Formulation:", True, (255, 255, 255)), (book_x - 150, book_y + 100))
+
+        # draw the title of the spell on the left page
+        page.blit(text_render.render(title_f, spell.name, True, (0, 0, 0)), (left_page_x-15, left_page_y))
+
+        # draw the icon of the spell on the left page
+        page.blit(spell.icon, (left_page_x + 20, left_page_y + 100), special_flags=pygame.BLEND_PREMULTIPLIED)
+
+        # draw the aspects of the spell on the left page
+        page.blit(text_render.render(aspects_f, spell.aspects, True, (0, 0, 0)), (left_page_x, left_page_y + 270))
+
+        # draw the magic words of the spell on the right page
+        for i, word in enumerate(spell.words):
+            page.blit(text_render.render(words_f, word, True, (0, 0, 0)), (right_page_x, right_page_y + 60 + i * 60))
+
+        # draw the spell cast button on the right page, in its normal (not hovered) colour
+        pygame.draw.rect(page, (190, 175, 235), button_rect, border_radius=12)
+        btn_text = text_render.render(button_f, "Cast Spell", True, (0, 0, 0))
+        page.blit(btn_text, btn_text.get_rect(center=button_rect.center))
+
+        # draw the page navigation buttons
+        pygame.draw.rect(page, (255, 220, 180), left_btn, border_radius=8)
+        pygame.draw.rect(page, (255, 220, 180), right_btn, border_radius=8)
+        page.blit(text_render.render(arrow_f, "<", True, (80, 30, 10)), left_btn.move(4, 0))
+        page.blit(text_render.render(arrow_f, ">", True, (80, 30, 10)), right_btn.move(8, 0))
+        return page
+
+    # the page that was on screen last frame
+    shown_page = current_page
+
+    # the spellbook's frames; invalidated after each cast, which draws over the whole screen
+    frame = renderer.Renderer(screen)
+
     running = True
+    mouse = inputs.mouse_pos()  # a click on the first frame is checked before the loop reads the mouse
 
     while running:
+        profiler.begin_frame("spellbook")
+        latency.scene("spellbook")
+
         # handling game exit
-        for event in pygame.event.get():
+        for event in latency.track(inputs.events()):
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
+            # show or hide the hint
+            if event.type == pygame.KEYDOWN and event.key == HINT_KEY and recipes is not None:
+                show_hint = not show_hint
+
             if event.type == pygame.MOUSEBUTTONDOWN:
                 # Navigation (only when not casting)
                 if post_result_timer <= 0:  #  normal interaction allowed only when not showing post-result
                     if left_btn.collidepoint(mouse):
                         page_flip.play() # play page flip sound effect
+                        latency.sound()
                         current_page = (current_page - 1) % len(spells) # flipping through the pages and wrapping around the left side of the list
                     elif right_btn.collidepoint(mouse):
                         page_flip.play() # play page flip sound effect
+                        latency.sound()
                         current_page = (current_page + 1) % len(spells) # flipping through the pages and wrapping around the right side of the list
                     elif button_rect.collidepoint(mouse):
                         # if the user presses the cast button, get the spell index of the current page and run cast_spell()
                         # save the output of the spell cast to success and decrement spells remaining
                         active_spell = spells[current_page]
-                        pygame.mouse.set_pos(cx+200, cy+200)# move mouse away from spell to avoid acidentally failing
+                        inputs.set_mouse_pos(cast_start_pos((WIDTH, HEIGHT)))# move mouse away from spell to avoid acidentally failing
                         success = cast_spell(screen, clock, active_spell, background_image)
+                        frame.invalidate()  # the cast drew over the whole screen
                         spells_remaining -= 1
+                        cast_counts["cast"] += 1
+                        cast_counts["failed"] += not success
                         if success:
                             post_result_text = "Spell Cast Successfully!" # set post result text to successful option
-                            parsed_aspects = active_spell.aspects.replace("Aspects: ","").replace("+", "").replace(",", "").split(" ") # parse the aspect text of the spell
-                            spell_dict = {parsed_aspects[i]:parsed_aspects[i+1] for i in range(0, len(parsed_aspects), 2)} # create a dictionary out of the aspect text
-                            # update the tea formulation with the parsed aspects from the spell
-                            for aspect in spell_dict.keys():
-                                if aspect in tea_formulation.keys():
-                                    tea_formulation[aspect] += int(spell_dict[aspect])
-                                else:
-                                    tea_formulation[aspect] = int(spell_dict[aspect])
+                            tea_formulation += active_spell.effect # add the aspects of the spell to the tea formulation
                         else:
                             post_result_text = "Spell Cast Failed." # set post ressult text to failed option
-                        post_result_timer = 90  # show end screen for 1.5 seconds
-
-        mouse = pygame.mouse.get_pos()  # mouse coordinates
+                        post_result_timer = RESULT_FRAMES  # show end screen for a moment
 
-        # Draw background
-        screen.blit(background_image, (0, 0))
-
-        screen.blit(spellbook_image, (book_x, book_y)) # draw the spellbook
+        profiler.phase("update")
+        mouse = inputs.mouse_pos()  # mouse coordinates
 
         spell = spells[current_page] # select the current spell for drawing
 
-        # draw the casts remaining text
-        casts_remaining  = casts_remaining_f.render(f"{spells_remaining} casts remaining", True, (0, 0, 0))
-        screen.blit(casts_remaining, (book_x + 200, book_y - 80))
-
-        # draw tea formulation caption
-        tea_formulation_test = formulation_f.render("Tea Formulation:", True, (255, 255, 255))
-        screen.blit(tea_formulation_test, (book_x - 150, book_y + 100))
-
-        # draw each aspect within the formulation
-        for index, (aspect, amount) in enumerate(tea_formulation.items(), start=1):
-            aspect_text = formulation_f.render(f"{aspect}: {amount}", True, (255, 255, 255))
-            screen.blit(aspect_text, (book_x - 150, book_y + 120 + index * 30))
+        profiler.phase("draw")
 
-        # draw the title of the spell on the left page
-        title_surface = title_f.render(spell.name, True, (0, 0, 0))
-        screen.blit(title_surface, (left_page_x-15, left_page_y))
-
-        # draw the icon of the spell on the left page
-        screen.blit(spell.icon, (left_page_x + 20, left_page_y + 100))
+        # draw the whole page of the book (background, spellbook, spell and buttons) with a single blit
+        frame.blit(pages.page(spell, compose_page), (0, 0))
 
-        # draw the aspects of the spell on the left page
-        aspects_surface = aspects_f.render(spell.aspects, True, (0, 0, 0))
-        screen.blit(aspects_surface, (left_page_x, left_page_y + 270))
+        # the page has the cast button in its normal colour, so only the hovered colour is drawn on top
+        if button_rect.collidepoint(mouse):
+            frame.rect((215, 200, 255), button_rect, border_radius=12)
+            btn_text = text_render.render(button_f, "Cast Spell", True, (0, 0, 0))
+            frame.blit(btn_text, btn_text.get_rect(center=button_rect.center))
 
-        # draw the magic words of the spell on the right page
-        for i, word in enumerate(spell.words):
-            wsurf = words_f.render(word, True, (0, 0, 0))
-            screen.blit(wsurf, (right_page_x, right_page_y + 60 + i * 60))
+        # draw the casts remaining text
+        # the counter and the amounts below change as spells are cast, so they are drawn from glyph atlases
+        text_render.draw_text(frame, casts_remaining_f, f"{spells_remaining} casts remaining", (book_x + 200, book_y - 80), (0, 0, 0))
 
-        # draw the spell cast button on the right page
-        hovered = button_rect.collidepoint(mouse)
-        color = (215, 200, 255) if hovered else (190, 175, 235)
-        pygame.draw.rect(screen, color, button_rect, border_radius=12)
-        btn_text = button_f.render("Cast Spell", True, (0, 0, 0))
-        screen.blit(btn_text, btn_text.get_rect(center=button_rect.center))
+        # draw each aspect within the formulation
+        for index, (aspect, amount) in enumerate(aspects.items(tea_formulation), start=1):
+            text_render.draw_text(frame, formulation_f, f"{aspect}: {amount}", (book_x - 150, book_y + 120 + index * 30), (255, 255, 255))
 
-        # draw the page navigation buttons
-        pygame.draw.rect(screen, (255, 220, 180), left_btn, border_radius=8)
-        pygame.draw.rect(screen, (255, 220, 180), right_btn, border_radius=8)
-        screen.blit(arrow_f.render("<", True, (80, 30, 10)), left_btn.move(4, 0))
-        screen.blit(arrow_f.render(">", True, (80, 30, 10)), right_btn.move(8, 0))
+        # draw the hint along the bottom of the screen while there are casts left
+        if show_hint and recipes is not None and spells_remaining > 0:
+            txt = text_render.render(formulation_f, hint_text(), True, (255, 255, 255))
+            frame.blit(txt, txt.get_rect(center=(WIDTH // 2, HEIGHT - 30)))
 
         # if we are in a post spell result state, show the post-result text
         if post_result_timer > 0:
             post_result_timer -= 1
-            txt = result_f.render(post_result_text, True, (255, 245, 200) if "Successfully" in post_result_text else (255, 180, 180))
-            screen.blit(txt, txt.get_rect(center=(WIDTH // 2-20, HEIGHT // 2+250)))
+            txt = text_render.render(result_f, post_result_text, True, (255, 245, 200) if "Successfully" in post_result_text else (255, 180, 180))
+            frame.blit(txt, txt.get_rect(center=(WIDTH // 2-20, HEIGHT // 2+250)))
             #  if there are no spells remaining, stop the music and return the formulation
             if post_result_timer == 0 and spells_remaining == 0:
                 pygame.mixer.music.stop()
+                profiler.end_frame()
                 return tea_formulation
 
         # update the display and tick the clock
-        pygame.display.flip()
+        profiler.phase("present")
+        frame.present()
+        profiler.phase("update")
+
+        # get the pages up to two flips away ready, so flipping to them only costs a blit
+        # nothing is drawn ahead on the frame of a flip, which keeps that frame as short as the others
+        if current_page == shown_page:
+            pages.prefetch([spells[(current_page + offset) % len(spells)] for offset in (1, -1, 2, -2)], compose_page)
+        shown_page = current_page
+        profiler.end_frame()
         clock.tick(60)
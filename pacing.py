@@ -0,0 +1,93 @@
+import os
+import pygame
+import latency
+import inputs
+
+"""
+Frame pacing for the game loops. A static screen (the start screen, the instructions, dialogue waiting for Enter) looks
+exactly the same from one frame to the next, so instead of redrawing it 60 times a second the loop skips the frame and
+sleeps on the event queue until the player does something.
+
+Idle suppression is on by default; set TEASHOP_IDLE=0 to always run at the full frame rate.
+"""
+
+IDLE_SUPPRESSION = os.environ.get("TEASHOP_IDLE", "1") != "0"
+
+# how long an idle loop sleeps on the event queue before checking its state again
+IDLE_TIMEOUT_MS = 250
+
+# events that mean the window contents were lost and have to be drawn again
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED)
+
+
+class Pacer:
+    def __init__(self, clock, fps=60, renderer=None, enabled=None):
+        """
+        The Pacer class decides, frame by frame, whether a loop needs to draw and how long it waits before the next
+        frame. The loop describes what is on screen with a hashable "view" tuple; when the view is the same as the last
+        one drawn and nothing is animating, the frame is skipped and the next call to events() blocks until an input
+        event arrives (or IDLE_TIMEOUT_MS passes). As soon as something changes the loop is back to the full frame rate.
+
+        :param clock: The pygame Clock used to cap the frame rate while drawing
+        :param fps: The frame rate while drawing
+        :param renderer: The Renderer of the loop, which has to redraw everything when the window is exposed
+        :param enabled: Whether to suppress idle frames, None to follow TEASHOP_IDLE
+        """
+        self.clock = clock
+        self.fps = fps
+        self.renderer = renderer
+        self.enabled = IDLE_SUPPRESSION if enabled is None else enabled
+        self.idle = False
+        self._last_view = None
+
+    def events(self):
+        """
+        Get this frame's input events. After an idle frame this blocks until there is at least one event, or until
+        IDLE_TIMEOUT_MS has passed.
+
+        :return: a list of pygame Events
+        """
+        if self.enabled and self.idle:
+            events = inputs.wait(IDLE_TIMEOUT_MS)
+        else:
+            events = inputs.events()
+
+        for event in events:
+            if event.type in EXPOSE_EVENTS:
+                self.invalidate()
+        return latency.track(events)
+
+    def should_draw(self, view, animating=False):
+        """
+        Check whether this frame has to be drawn and presented.
+
+        :param view: A hashable value that is equal for two frames only when they look the same
+        :param animating: Whether something on screen moves on its own, which always needs drawing
+        :return: True when the frame has to be drawn
+        """
+        if self.enabled and not animating and view == self._last_view:
+            self.idle = True
+            latency.discard()  # whatever input arrived, it changed nothing on screen
+            return False
+        self._last_view = view
+        self.idle = False
+        return True
+
+    def tick(self):
+        """
+        Wait for the next frame. Idle frames already waited in events(), so only drawn frames are capped to fps.
+
+        :return: None
+        """
+        if not self.idle:
+            self.clock.tick(self.fps)
+
+    def invalidate(self):
+        """
+        Force the next frame to be drawn in full, e.g. after another loop has drawn over the screen.
+
+        :return: None
+        """
+        self._last_view = None
+        if self.renderer is not None:
+            self.renderer.invalidate()
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+import numpy as np
+import pygame
+import profiler
+
+"""
+Particles for the spell effects. Every particle is a copy of one sprite that moves in a straight line and fades out; the
+state of all particles is kept in NumPy arrays and updated a whole array at a time, and the faded copies of the sprite
+are made once, so a frame with thousands of particles allocates no surfaces and only one list of blits.
+"""
+
+# faded copies of sprites, keyed by (sprite, premultiplied), shared by every particle system drawing the same sprite;
+# a table is 256 surfaces, so only the MAX_FADE_TABLES most recently used are kept
+MAX_FADE_TABLES = 4
+_fade_tables = OrderedDict()
+
+
+def fade_table(sprite, premultiplied=True):
+    """
+    Get the 256 copies of a sprite faded to each alpha value from 0 to 255, making them the first time they are asked for.
+
+    :param sprite: The pygame Surface to fade
+    :param premultiplied: Whether the sprite's colours are premultiplied by alpha, in which case the colour channels
+                          fade along with the alpha channel
+    :return: a list of pygame Surfaces where the item at index a is the sprite at alpha a
+    """
+    key = (sprite, premultiplied)
+    if key in _fade_tables:
+        _fade_tables.move_to_end(key)  # mark as most recently used
+    else:
+        table = []
+        for alpha in range(256):
+            faded = sprite.copy()
+            # multiplying every channel, colour included, keeps a premultiplied sprite correct
+            faded.fill((alpha, alpha, alpha, alpha) if premultiplied else (255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+            table.append(faded)
+        _fade_tables[key] = table
+        profiler.count("surfaces", len(table))
+        if len(_fade_tables) > MAX_FADE_TABLES:
+            _fade_tables.popitem(last=False)
+    return _fade_tables[key]
+
+
+class ParticleSystem:
+    def __init__(self, sprite, premultiplied=True, capacity=256):
+        """
+        The ParticleSystem class moves, fades and draws a group of particles that all look like the same sprite.
+        Each particle has a position, a velocity, an alpha, an amount it fades by each frame and a spawn delay: it
+        stays hidden until its delay has counted down to 0, then moves and fades every frame until its alpha reaches 0.
+        Particles that don't fade stay until clear() is called.
+
+        :param sprite: The pygame Surface every particle is drawn with
+        :param premultiplied: Whether the sprite's colours are premultiplied by alpha (and drawn with BLEND_PREMULTIPLIED)
+        :param capacity: How many particles to make room for up front; the arrays grow when more are emitted
+        """
+        self.sprite = sprite
+        self.premultiplied = premultiplied
+        self.flags = pygame.BLEND_PREMULTIPLIED if premultiplied else 0
+        # made by emit() once a particle fades or starts below full alpha; until then the sprite is drawn as it is
+        self.table = None
+        self.offset = np.array([sprite.get_width() // 2, sprite.get_height() // 2])
+        self.count = 0  # the live particles are the first count entries of every array
+
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.alpha = np.zeros(capacity, dtype=np.int16)
+        self.fade = np.zeros(capacity, dtype=np.int16)
+        self.delay = np.zeros(capacity, dtype=np.int32)
+        self._visible = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def emit(self, positions, velocities=0, delays=0, alpha=255, fade=0):
+        """
+        Add particles. Every argument after positions is either one value for all the new particles or one per particle.
+
+        :param positions: The (x, y) centres of the particles, as a list of pairs or an (n, 2) array
+        :param velocities: How far each particle moves every frame, as (dx, dy) pairs
+        :param delays: How many frames each particle waits before it appears
+        :param alpha: The alpha each particle starts at, from 0 to 255
+        :param fade: How much alpha each particle loses every frame
+        :return: None
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        start, end = self.count, self.count + len(positions)
+        if end > len(self.pos):
+            self._grow(end)
+
+        self.pos[start:end] = positions
+        self.vel[start:end] = velocities
+        self.delay[start:end] = delays
+        self.alpha[start:end] = alpha
+        self.fade[start:end] = fade
+        self._visible[start:end] = False
+        self.count = end
+        if self.table is None and (self.fade[start:end].any() or (self.alpha[start:end] != 255).any()):
+            self.table = fade_table(self.sprite, self.premultiplied)
+
+    def _grow(self, needed):
+        # double the arrays until they fit, so emitting one particle at a time doesn't copy them every time
+        capacity = len(self.pos)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("pos", "vel", "alpha", "fade", "delay", "_visible"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def update(self):
+        """
+        Advance every particle by one frame: count down the delays of waiting particles, move and fade the others, and
+        drop the ones that have faded out completely.
+
+        :return: None
+        """
+        n = self.count
+        delay = self.delay[:n]
+        waiting = delay > 0
+        delay[waiting] -= 1
+
+        moving = ~waiting
+        self.pos[:n][moving] += self.vel[:n][moving]
+        alpha = self.alpha[:n]
+        alpha[moving] = np.maximum(alpha[moving] - self.fade[:n][moving], 0)
+
+        # a particle that has faded out is gone for good
+        gone = moving & (alpha <= 0) & (self.fade[:n] > 0)
+        if gone.any():
+            keep = ~gone
+            self.count = int(keep.sum())
+            moving = moving[keep]
+            for array in (self.pos, self.vel, self.alpha, self.fade, self.delay):
+                array[:self.count] = array[:n][keep]
+        self._visible[:self.count] = moving & (self.alpha[:self.count] > 0)
+
+    def draw(self, surface):
+        """
+        Draw every visible particle with a single blits() call.
+
+        :param surface: The pygame Surface or Renderer to draw onto
+        :return: None
+        """
+        visible = np.flatnonzero(self._visible[:self.count])
+        if not len(visible):
+            return
+        corners = self.pos[visible] - self.offset
+        table, flags = self.table, self.flags
+        if table is None:
+            # every particle is at full alpha
+            sprite = self.sprite
+            surface.blits([(sprite, (x, y), None, flags) for x, y in corners.tolist()], doreturn=False)
+            return
+        surface.blits([(table[a], (x, y), None, flags) for a, (x, y) in zip(self.alpha[visible].tolist(), corners.tolist())],
+                      doreturn=False)
+
+    def clear(self):
+        self.count = 0
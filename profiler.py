@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import time
+from collections import deque
+
+import pygame
+
+"""
+Frame profiler for the game loops. Each loop marks where its frames start and end and which phase it is in (handling
+events, updating, drawing or presenting); the drawing code counts the blits, Font.render() calls and surfaces it makes.
+Press F3 in game to show the last couple of seconds as a sparkline overlay in the top left corner.
+
+Set TEASHOP_TRACE to the path of a JSON file to record every frame from the start and write them as Chrome trace events
+when the game exits (open the file in chrome://tracing or https://ui.perfetto.dev).
+
+While the overlay is hidden and no trace is being written, every call into this module returns straight away.
+"""
+
+TRACE_PATH = os.environ.get("TEASHOP_TRACE", "")
+
+TOGGLE_KEY = pygame.K_F3
+
+PHASES = ("events", "update", "draw", "present")
+COUNTERS = ("blits", "font.render", "surfaces")
+
+# colour of each phase in the sparkline
+PHASE_COLORS = {"events": (120, 170, 255), "update": (255, 200, 90), "draw": (110, 220, 130), "present": (230, 110, 200)}
+
+# how many frames the sparkline shows, and the frame time that fills its height
+HISTORY = 120
+GRAPH_MS = 1000 / 60
+
+PANEL_SIZE = (300, 120)
+PANEL_POS = (8, 8)
+
+
+class Profiler:
+    def __init__(self, trace_path=""):
+        """
+        The Profiler class times the phases of every frame and keeps the per-frame counters. Game loops can run inside
+        other game loops (the spellbook runs inside a frame of the main loop, and a cast inside a frame of the
+        spellbook), so frames are kept on a stack and counts always go to the innermost one. Frames that had another
+        loop running inside them are left out of the sparkline, where they would only be one huge spike.
+
+        :param trace_path: Where to write the Chrome trace at exit, "" to not record a trace
+        """
+        self.trace_path = trace_path
+        self.overlay = False
+        self.counting = False  # whether totals are being kept, see keep_totals()
+        self.active = bool(trace_path)  # whether anything is being measured at all
+        self.totals = dict.fromkeys(COUNTERS, 0)  # every count since keep_totals() was called
+        self.history = deque(maxlen=HISTORY)  # (phase -> seconds, counter -> count) of the last frames
+        self.trace = []  # Chrome trace events
+        self._stack = []  # the frames in progress, innermost last
+        self._origin = time.perf_counter()
+        self._panel = None
+        self._font = None
+        self._drawing = False  # True while the overlay draws itself, which shouldn't be counted
+
+    def toggle(self):
+        """
+        Show or hide the overlay. Measuring starts with the next frame when it is shown, and stops when it is hidden
+        (unless a trace is being recorded).
+
+        :return: None
+        """
+        self.overlay = not self.overlay
+        self.active = self.overlay or bool(self.trace_path) or self.counting
+        if not self.active:
+            self._stack.clear()
+        self.history.clear()
+
+    def watch(self, events):
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key == TOGGLE_KEY:
+                self.toggle()
+
+    def begin_frame(self, loop):
+        """
+        Start a frame of a game loop, in the "events" phase.
+
+        :param loop: The name of the loop, e.g. "spellbook"
+        :return: None
+        """
+        now = time.perf_counter()
+        if self._stack:
+            self._stack[-1]["nested"] = True
+        self._stack.append({"loop": loop, "start": now, "phase": "events", "phase_start": now,
+                            "phases": {}, "counts": dict.fromkeys(COUNTERS, 0), "nested": False})
+
+    def phase(self, name):
+        """
+        End the current phase of the innermost frame and start another one. A phase can be entered several times in a
+        frame; its times add up.
+
+        :param name: One of PHASES
+        :return: None
+        """
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        now = time.perf_counter()
+        self._close_phase(frame, now)
+        frame["phase"] = name
+        frame["phase_start"] = now
+
+    def _close_phase(self, frame, now):
+        phase = frame["phase"]
+        frame["phases"][phase] = frame["phases"].get(phase, 0.0) + now - frame["phase_start"]
+        if self.trace_path:
+            self.trace.append({"name": phase, "cat": frame["loop"], "ph": "X", "pid": 1, "tid": len(self._stack),
+                               "ts": self._micros(frame["phase_start"]), "dur": (now - frame["phase_start"]) * 1e6})
+
+    def keep_totals(self):
+        """
+        Measure every frame from now on, even while the overlay is hidden, and add up all the counts in self.totals.
+        For soak runs that watch the counts over thousands of frames.
+
+        :return: None
+        """
+        self.counting = True
+        self.active = True
+
+    def count(self, name, amount=1):
+        if self._stack and not self._drawing:
+            self._stack[-1]["counts"][name] += amount
+            if self.counting:
+                self.totals[name] += amount
+
+    def end_frame(self):
+        """
+        End the innermost frame: record it in the sparkline history and the trace.
+
+        :return: None
+        """
+        if not self._stack:
+            return
+        now = time.perf_counter()
+        frame = self._stack.pop()
+        self._close_phase(frame, now)
+        if not frame["nested"]:
+            self.history.append((frame["phases"], frame["counts"]))
+        if self.trace_path:
+            self.trace.append({"name": f"{frame['loop']} frame", "cat": frame["loop"], "ph": "X", "pid": 1,
+                               "tid": len(self._stack) + 1, "ts": self._micros(frame["start"]),
+                               "dur": (now - frame["start"]) * 1e6})
+            self.trace.append({"name": "counts", "ph": "C", "pid": 1, "ts": self._micros(now), "args": frame["counts"]})
+
+    def _micros(self, seconds):
+        return (seconds - self._origin) * 1e6
+
+    def draw(self, screen):
+        """
+        Draw the overlay onto a Renderer: a stacked bar per frame of how long each phase took, and the averages and
+        counts of the last frame under it.
+
+        :param screen: The Renderer drawing the current frame
+        :return: None
+        """
+        import text_render
+
+        self._drawing = True
+        if self._panel is None:
+            self._panel = pygame.Surface(PANEL_SIZE, pygame.SRCALPHA)
+            self._font = pygame.font.Font(None, 18)
+        panel = self._panel
+        panel.fill((0, 0, 0, 170))
+
+        # one column per frame, newest on the right, with the phases stacked from the bottom up
+        graph_height = 70
+        bar = max(PANEL_SIZE[0] // HISTORY, 1)
+        x = PANEL_SIZE[0] - bar * len(self.history)
+        for phases, counts in self.history:
+            y = graph_height
+            for phase in PHASES:
+                height = int(phases.get(phase, 0.0) * 1000 / GRAPH_MS * graph_height)
+                if height:
+                    panel.fill(PHASE_COLORS[phase], (x, max(y - height, 0), bar, min(height, y)))
+                    y -= height
+            x += bar
+        pygame.draw.line(panel, (255, 255, 255), (0, 0), (PANEL_SIZE[0], 0))  # the top of the graph is one 60 fps frame
+
+        if self.history:
+            phases, counts = self.history[-1]
+            x = 4
+            for phase in PHASES:
+                x = text_render.draw_text(panel, self._font, f"{phase} {phases.get(phase, 0.0) * 1000:.1f}",
+                                          (x, graph_height + 6), PHASE_COLORS[phase]).right + 8
+            text_render.draw_text(panel, self._font, "   ".join(f"{name} {counts[name]}" for name in COUNTERS),
+                                  (4, graph_height + 26), (255, 255, 255))
+
+        screen.blit(panel, PANEL_POS)
+        screen.mark_dirty(pygame.Rect(PANEL_POS, PANEL_SIZE))  # the panel surface changed in place
+        self._drawing = False
+
+    def write_trace(self, path):
+        """
+        Write everything recorded so far as a Chrome trace event file.
+
+        :param path: The path of the JSON file
+        :return: None
+        """
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, file)
+
+
+# the profiler shared by every game loop
+profiler = Profiler(TRACE_PATH)
+
+
+def watch(events):
+    """
+    Look for the overlay toggle key in a list of events.
+
+    :param events: The list of pygame Events a loop is about to handle
+    :return: the same list of events
+    """
+    profiler.watch(events)
+    return events
+
+
+def begin_frame(loop):
+    if profiler.active:
+        profiler.begin_frame(loop)
+
+
+def phase(name):
+    if profiler.active:
+        profiler.phase(name)
+
+
+def count(name, amount=1):
+    if profiler.active:
+        profiler.count(name, amount)
+
+
+def end_frame():
+    if profiler.active:
+        profiler.end_frame()
+
+
+def keep_totals():
+    profiler.keep_totals()
+
+
+def totals():
+    """
+    :return: a copy of the counts added up since keep_totals() was called
+    """
+    return dict(profiler.totals)
+
+
+def overlay_visible():
+    return profiler.overlay
+
+
+def draw_overlay(screen):
+    if profiler.overlay:
+        profiler.draw(screen)
+
+
+if TRACE_PATH:
+    atexit.register(lambda: profiler.write_trace(TRACE_PATH))
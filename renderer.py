@@ -0,0 +1,194 @@
+import os
+import pygame
+import latency
+import profiler
+
+"""
+Frame presentation for every game loop. All drawing goes through a Renderer, which either draws straight to the screen
+and flips the whole frame (the default), or, in dirty rectangle mode, remembers what was drawn and only redraws and
+presents the parts of the screen that changed since the previous frame.
+
+Dirty rectangle mode is opt-in: set TEASHOP_DIRTY_RECTS=1, or TEASHOP_DIRTY_RECTS=debug to also outline the regions
+that were redrawn each frame.
+"""
+
+DIRTY_RECTS = os.environ.get("TEASHOP_DIRTY_RECTS", "") in ("1", "debug")
+DEBUG_DIRTY_RECTS = os.environ.get("TEASHOP_DIRTY_RECTS", "") == "debug"
+
+# colour of the debug outlines around redrawn regions
+DEBUG_COLOR = (255, 0, 255)
+
+
+class Renderer:
+    def __init__(self, screen, dirty=None, debug=None):
+        """
+        The Renderer class draws a frame onto the screen and presents it. Its drawing methods mirror Surface.blit(),
+        Surface.blits(), Surface.fill() and the pygame.draw functions, so it can be passed anywhere a Surface is blitted
+        onto.
+
+        In dirty rectangle mode each drawing call is recorded as a command with a key describing exactly what it draws
+        and the rectangle it covers. present() compares the frame's commands with the previous frame's: wherever a
+        command appeared or disappeared, that rectangle is dirty. Only the dirty rectangles are redrawn, starting from
+        the full screen background layer (the frame's first command), and only they are sent to the display.
+
+        :param screen: The pygame display Surface
+        :param dirty: Whether to use dirty rectangle mode, None to follow TEASHOP_DIRTY_RECTS
+        :param debug: Whether to outline redrawn regions, None to follow TEASHOP_DIRTY_RECTS
+        """
+        self.screen = screen
+        self.dirty = DIRTY_RECTS if dirty is None else dirty
+        self.debug = DEBUG_DIRTY_RECTS if debug is None else debug
+        self._bounds = screen.get_rect()
+        self._commands = []  # (key, rect, draw function) of the frame being drawn
+        self._previous = None  # key -> rect of the last presented frame, None to redraw everything
+        self._marked = []  # regions marked dirty by hand
+        self._outlines = []  # debug outlines drawn last frame, which have to be erased this frame
+
+    def get_size(self):
+        return self.screen.get_size()
+
+    def get_width(self):
+        return self.screen.get_width()
+
+    def get_height(self):
+        return self.screen.get_height()
+
+    def get_rect(self, **kwargs):
+        return self.screen.get_rect(**kwargs)
+
+    def _command(self, key, rect, draw):
+        """
+        Draw now, or record the command for present() in dirty rectangle mode.
+
+        :param key: A hashable tuple that is equal for two commands only when they draw the same pixels
+        :param rect: The Rect the command draws inside
+        :param draw: A function that takes the screen and performs the drawing
+        :return: the Rect the command draws inside
+        """
+        if self.dirty:
+            self._commands.append((key, rect.clip(self._bounds), draw))
+        else:
+            draw(self.screen)
+        return rect
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        area = pygame.Rect(area) if area is not None else None
+        rect = pygame.Rect(dest, area.size if area is not None else source.get_size())
+        profiler.count("blits")
+        key = ("blit", source, tuple(dest), tuple(area) if area is not None else None, special_flags)
+        return self._command(key, rect, lambda screen: screen.blit(source, dest, area, special_flags))
+
+    def blits(self, blit_sequence, doreturn=True):
+        if not self.dirty:
+            profiler.count("blits", len(blit_sequence))
+            return self.screen.blits(blit_sequence, doreturn)
+        rects = [self.blit(*item) for item in blit_sequence]
+        return rects if doreturn else None
+
+    def fill(self, color, rect=None, special_flags=0):
+        rect = pygame.Rect(rect) if rect is not None else self._bounds.copy()
+        key = ("fill", tuple(color), tuple(rect), special_flags)
+        return self._command(key, rect, lambda screen: screen.fill(color, rect, special_flags))
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        rect = pygame.Rect(rect)
+        key = ("rect", tuple(color), tuple(rect), width, border_radius)
+        return self._command(key, rect, lambda screen: pygame.draw.rect(screen, color, rect, width, border_radius))
+
+    def circle(self, color, center, radius, width=0):
+        rect = pygame.Rect(0, 0, radius * 2 + 2, radius * 2 + 2)
+        rect.center = center
+        key = ("circle", tuple(color), tuple(center), radius, width)
+        return self._command(key, rect, lambda screen: pygame.draw.circle(screen, color, center, radius, width))
+
+    def lines(self, color, closed, points, width=1):
+        points = [tuple(point) for point in points]
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        rect = pygame.Rect(min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1).inflate(width * 2, width * 2)
+        key = ("lines", tuple(color), closed, tuple(points), width)
+        return self._command(key, rect, lambda screen: pygame.draw.lines(screen, color, closed, points, width))
+
+    def mark_dirty(self, rect):
+        """
+        Force a region to be redrawn this frame, for when a surface that was already drawn is changed in place.
+
+        :param rect: The Rect to redraw
+        :return: None
+        """
+        self._marked.append(pygame.Rect(rect))
+
+    def invalidate(self):
+        """
+        Redraw the whole screen on the next present(), e.g. after another loop has drawn over it.
+
+        :return: None
+        """
+        self._previous = None
+
+    def present(self):
+        """
+        Show the frame: flip the whole display, or in dirty rectangle mode redraw and update only what changed.
+
+        :return: the list of Rects that were updated
+        """
+        profiler.draw_overlay(self)
+
+        if not self.dirty:
+            pygame.display.flip()
+            latency.presented()
+            return [self._bounds]
+
+        current = {key: rect for key, rect, draw in self._commands}
+        if self._previous is None:
+            dirty = [self._bounds.copy()]
+        else:
+            # commands that only exist in one of the two frames are what changed
+            changed = current.keys() ^ self._previous.keys()
+            dirty = [current[key] if key in current else self._previous[key] for key in changed]
+            dirty = _merge(dirty + self._marked + self._outlines)
+
+        for region in dirty:
+            self.screen.set_clip(region)
+            for key, rect, draw in self._commands:
+                if rect.colliderect(region):
+                    draw(self.screen)
+        self.screen.set_clip(None)
+
+        self._outlines = []
+        if self.debug:
+            for region in dirty:
+                pygame.draw.rect(self.screen, DEBUG_COLOR, region, 1)
+            self._outlines = [region.copy() for region in dirty]
+
+        if dirty:
+            pygame.display.update(dirty)
+            latency.presented()
+        else:
+            latency.discard()  # nothing changed, so the input since the last frame had nothing to show
+        self._previous = current
+        self._commands = []
+        self._marked = []
+        return dirty
+
+
+def _merge(rects):
+    """
+    Merge overlapping rectangles so no region is redrawn twice.
+
+    :param rects: A list of Rects
+    :return: a list of non-overlapping Rects covering the same area (or a little more)
+    """
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        # keep swallowing merged rects that overlap, since a grown rect can start overlapping earlier ones
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        if rect.width > 0 and rect.height > 0:
+            merged.append(rect)
+    return merged
@@ -0,0 +1,114 @@
+import numpy as np
+import aspects
+
+"""
+Batch scoring of tea formulations against customer orders, for analytics and replays that need to grade millions of
+pairs. grade() gives the same answer as main.valueCheck() for every pair of a formulation matrix and an order matrix,
+using whole-array comparisons instead of a Python call per pair.
+"""
+
+# grade codes, which index GRADES
+BAD, GOOD, PERFECT = 0, 1, 2
+GRADES = ("Bad", "Good", "Perfect")
+
+# how many pairs are graded at a time; bounds the size of the temporary arrays
+CHUNK_PAIRS = 1 << 20
+
+# amounts up to this many fit in one byte with a spare top bit, which lets pack() and grade() compare all 8 aspects
+# of a pair at once
+PACKED_MAX = 127
+_TOP_BITS = np.uint64(0x8080808080808080)
+
+
+def presence_masks(amounts):
+    """
+    Pack which aspects each row has any of into one byte per row, bit i standing for aspects.VOCABULARY[i].
+
+    :param amounts: An (n, 8) array of aspect vectors
+    :return: an (n,) array of uint8 masks
+    """
+    bits = (amounts > 0).astype(np.uint8)
+    return np.bitwise_or.reduce(bits << np.arange(len(aspects.VOCABULARY), dtype=np.uint8), axis=1)
+
+
+def grade(formulations, orders):
+    """
+    Grade every formulation against every order with the rules of main.valueCheck(): missing any aspect of the order
+    is Bad, having at least the ordered amount of every aspect is Perfect, and anything else is Good.
+
+    :param formulations: An (n, 8) array of aspect vectors, or a single vector
+    :param orders: An (m, 8) array of aspect vectors, or a single vector
+    :return: an (n, m) uint8 array of grade codes (BAD, GOOD or PERFECT); GRADES[code] is the name
+    """
+    formulations = np.atleast_2d(np.asarray(formulations))
+    orders = np.atleast_2d(np.asarray(orders))
+    n, m = len(formulations), len(orders)
+    grades = np.empty((n, m), dtype=np.uint8)
+
+    # an aspect is missing when the order has it and the formulation doesn't: one byte operation per pair
+    has = presence_masks(formulations)
+    wants = presence_masks(orders)
+    packed = _packable(formulations) and _packable(orders)
+    if packed:
+        formulations, orders = pack(formulations), pack(orders)
+
+    rows = max(CHUNK_PAIRS // max(m, 1), 1)
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+        if packed:
+            perfect = _enough_packed(formulations[start:stop], orders)
+        else:
+            perfect = _enough(formulations[start:stop], orders)
+        present = (wants[None, :] & ~has[start:stop, None]) == 0
+
+        # Bad is 0, Good 1 and Perfect 2: present * (1 + perfect), since a pair missing an aspect can't be perfect
+        chunk = grades[start:stop]
+        np.add(perfect, 1, out=chunk, dtype=np.uint8)
+        chunk *= present
+    return grades
+
+
+def _packable(amounts):
+    # only whole numbers survive the cast to bytes unchanged
+    if not np.issubdtype(amounts.dtype, np.integer):
+        return False
+    return len(amounts) == 0 or (amounts.min() >= 0 and amounts.max() <= PACKED_MAX)
+
+
+def pack(amounts):
+    """
+    Pack aspect vectors with amounts from 0 to PACKED_MAX into one 64 bit number each, one byte per aspect.
+
+    :param amounts: An (n, 8) array of aspect vectors
+    :return: an (n,) array of uint64
+    """
+    amounts = np.atleast_2d(np.asarray(amounts))
+    # a byte over PACKED_MAX would borrow from the next aspect in _enough_packed(), and one over 255 would wrap, so
+    # either would silently give the wrong grade
+    if amounts.shape[1:] != (8,) or not _packable(amounts):
+        raise ValueError(f"only (n, 8) whole amounts from 0 to {PACKED_MAX} can be packed")
+    return np.ascontiguousarray(amounts, dtype=np.uint8).view(np.uint64).reshape(len(amounts))
+
+
+def _enough_packed(formulations, orders):
+    # every byte of (f | 0x80) - o keeps its top bit exactly when f >= o in that byte, and no byte borrows from the
+    # next because f + 128 - o is at least 1, so all 8 aspects are compared with one subtraction per pair
+    difference = np.subtract.outer(formulations | _TOP_BITS, orders)
+    difference &= _TOP_BITS
+    return difference == _TOP_BITS
+
+
+def _enough(formulations, orders):
+    # the general case, for amounts that don't fit in a byte: one (n, m) comparison per aspect
+    enough = np.ones((len(formulations), len(orders)), dtype=bool)
+    for index in range(len(aspects.VOCABULARY)):
+        enough &= formulations[:, index, None] >= orders[None, :, index]
+    return enough
+
+
+def names(codes):
+    """
+    :param codes: An array of grade codes from grade()
+    :return: an array of the same shape with the grade names
+    """
+    return np.asarray(GRADES)[codes]
@@ -0,0 +1,300 @@
+import argparse
+import itertools
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import aspects
+import customers
+import hints
+import main as game
+import minigame3
+import scoring
+import spell_catalog
+from spellcaster import NodeGrid, SpellNode
+
+"""
+A Monte Carlo balance simulator: plays the customers' orders over and over with no window, to see how often players
+of different skill make each customer Perfect, Good or Bad with the spells in the spellbook.
+
+Nothing is drawn. A session is one game: every customer gets minigame3.CASTS casts, a simulated player picks each
+spell (following the hint, reading the pages, or at random) and each trace succeeds with a probability worked out from
+the shape of the spell's nodes, using the same swept hit test cast_spell() uses. The tea is graded with
+main.valueCheck().
+
+For one order, all that matters about a tea is what it still lacks of each aspect (its deficit): that decides both
+the hint and the grade. So every deficit an order can be left with is worked out once, graded with valueCheck() and
+given its next deficit after each spell, and the sessions themselves are only table lookups, run on NumPy arrays of
+many sessions at a time. The sessions are split into chunks spread over a process pool; each chunk has its own random
+generator spawned from one seed, so the results are the same for the same seed whatever the number of workers.
+
+`python simulator.py` plays a million sessions of the story's four professors; see `python simulator.py --help`.
+"""
+
+# how likely each part of a spell's shape is to make a trace fail, for a player of skill 1
+SLIP = 0.01  # per node: losing the path on the way to it
+DISTANCE = 0.01  # per 100 pixels traced
+TURN = 0.03  # per turn of the path, times how sharp it is (turning straight back counts 1)
+OBSTACLE = 0.12  # per node a straight stroke enters before reaching the next node, so it has to be drawn around
+CLOSE_CALL = 0.03  # per node a straight stroke passes within CLEARANCE pixels of without entering
+CLEARANCE = 15
+
+# how many sessions one task of the process pool plays; bounds the size of the arrays each worker makes
+CHUNK_SESSIONS = 100_000
+
+# how a player picks spells: with probability hint_rate the spell the hint suggests, otherwise with probability
+# read_rate a spell whose page shows an aspect the tea still lacks, otherwise any spell. skill divides how likely a
+# trace is to fail (2 fails half as often as 1)
+Player = namedtuple("Player", ["hint_rate", "read_rate", "skill"])
+
+# the nodes, the length of the path in pixels, the sum of the sharpness of its turns, and the nodes a straight
+# stroke would enter or pass close to on the way, of one spell
+Shape = namedtuple("Shape", ["nodes", "length", "turns", "obstacles", "close_calls"])
+
+# one order worked out for the simulation; states are deficits numbered with np.ravel_multi_index()
+# start: the state of an empty tea
+# next_state: (states, spells) array, the state after each spell is cast successfully
+# grades: (states,) array of grade codes from scoring
+# options: (CASTS, 3, states, spells) array, the spells each way of picking chooses from with that many casts left,
+#          padded at the end; counts has how many of each row are real
+Table = namedtuple("Table", ["name", "start", "next_state", "grades", "options", "counts"])
+
+Model = namedtuple("Model", ["player", "casts", "success", "tables"])
+
+# totals of a simulation, summed over every chunk
+# grades: (customers, 3) array, how many sessions each customer got a Bad, Good and Perfect tea
+# failed: (customers, casts + 1) array, how many sessions each customer had 0, 1, ... failed casts
+# helped: (customers + 1,) array, how many sessions made 0, 1, ... customers happy (Good or Perfect)
+Outcome = namedtuple("Outcome", ["customers", "sessions", "grades", "failed", "helped"])
+
+
+def shape(spell):
+    """
+    Measure the path of a spell: straight strokes from node to node, checked against the other nodes with the
+    NodeGrid of spellcaster.py.
+
+    :param spell: A spell with node_positions
+    :return: a Shape
+    """
+    positions = spell.node_positions
+    nodes = [SpellNode(pos, i, spell_catalog.NODE_RADIUS) for i, pos in enumerate(positions)]
+    wide = [SpellNode(pos, i, spell_catalog.NODE_RADIUS + CLEARANCE) for i, pos in enumerate(positions)]
+    grid, wide_grid = NodeGrid(nodes), NodeGrid(wide)
+
+    length = turns = 0.0
+    obstacles = close_calls = 0
+    for i in range(len(positions) - 1):
+        start, end = positions[i], positions[i + 1]
+        length += math.dist(start, end)
+        # only the nodes entered before the next one get in the way; the stroke starts inside node i, so it isn't one
+        entered = grid.crossed(start, end)
+        in_way = set(entered[:entered.index(i + 1)]) if i + 1 in entered else set(entered)
+        near = wide_grid.crossed(start, end)
+        near = set(near[:near.index(i + 1)]) if i + 1 in near else set(near)
+        obstacles += len(in_way)
+        close_calls += len(near - in_way - {i + 1})
+        if i > 0:
+            before = math.atan2(start[1] - positions[i - 1][1], start[0] - positions[i - 1][0])
+            after = math.atan2(end[1] - start[1], end[0] - start[0])
+            turn = abs(after - before) % (2 * math.pi)
+            turns += min(turn, 2 * math.pi - turn) / math.pi
+    return Shape(len(positions), length, turns, obstacles, close_calls)
+
+
+def trace_success(spell_shape, skill=1.0):
+    """
+    :param spell_shape: The Shape of a spell
+    :param skill: How much less likely than usual the player is to make each mistake
+    :return: the probability of tracing the spell without a mistake
+    """
+    def kept(hazard, times):
+        # the chance of not making a mistake with this hazard, this many times
+        return (1 - min(hazard / skill, 1.0)) ** times
+
+    success = (kept(SLIP, spell_shape.nodes) * kept(DISTANCE, spell_shape.length / 100)
+               * kept(OBSTACLE, spell_shape.obstacles) * kept(CLOSE_CALL, spell_shape.close_calls))
+    success *= kept(TURN * spell_shape.turns, 1)
+    return max(success, 0.0)
+
+
+def order_table(name, order, recipes, casts):
+    """
+    Work out every state of one order.
+
+    :param name: The customer's name
+    :param order: The aspect vector they order
+    :param recipes: The hints.RecipeIndex of the spells
+    :param casts: The number of casts per customer
+    :return: a Table
+    """
+    order = np.maximum(np.asarray(order), 0)
+    dims = tuple(int(amount) + 1 for amount in order)
+    deficits = np.array(list(np.ndindex(*dims)), dtype=aspects.AMOUNT_TYPE).reshape(-1, len(dims))
+    count = len(recipes.spells)
+
+    after = np.maximum(deficits[:, None, :] - recipes.effects[None, :, :], 0)
+    next_state = np.ravel_multi_index(after.reshape(-1, len(dims)).T, dims).reshape(len(deficits), count)
+    grades = np.array([scoring.GRADES.index(game.valueCheck(order, order - deficit)) for deficit in deficits], dtype=np.uint8)
+
+    # the spells each way of picking chooses from; when a way has nothing to choose, the player picks any spell
+    position = {spell.name: index for index, spell in enumerate(recipes.spells)}
+    lacking = ((recipes.effects[None, :, :] > 0) & (deficits[:, None, :] > 0)).any(axis=2)
+    options = np.zeros((casts, 3, len(deficits), count), dtype=np.intp)
+    counts = np.zeros((casts, 3, len(deficits)), dtype=np.intp)
+    for left in range(1, casts + 1):
+        for state, deficit in enumerate(deficits):
+            hinted = [position[spell.name] for spell in recipes.perfect_spells(order, order - deficit, left)]
+            for way, chosen in enumerate((hinted, np.flatnonzero(lacking[state]), range(count))):
+                chosen = list(chosen) or list(range(count))
+                options[left - 1, way, state, :len(chosen)] = chosen
+                counts[left - 1, way, state] = len(chosen)
+    start = int(np.ravel_multi_index(tuple(order), dims))
+    return Table(name, start, next_state, grades, options, counts)
+
+
+def build(player, orders=None, spells=None, casts=minigame3.CASTS):
+    """
+    Work out everything the simulation of a player needs.
+
+    :param player: A Player
+    :param orders: A dictionary mapping customer names to the aspect vectors they order, main.orderList by default
+    :param spells: The spells of the spellbook, the catalog's spells by default
+    :param casts: The number of casts per customer
+    :return: a Model
+    """
+    orders = game.orderList if orders is None else orders
+    spells = spell_catalog.spells((game.width, game.height)) if spells is None else spells
+    recipes = hints.index_for(spells, casts)
+    success = np.array([trace_success(shape(spell), player.skill) for spell in spells])
+    tables = [order_table(name, order, recipes, casts) for name, order in orders.items()]
+    return Model(player, casts, success, tables)
+
+
+# the model the chunks of this process play, set once per worker
+_model = None
+
+
+def _use_model(model):
+    global _model
+    _model = model
+
+
+def _simulate_chunk(seed, sessions):
+    # play a chunk of sessions with its own random generator, and count the outcomes
+    model, player = _model, _model.player
+    rng = np.random.default_rng(seed)
+    count = len(model.tables)
+    grades = np.zeros((count, len(scoring.GRADES)), dtype=np.int64)
+    failed = np.zeros((count, model.casts + 1), dtype=np.int64)
+    helped = np.zeros(sessions, dtype=np.intp)
+    hinted_or_read = player.hint_rate + (1 - player.hint_rate) * player.read_rate
+
+    for customer, table in enumerate(model.tables):
+        state = np.full(sessions, table.start, dtype=np.intp)
+        failures = np.zeros(sessions, dtype=np.intp)
+        for cast in range(model.casts):
+            left = model.casts - cast - 1
+            way_draw, pick_draw, trace_draw = rng.random((3, sessions))
+            way = (way_draw >= player.hint_rate).astype(np.intp) + (way_draw >= hinted_or_read)
+            pick = (pick_draw * table.counts[left, way, state]).astype(np.intp)
+            spell = table.options[left, way, state, pick]
+            traced = trace_draw < model.success[spell]
+            failures += ~traced
+            state = np.where(traced, table.next_state[state, spell], state)
+        grade = table.grades[state]
+        grades[customer] = np.bincount(grade, minlength=len(scoring.GRADES))
+        failed[customer] = np.bincount(failures, minlength=model.casts + 1)
+        helped += grade != scoring.BAD
+    return grades, failed, np.bincount(helped, minlength=count + 1)
+
+
+def simulate(model, sessions, workers=None, seed=0):
+    """
+    Play many sessions, spread over a process pool.
+
+    :param model: A Model from build()
+    :param sessions: How many sessions to play
+    :param workers: How many processes to use, one per CPU by default; 1 plays them in this process
+    :param seed: The seed the random generator of every chunk is spawned from
+    :return: an Outcome
+    """
+    chunks = [min(CHUNK_SESSIONS, sessions - start) for start in range(0, sessions, CHUNK_SESSIONS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    count = len(model.tables)
+    grades = np.zeros((count, len(scoring.GRADES)), dtype=np.int64)
+    failed = np.zeros((count, model.casts + 1), dtype=np.int64)
+    helped = np.zeros(count + 1, dtype=np.int64)
+
+    if workers == 1:
+        _use_model(model)
+        results = map(_simulate_chunk, seeds, chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_use_model, initargs=(model,))
+        results = pool.map(_simulate_chunk, seeds, chunks)
+    try:
+        for chunk_grades, chunk_failed, chunk_helped in results:
+            grades += chunk_grades
+            failed += chunk_failed
+            helped += chunk_helped
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return Outcome(tuple(table.name for table in model.tables), sessions, grades, failed, helped)
+
+
+def print_outcome(outcome):
+    """
+    :param outcome: An Outcome
+    :return: None
+    """
+    width = max(len(name) for name in outcome.customers)
+    for name, grades, failed in zip(outcome.customers, outcome.grades, outcome.failed):
+        shares = "  ".join(f"{grade} {100 * amount / outcome.sessions:5.1f}%" for grade, amount in zip(scoring.GRADES, grades))
+        mean_failed = (failed * np.arange(len(failed))).sum() / outcome.sessions
+        print(f"  {name:<{width}}  {shares}  {mean_failed:.2f} failed casts")
+    happy = "  ".join(f"{helped}: {100 * amount / outcome.sessions:.1f}%" for helped, amount in enumerate(outcome.helped))
+    print(f"  customers happy per session  {happy}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many sessions of the game to see how hard the orders are.")
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="how many sessions to play for each player")
+    parser.add_argument("--workers", type=int, help="how many processes to use, one per CPU by default")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the simulation (and the endless customers)")
+    parser.add_argument("--hint-rate", type=float, default=0.0, help="how often the player casts a spell the hint suggests")
+    parser.add_argument("--read-rate", type=float, default=0.5, help="how often the player otherwise casts a spell with an aspect the tea lacks")
+    parser.add_argument("--skill", type=float, default=1.0, help="how much less often than usual the player makes a tracing mistake")
+    parser.add_argument("--sweep", action="store_true", help="simulate every combination of skill 0.5, 1 and 2 and hint rate 0, 0.5 and 1 instead")
+    parser.add_argument("--endless", type=int, metavar="CUSTOMERS", help="simulate the first orders of endless mode instead of the professors")
+    args = parser.parse_args()
+
+    spells = spell_catalog.spells((game.width, game.height))
+    orders = None
+    if args.endless:
+        source = customers.generate(args.seed, hints.index_for(spells, minigame3.CASTS).can_make)
+        orders = {customer.name: customer.order for customer in itertools.islice(source, args.endless)}
+
+    print("spell               nodes  length  turns  in way  close  traced")
+    for spell in spells:
+        spell_shape = shape(spell)
+        print(f"{spell.name:<18}  {spell_shape.nodes:5}  {spell_shape.length:6.0f}  {spell_shape.turns:5.2f}  "
+              f"{spell_shape.obstacles:6}  {spell_shape.close_calls:5}  {100 * trace_success(spell_shape, args.skill):5.1f}%")
+
+    if args.sweep:
+        players = [Player(hint_rate, args.read_rate, skill) for skill in (0.5, 1.0, 2.0) for hint_rate in (0.0, 0.5, 1.0)]
+    else:
+        players = [Player(args.hint_rate, args.read_rate, args.skill)]
+    start = time.perf_counter()
+    for player in players:
+        outcome = simulate(build(player, orders, spells), args.sessions, args.workers, args.seed)
+        print(f"\nskill {player.skill:g}, hint rate {player.hint_rate:g}, read rate {player.read_rate:g}: {outcome.sessions} sessions")
+        print_outcome(outcome)
+    elapsed = time.perf_counter() - start
+    played = args.sessions * len(players)
+    print(f"\nsimulated {played} sessions in {elapsed:.1f} s ({played / elapsed:,.0f} sessions/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import os
+from collections import namedtuple
+import assets
+import aspects
+
+"""
+The spellbook's spells, read from the catalog file Spell_Assets/spells.json instead of being written out in code.
+
+The catalog is read and checked once per process. For each screen size it is asked for, it is compiled into a tuple of
+CatalogSpells with the nodes already placed on screen, and every visit to the spellbook shares that tuple. Spell icons
+are only loaded when a page first shows them, so a longer catalog doesn't make opening the spellbook any slower.
+
+Each spell in the catalog has a name, its aspects and their amounts, its magic words, the path of its glyph image and
+its nodes in tracing order. Nodes are offsets from the center of the screen in grid units ("grid" pixels each), the
+same grid paper the spells were first drawn on.
+"""
+
+CATALOG_PATH = "Spell_Assets/spells.json"
+
+# size of a spell's icon on its page
+ICON_SIZE = (160, 160)
+
+# radius of a node on screen, which must fit on the screen completely
+NODE_RADIUS = 20
+
+
+class CatalogSpell(namedtuple("CatalogSpell", ["name", "aspects", "effect", "words", "glyph", "node_positions"])):
+    """
+    One compiled spell. It has the same attributes the minigame and cast_spell() read from a Spell, but it can't be
+    changed, so one copy can be shared by every visit to the spellbook.
+
+    name: the name of the spell
+    aspects: the aspects as shown on the page, e.g. "Aspects: Citrus +1, Sweet +1"
+    effect: the aspect vector the spell adds to a tea (see aspects.py), read-only
+    words: a tuple of the spell's magic words
+    glyph: the path of the spell's icon image
+    node_positions: a tuple of the (x, y) screen coordinates of the nodes, in tracing order
+    """
+    __slots__ = ()
+
+    @property
+    def icon(self):
+        # the asset cache keeps the scaled icon after the first time, so this is only slow once
+        return assets.image(self.glyph, ICON_SIZE, assets.PREMULTIPLIED)
+
+
+# catalogs read so far, keyed by path, and their compiled spells, keyed by (path, screen size)
+_catalogs = {}
+_compiled = {}
+
+
+def load(path=None):
+    """
+    Read and check a spell catalog, the first time it is asked for.
+
+    :param path: The path of the catalog file, CATALOG_PATH by default
+    :return: a tuple of the catalog's spells as dictionaries, in page order
+    :raise ValueError: if the catalog has a problem; the message lists every problem found
+    """
+    path = path or CATALOG_PATH
+    if path not in _catalogs:
+        with open(path) as file:
+            data = json.load(file)
+        spells = tuple(data["spells"])
+        problems = validate(spells)
+        if problems:
+            raise ValueError(f"{path} has {len(problems)} problem(s):\n  " + "\n  ".join(problems))
+        _catalogs[path] = (data.get("grid", 20), spells)
+    return _catalogs[path][1]
+
+
+def validate(spells):
+    """
+    Check a list of catalog spells: every spell needs a unique name, at least one aspect from aspects.VOCABULARY with
+    a positive whole number amount, at least one magic word, a glyph image that exists, and at least two nodes with no
+    node repeated (a node that is traced twice would already be traced the second time, so the spell couldn't be cast).
+
+    :param spells: A list of spells as dictionaries
+    :return: a list of strings describing each problem, empty if there are none
+    """
+    problems = []
+    names = set()
+    if not spells:
+        problems.append("the catalog has no spells")
+    for number, spell in enumerate(spells, start=1):
+        name = spell.get("name")
+        where = f"spell {number} ({name!r})"
+        if not name:
+            problems.append(f"{where} has no name")
+        elif name in names:
+            problems.append(f"{where} has the same name as an earlier spell")
+        names.add(name)
+
+        amounts = spell.get("aspects") or {}
+        if not amounts:
+            problems.append(f"{where} has no aspects")
+        for aspect, amount in amounts.items():
+            if aspect not in aspects.INDEX:
+                problems.append(f"{where} has an unknown aspect {aspect!r}")
+            if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+                problems.append(f"{where} has an amount of {amount!r} for {aspect}")
+
+        if not spell.get("words"):
+            problems.append(f"{where} has no magic words")
+
+        glyph = spell.get("glyph", "")
+        if not (assets.is_packed(glyph) or os.path.isfile(glyph)):
+            problems.append(f"{where} has a glyph that doesn't exist: {glyph!r}")
+
+        nodes = [tuple(node) for node in spell.get("nodes", [])]
+        if len(nodes) < 2:
+            problems.append(f"{where} has {len(nodes)} node(s), a spell needs at least 2")
+        if any(len(node) != 2 or not all(isinstance(v, int) for v in node) for node in nodes):
+            problems.append(f"{where} has a node that isn't a pair of whole numbers")
+        elif len(set(nodes)) != len(nodes):
+            problems.append(f"{where} has the same node more than once")
+    return problems
+
+
+def spells(screen_size, path=None):
+    """
+    Get the spells of a catalog with their nodes placed around the center of a screen of the given size, compiling
+    them the first time they are asked for.
+
+    :param screen_size: The (width, height) of the screen the spells will be cast on
+    :param path: The path of the catalog file, CATALOG_PATH by default
+    :return: a tuple of CatalogSpells, in page order
+    :raise ValueError: if the catalog has a problem, or a spell has a node that doesn't fit on the screen
+    """
+    path = path or CATALOG_PATH
+    key = (path, tuple(screen_size))
+    if key not in _compiled:
+        _compiled[key] = compile_spells(load(path), _catalogs[path][0], screen_size)
+    return _compiled[key]
+
+
+def compile_spells(catalog, grid, screen_size):
+    """
+    Turn catalog spells into CatalogSpells for a screen size.
+
+    :param catalog: A list of spells as dictionaries, already checked by validate()
+    :param grid: The size of a grid unit in pixels
+    :param screen_size: The (width, height) of the screen
+    :return: a tuple of CatalogSpells
+    :raise ValueError: if a spell has a node that doesn't fit on the screen
+    """
+    width, height = screen_size
+    cx, cy = width // 2, height // 2
+    compiled = []
+    for spell in catalog:
+        positions = tuple((cx + dx * grid, cy + dy * grid) for dx, dy in spell["nodes"])
+        for x, y in positions:
+            if not (NODE_RADIUS <= x <= width - NODE_RADIUS and NODE_RADIUS <= y <= height - NODE_RADIUS):
+                raise ValueError(f"spell {spell['name']!r} has a node at {(x, y)}, off a {width}x{height} screen")
+        effect = aspects.vector(spell["aspects"])
+        effect.setflags(write=False)  # shared by every visit to the spellbook
+        compiled.append(CatalogSpell(
+            spell["name"],
+            "Aspects: " + ", ".join(f"{aspect} {amount:+d}" for aspect, amount in spell["aspects"].items()),
+            effect,
+            tuple(spell["words"]),
+            spell["glyph"],
+            positions,
+        ))
+    return tuple(compiled)
+
+
+def clear():
+    # forget every catalog read so far, so edits to the file are picked up
+    _catalogs.clear()
+    _compiled.clear()
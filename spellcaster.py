@@ -2,12 +2,23 @@ import pygame
 import sys
 import math
 import random
+from collections import OrderedDict
+import assets
+import text_render
+import renderer
+import particles
+import latency
+import inputs
+import profiler
 
 """
 Written by Royce Malikov
 ID: 21180984
 """
 
+# how many frames the teacup and the stars (or Xs) show after a cast, 2 seconds; tools may shorten it
+EFFECT_FRAMES = 120
+
 # The Spell class is a helper class which contains a bunch of information related to each spell
 class Spell:
     def __init__(self, name, aspects, words, icon, node_positions):
@@ -15,7 +26,7 @@ class Spell:
         :param name: A string containing the name of the spell
         :param aspects: A stripng containing the aspects of the spell
         :param words: A list containing magic words corresponding to the spell
-        :param icon: A pygame image, converted by alpha to keep transparent, and scaledc to 160 pixels
+        :param icon: A pygame image, premultiplied by alpha to keep transparent, and scaledc to 160 pixels
         :param node_positions: A list of screen coordinates for the nodes of the spell
         """
         self.name = name
@@ -25,11 +36,18 @@ class Spell:
         self.node_positions = node_positions
 
 
+# pre-rendered node pictures, keyed by (index, traced, radius, font); the least recently used one is dropped past
+# MAX_NODE_SPRITES, in case a font is reloaded as a new object and the old keys are never asked for again
+MAX_NODE_SPRITES = 64
+node_sprites = OrderedDict()
+
+
 class SpellNode:
     def __init__(self, pos, index, radius=20):
         """
-        The SpellNode class contains information about a specific node, along with two methods:
+        The SpellNode class contains information about a specific node, along with three methods:
         draw() which draws it onto a given pygame Screen
+        sprite() which returns the pre-rendered picture of the node that draw() uses
         is_hover() which returns a boolean of if a given pygame mouse object is hovering over the node
 
         :param pos: A set of screen coordinates to draw the node at
@@ -43,28 +61,55 @@ class SpellNode:
 
     def draw(self, screen, font):
         """
-        The draw() function takes a pygame Screen and pygame Font and draws a circle onto the screen, representing the node
-        The function colors the circle depending on whether or not it has been traced already, and draws it at self.pos
-        It adds the number corresponding to the node onto the circle in the correct font
+        The draw() function takes a Renderer (or pygame Surface) and pygame Font and draws the node's sprite onto the
+        screen, centered at self.pos. The sprite is coloured depending on whether or not the node has been traced already
 
-        :param screen:
-        :param font:
+        :param screen: The Renderer drawing the current frame, or a pygame Surface
+        :param font: The pygame Font for the node number
         :return: None
         """
-        x, y = self.pos
+        screen.blit(self.sprite(font), self.rect)
 
-        if self.traced:
-            fill = (90, 200, 120)
-            border = (40, 120, 60)
-        else:
-            fill = (255, 210, 100)
-            border = (160, 110, 40)
+    def sprite(self, font):
+        """
+        The sprite() method returns the picture of the node: a circle with a border and the number corresponding to the
+        node on it, in the correct font. Sprites only depend on the number, the state and the size of the node, so
+        each one is drawn once and shared by every spell.
 
-        pygame.draw.circle(screen, fill, (x, y), self.radius)
-        pygame.draw.circle(screen, border, (x, y), self.radius, 3)
-        # Draw index number
-        num_surf = font.render(str(self.index + 1), True, (10, 10, 10))
-        screen.blit(num_surf, num_surf.get_rect(center=(x, y)))
+        :param font: The pygame Font for the node number
+        :return: a pygame Surface with a transparent background, the size of self.rect
+        """
+        key = (self.index, self.traced, self.radius, font)
+        if key in node_sprites:
+            node_sprites.move_to_end(key)  # mark as most recently used
+        else:
+            if self.traced:
+                fill = (90, 200, 120)
+                border = (40, 120, 60)
+            else:
+                fill = (255, 210, 100)
+                border = (160, 110, 40)
+
+            # the circle is drawn in the middle of a surface with one spare pixel on each side
+            size = self.radius * 2 + 2
+            center = (self.radius + 1, self.radius + 1)
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(surface, fill, center, self.radius)
+            pygame.draw.circle(surface, border, center, self.radius, 3)
+            # Draw index number
+            text_render.draw_text(surface, font, str(self.index + 1), center, (10, 10, 10), center=True)
+            node_sprites[key] = surface.convert_alpha()
+            profiler.count("surfaces", 2)
+            if len(node_sprites) > MAX_NODE_SPRITES:
+                node_sprites.popitem(last=False)
+        return node_sprites[key]
+
+    @property
+    def rect(self):
+        """
+        :return: the pygame Rect covered by the node's sprite
+        """
+        return pygame.Rect(self.pos[0] - self.radius - 1, self.pos[1] - self.radius - 1, self.radius * 2 + 2, self.radius * 2 + 2)
 
     def is_hover(self, mouse_pos):
         """
@@ -76,6 +121,99 @@ class SpellNode:
         return math.dist(self.pos, mouse_pos) <= self.radius
 
 
+class NodeGrid:
+    def __init__(self, nodes, cell_size=None):
+        """
+        The NodeGrid class is a spatial index of the nodes of a spell. The screen is divided into square cells and each
+        cell lists the nodes that reach into it, so finding the nodes near a point or along a mouse movement only looks
+        at the nodes in the cells it passes through instead of at every node of the spell.
+        It has two methods:
+        at() which returns the nodes a point is hovering over
+        crossed() which returns the nodes a mouse movement entered, in the order it entered them
+
+        :param nodes: The list of SpellNodes of the spell
+        :param cell_size: The width and height of a cell in pixels, by default the diameter of the largest node
+        """
+        self.nodes = nodes
+        self.cell_size = cell_size or max([n.radius * 2 for n in nodes] + [1])
+        self.cells = {}  # (column, row) -> list of node indices, in index order
+
+        for n in nodes:
+            # a node goes into every cell its bounding box touches, with a pixel to spare for movements along cell edges
+            x, y = n.pos
+            reach = n.radius + 1
+            for column in range(math.floor((x - reach) / self.cell_size), math.floor((x + reach) / self.cell_size) + 1):
+                for row in range(math.floor((y - reach) / self.cell_size), math.floor((y + reach) / self.cell_size) + 1):
+                    self.cells.setdefault((column, row), []).append(n.index)
+
+    def at(self, pos):
+        """
+        :param pos: Screen coordinates
+        :return: the list of indices of the nodes pos is hovering over, lowest index first
+        """
+        cell = (math.floor(pos[0] / self.cell_size), math.floor(pos[1] / self.cell_size))
+        return [i for i in self.cells.get(cell, []) if self.nodes[i].is_hover(pos)]
+
+    def crossed(self, start, end):
+        """
+        The crossed() method finds the nodes a mouse movement in a straight line from start to end entered from
+        outside. A node the movement started inside of was already entered earlier, so it is not included.
+
+        :param start: The screen coordinates the mouse moved from
+        :param end: The screen coordinates the mouse moved to
+        :return: the list of indices of the entered nodes, in the order they were entered
+        """
+        candidates = set()
+        for cell in self._cells_along(start, end):
+            candidates.update(self.cells.get(cell, ()))
+
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        a = dx * dx + dy * dy
+        entries = []
+        for i in candidates:
+            node = self.nodes[i]
+            # solve |start + t * (end - start) - node.pos| = radius for the first t where the movement touches the node
+            fx, fy = start[0] - node.pos[0], start[1] - node.pos[1]
+            c = fx * fx + fy * fy - node.radius * node.radius
+            if c <= 0 or a == 0:
+                continue  # started inside the node, or didn't move
+            b = 2 * (fx * dx + fy * dy)
+            discriminant = b * b - 4 * a * c
+            if discriminant < 0:
+                continue  # the line misses the node
+            t = (-b - math.sqrt(discriminant)) / (2 * a)
+            if 0 <= t <= 1:
+                entries.append((t, i))
+        return [i for t, i in sorted(entries)]
+
+    def _cells_along(self, start, end):
+        """
+        Walk the cells a straight line from start to end passes through, in order (a grid version of drawing a line).
+        """
+        x0, y0 = start[0] / self.cell_size, start[1] / self.cell_size
+        x1, y1 = end[0] / self.cell_size, end[1] / self.cell_size
+        column, row = math.floor(x0), math.floor(y0)
+        last_column, last_row = math.floor(x1), math.floor(y1)
+        step_x = 1 if x1 > x0 else -1
+        step_y = 1 if y1 > y0 else -1
+
+        # how far along the line (from 0 to 1) the next column and row boundaries are, and the distance between them
+        delta_x = 1 / abs(x1 - x0) if x1 != x0 else math.inf
+        delta_y = 1 / abs(y1 - y0) if y1 != y0 else math.inf
+        next_x = ((column + 1 - x0) if step_x > 0 else (x0 - column)) * delta_x if x1 != x0 else math.inf
+        next_y = ((row + 1 - y0) if step_y > 0 else (y0 - row)) * delta_y if y1 != y0 else math.inf
+
+        yield column, row
+        for _ in range(abs(last_column - column) + abs(last_row - row)):
+            if next_x < next_y:
+                column += step_x
+                next_x += delta_x
+            else:
+                row += step_y
+                next_y += delta_y
+            yield column, row
+
+
 def cast_spell(screen, clock, spell, background_image):
     """
     The cast_spell method takes a pygame Screen object, a pygame Clock object, and a Spell object.
@@ -93,85 +231,126 @@ def cast_spell(screen, clock, spell, background_image):
     WIDTH, HEIGHT = screen.get_size()
 
     # Font for node numbering
-    node_font = pygame.font.Font("Spell_Assets/MagicSchoolOne.ttf", 28)
+    node_font = assets.font("Spell_Assets/MagicSchoolOne.ttf", 28)
 
     # generating list of SpellNodes() from the list of coordinates in the spell
     nodes = [SpellNode(pos, i) for i, pos in enumerate(spell.node_positions)]
 
+    # spatial index of the nodes, for finding the nodes the mouse passed over
+    grid = NodeGrid(nodes)
+
     # booleans for spell handling
     next_required = 0
-    hovered_prev = None
+    last_mouse = None  # where the mouse was at the end of the last frame
     running_cast = True
     result = None  # None while in progress, True success, False fail
 
     # Loading images for the game and scaling
-    teacup_img = pygame.image.load("Spell_Assets/Teacup.png").convert_alpha()
-    teacup_img = pygame.transform.scale(teacup_img, (120, 120))
-    star_img = pygame.image.load("Spell_Assets/GoldStar.png").convert_alpha()
-    star_img = pygame.transform.scale(star_img, (24, 24))
-    x_img = pygame.image.load("Spell_Assets/RedX.png").convert_alpha()
-    x_img = pygame.transform.scale(x_img, (32, 32))
+    teacup_img = assets.image("Spell_Assets/Teacup.png", (120, 120), assets.PREMULTIPLIED)
+    star_img = assets.image("Spell_Assets/GoldStar.png", (24, 24), assets.PREMULTIPLIED)
+    x_img = assets.image("Spell_Assets/RedX.png", (32, 32), assets.PREMULTIPLIED)
 
     # loading sounds for the game
-    ding = pygame.mixer.Sound("Spell_Assets/ding.mp3")
-    error = pygame.mixer.Sound("Spell_Assets/error.mp3")
+    ding = assets.sound("Spell_Assets/ding.mp3")
+    error = assets.sound("Spell_Assets/error.mp3")
 
     # position the teacup in the center of the screen for the post-cast effects
     teacup_pos = (WIDTH // 2 - 60, HEIGHT // 2 - 60)
-    effects = []
-    effect_timer = 120  # 3 seconds
+    effects = None
+    effect_timer = EFFECT_FRAMES
+
+    # the cast's frames; after the first, only the areas around newly traced nodes are marked dirty
+    frame = renderer.Renderer(screen)
 
-    def draw_pattern_guides():
+    def draw_pattern_guides(surface):
         """
         The draw_pattern_guides() function draws lines connecting the centers of each node.
         The nodes will be drawn on top of these lines at the vertices. This creates a visual path between the nodes.
+        :param surface: The pygame Surface to draw the lines onto
         :return: None
         """
         if len(nodes) > 1:
             pts = [n.pos for n in nodes]
-            pygame.draw.lines(screen, (120, 180, 200), False, pts, 4)
+            pygame.draw.lines(surface, (120, 180, 200), False, pts, 4)
+
+    def draw_board(area=None):
+        """
+        The draw_board() function draws the background, the connecting lines and every node onto the board surface.
+        The board only changes when a node is traced, so it is drawn once when the cast starts and after that only the
+        area around a newly traced node is drawn again.
+        :param area: The pygame Rect of the board to draw, None for all of it
+        :return: None
+        """
+        board.set_clip(area)
+        board.blit(background_image, (0, 0))
+        draw_pattern_guides(board)
+        for n in nodes:
+            if area is None or n.rect.colliderect(area):
+                n.draw(board, node_font)
+        board.set_clip(None)
+
+    # the background, lines and nodes of the spell, drawn onto the screen with a single blit every frame
+    board = pygame.Surface(screen.get_size()).convert()
+    profiler.count("surfaces")
+    draw_board()
+    changed = [] # areas of the board to draw again
 
     # Main loop of the spell cast
     while running_cast:
+        profiler.begin_frame("cast")
+
+        # every position the mouse moved through since the last frame, so a fast swipe can't jump over a node
+        path = [] if last_mouse is None else [last_mouse]
+
+        latency.scene("tracing" if result is None else "effects")
+
         # handling game quitout
-        for event in pygame.event.get():
+        for event in latency.track(inputs.events()):
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.MOUSEMOTION:
+                path.append(event.pos)
 
         # current mouse coordinates
-        mouse = pygame.mouse.get_pos()
+        mouse = inputs.mouse_pos()
+        path.append(mouse)
 
-        # checking if mouse is currently hovering over node
-        hovered_now = None
-        for n in nodes:
-            if n.is_hover(mouse):
-                hovered_now = n.index
-                break
-
-        # draw background
-        screen.blit(background_image, (0, 0))
+        profiler.phase("draw")
 
         # draw spell if it has not resolved yet(not failed or succeeded)
         if result is None:
-            # draw the connecing lines
-            draw_pattern_guides()
-            # draw each node using SpellNode.draw()
-            for n in nodes:
-                n.draw(screen, node_font)
-
-            # check if the node hovered currently is new, to prevent errors for the cursor remaining in a node
-            if hovered_now is not None and hovered_now != hovered_prev:
-                node = nodes[hovered_now]
+            # redraw the board around nodes traced last frame, and tell the renderer that part of the board changed
+            for area in changed:
+                draw_board(area)
+                frame.mark_dirty(area)
+            changed.clear()
+
+            # draw the background, the connecting lines and the nodes
+            frame.blit(board, (0, 0))
+
+            profiler.phase("update")
+
+            # find the nodes the mouse entered since the last frame, in the order it entered them
+            # a node the cursor stays inside of is only entered once, to prevent errors for the cursor remaining in a node
+            entered = grid.at(path[0])[:1] if last_mouse is None else [] # at the start, the node under the cursor counts as entered
+            for start, end in zip(path, path[1:]):
+                entered += grid.crossed(start, end)
+
+            for index in entered:
+                node = nodes[index]
                 # if the node was already traced, play the error sound and fail the spell
                 if node.traced:
                     error.play()
+                    latency.sound()
                     result = False
                 else:
                     # if the node traced is the next required index, play the ding sound and increment the next requried node!
                     if node.index == next_required:
                         ding.play()
+                        latency.sound()
                         node.traced = True
+                        changed.append(node.rect) # the board shows the traced node from the next frame on
                         next_required += 1
                         # if the next required node is out of the list, the spell is successful!
                         if next_required >= len(nodes):
@@ -179,90 +358,77 @@ def cast_spell(screen, clock, spell, background_image):
                     # if the node is out of order, play the error sound and fail the spell
                     else:
                         error.play()
+                        latency.sound()
                         result = False
+                # once the spell has succeeded or failed, the rest of the movement doesn't matter
+                if result is not None:
+                    break
 
-            # update the previously hovered node
-            hovered_prev = hovered_now
+            # the traced node or the effects only appear on the board from the next frame on
+            if entered:
+                latency.hold()
+
+            profiler.phase("draw")
 
             # as long as the spell is not yet complete, draw a circle around the next required node that has a
             # radius of 6 more pixels
             if next_required < len(nodes):
                 nx = nodes[next_required]
-                pygame.draw.circle(screen, (80, 200, 230), nx.pos, nx.radius + 6, 3)
+                frame.circle((80, 200, 230), nx.pos, nx.radius + 6, 3)
 
         # if the spell has a result, begin drawing the effects
         else:
-            # check if the effects list has not been generated yet
-            if not effects:
+            # draw background
+            frame.blit(background_image, (0, 0))
+
+            profiler.phase("update")
+
+            # check if the effects have not been generated yet
+            if effects is None:
                 # center of teacup
                 teacup_center = (teacup_pos[0] + teacup_img.get_width() // 2,
                                  teacup_pos[1] + teacup_img.get_height() // 2)
                 # 25 gold stars if successful, 15 x images if failed
                 num_effects = 25 if result else 15
+                effects = particles.ParticleSystem(star_img if result else x_img)
 
-                # generate the effects list to be a list of dicitonaries
-                # each dictionary contains:
+                # each effect is a particle with:
                 # the position of the effect spread out by 80 pixels around the center of the teacup
                 # the delay in spawning which is a random number beetween 0 and 0.5s
-                # the state of the effect
-                # the oppacity of the effect
                 # the velocity of the effect (negative if it is a gold star, making it go up the screen, 0 if it is an x keep it stagnant)
+                # gold stars lose 3 units of oppacity every tick, x images stay fully visible
+                positions, delays, velocities = [], [], []
                 for i in range(num_effects):
                     dx = random.randint(-80, 80)
                     dy = random.randint(-60, 60)
-                    spawn_delay = random.randint(0, 30)
-                    effects.append({
-                        'pos': [teacup_center[0] + dx, teacup_center[1] + dy],
-                        'spawn_delay': spawn_delay,
-                        'spawned': False,
-                        'alpha': 255,
-                        'vy': -random.uniform(0.5, 1.5) if result else 0
-                    })
+                    positions.append((teacup_center[0] + dx, teacup_center[1] + dy))
+                    delays.append(random.randint(0, 30))
+                    velocities.append((0, -random.uniform(0.5, 1.5) if result else 0))
+                effects.emit(positions, velocities, delays, alpha=255, fade=3 if result else 0)
 
             # Draw the teacup
-            screen.blit(teacup_img, teacup_pos)
-
-            # Draw the effects
-            for e in effects:
-                # decrease the spawn delay by 1 game tick if it is above 0
-                if e['spawn_delay'] > 0:
-                    e['spawn_delay'] -= 1
-                    continue
-
-                # if the effect has reached 0 spawn delay, set the spawned flag to true
-                if not e['spawned']:
-                    e['spawned'] = True
-
-                # position of effect
-                x, y = e['pos']
-
-                # draw gold stars if successful
-                if result:
-                    # y position of the stars decreases, making them raise up the screen by vy every tick
-                    y += e['vy']
-                    e['pos'][1] = y
-                    # opacity decreases by 3 units up to a limit of 0
-                    e['alpha'] = max(e['alpha'] - 3, 0)
-                    if e['alpha'] <= 0:
-                        continue
-
-                    # draw the star image at the coordinates with the provided opacity
-                    star_surf = star_img.copy()
-                    star_surf.fill((255, 255, 255, e['alpha']), special_flags=pygame.BLEND_RGBA_MULT)
-                    screen.blit(star_surf, (x - star_surf.get_width() // 2, y - star_surf.get_height() // 2))
+            profiler.phase("draw")
+            frame.blit(teacup_img, teacup_pos, special_flags=pygame.BLEND_PREMULTIPLIED)
 
-                else:
-                    # Draw static red X at the coordinates of the effect
-                    screen.blit(x_img, (x - x_img.get_width() // 2, y - x_img.get_height() // 2))
+            # move the effects by one tick and draw them all at once
+            profiler.phase("update")
+            effects.update()
+            profiler.phase("draw")
+            effects.draw(frame)
 
-            # decrement effect timer. The timer starts at 120 ticks, so the effect lasts 2 seconds
+            # decrement effect timer. The timer starts at EFFECT_FRAMES ticks (2 seconds by default)
             effect_timer -= 1
             # if the effect is done, stop the cast
             if effect_timer <= 0:
                 running_cast = False
 
+        # remember where the mouse stopped, for the start of the next frame's movement
+        last_mouse = mouse
+
         # render the display and tick the game by 1 game tick (60 ticks per second)
-        pygame.display.flip()
+        profiler.phase("present")
+        frame.present()
+        profiler.end_frame()
         clock.tick(60)
 
     # return the result of the spell
@@ -0,0 +1,219 @@
+import pygame
+import profiler
+from collections import OrderedDict
+
+"""
+Shared cache of rendered text surfaces. Most of the text in the game (button labels, dialogue lines, spell pages) is the
+same from one frame to the next, so it only needs to be rasterized once.
+
+Text that changes often (counters, amounts, node numbers) would churn that cache, so it is drawn from a GlyphAtlas
+instead: every character is rasterized once per font and colour, and a string is drawn as one batch of atlas slices.
+"""
+
+# the characters every atlas holds: printable ASCII
+ATLAS_CHARACTERS = "".join(chr(code) for code in range(32, 127))
+
+# atlases are laid out in rows no wider than this
+ATLAS_WIDTH = 1024
+
+
+class TextCache:
+    def __init__(self, max_entries=512):
+        """
+        The TextCache class memoizes Font.render(). Each surface is keyed on the font, the string, the antialias flag
+        and the colour, and the least recently used surface is dropped once max_entries are cached.
+
+        :param max_entries: The number of rendered surfaces to keep, None for no limit
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def render(self, font, text, antialias, color):
+        """
+        Render text the same way Font.render() does, reusing the surface from an earlier call when there is one.
+        The returned surface is shared, so callers must not draw onto it.
+
+        :param font: The pygame Font to render with
+        :param text: The string to render
+        :param antialias: Whether to antialias the text
+        :param color: The text colour as an (r, g, b) tuple
+        :return: a pygame Surface with the rendered text
+        """
+        key = (font, text, antialias, tuple(color))
+        surface = self._entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)  # mark as most recently used
+            return surface
+
+        self.misses += 1
+        profiler.count("font.render")
+        profiler.count("surfaces")
+        surface = font.render(text, antialias, color)
+        self._entries[key] = surface
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return surface
+
+    @property
+    def hit_rate(self):
+        """
+        :return: the fraction of render() calls served from the cache, from 0.0 to 1.0
+        """
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def clear(self):
+        """
+        Forget every rendered surface and reset the counters.
+
+        :return: None
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of hits, misses, cached entries and the hit rate
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "hit_rate": self.hit_rate}
+
+
+# the cache shared by every screen in the game
+cache = TextCache()
+
+
+def render(font, text, antialias, color):
+    return cache.render(font, text, antialias, color)
+
+
+class GlyphAtlas:
+    def __init__(self, font, color, antialias=True, characters=ATLAS_CHARACTERS):
+        """
+        The GlyphAtlas class rasterizes every character of a font once, into a single surface, and remembers where
+        each one is and how far it advances the pen. Strings are then drawn with one Surface.blits() call of atlas
+        slices, without calling Font.render() at all.
+
+        :param font: The pygame Font to rasterize
+        :param color: The text colour as an (r, g, b) tuple
+        :param antialias: Whether to antialias the glyphs
+        :param characters: The characters to put in the atlas
+        """
+        self.font = font
+        self.height = font.size(characters)[1]
+        self.glyphs = {}  # character -> (area in the atlas, advance)
+        self._kerned = {}  # (character, next character) -> advance, measured the first time the pair is drawn
+
+        rendered = [(ch, font.render(ch, antialias, color), font.size(ch)[0]) for ch in characters]
+        profiler.count("font.render", len(characters))
+        profiler.count("surfaces", len(characters) + 1)
+
+        # lay the glyphs out left to right in rows
+        x = y = row_height = width = 0
+        places = []
+        for ch, surface, advance in rendered:
+            if x + surface.get_width() > ATLAS_WIDTH:
+                x, y = 0, y + row_height
+                row_height = 0
+            places.append((x, y))
+            x += surface.get_width()
+            row_height = max(row_height, surface.get_height())
+            width = max(width, x)
+
+        self.surface = pygame.Surface((max(width, 1), max(y + row_height, 1)), pygame.SRCALPHA)
+        for (ch, surface, advance), (x, y) in zip(rendered, places):
+            # adding onto the empty atlas copies the glyph exactly, alpha included
+            self.surface.blit(surface, (x, y), special_flags=pygame.BLEND_RGBA_ADD)
+            self.glyphs[ch] = (pygame.Rect(x, y, surface.get_width(), surface.get_height()), advance)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+
+    def size(self, text):
+        """
+        :param text: The string to measure
+        :return: the (width, height) the string takes up when drawn
+        """
+        return sum(self._advance(text, i) for i in range(len(text))), self.height
+
+    def _advance(self, text, i):
+        """
+        How far the pen moves after the character at text[i]. Font.size() of the pair minus the next character
+        includes the font's kerning, which a lone glyph's advance would miss; measuring doesn't rasterize anything.
+        """
+        if i + 1 == len(text):
+            return self.glyphs[text[i]][1]
+        pair = text[i:i + 2]
+        if pair not in self._kerned:
+            self._kerned[pair] = self.font.size(pair)[0] - self.font.size(pair[1])[0]
+        return self._kerned[pair]
+
+    def draw(self, surface, text, pos):
+        """
+        Draw a string with its top left corner at pos.
+
+        :param surface: The pygame Surface to draw onto
+        :param text: The string to draw; every character must be in the atlas
+        :param pos: The (x, y) position of the top left corner
+        :return: the Rect that was drawn over
+        """
+        x, y = pos
+        blits = []
+        for i, ch in enumerate(text):
+            blits.append((self.surface, (x, y), self.glyphs[ch][0]))
+            x += self._advance(text, i)
+        surface.blits(blits, doreturn=False)
+        return pygame.Rect(pos[0], y, x - pos[0], self.height)
+
+    def covers(self, text):
+        return all(ch in self.glyphs for ch in text)
+
+
+# the game only draws text in a handful of font and colour pairs, but a colour that changes every frame would otherwise
+# build a new atlas each time, so the least recently used atlas is dropped past MAX_ATLASES
+MAX_ATLASES = 32
+_atlases = OrderedDict()
+
+
+def atlas(font, color, antialias=True):
+    """
+    Get the atlas of a font in a colour, building it the first time it is asked for.
+
+    :return: a GlyphAtlas
+    """
+    key = (font, tuple(color), antialias)
+    if key in _atlases:
+        _atlases.move_to_end(key)  # mark as most recently used
+    else:
+        _atlases[key] = GlyphAtlas(font, color, antialias)
+        if len(_atlases) > MAX_ATLASES:
+            _atlases.popitem(last=False)
+    return _atlases[key]
+
+
+def draw_text(surface, font, text, pos, color, antialias=True, center=False):
+    """
+    Draw a frequently changing string from the font's glyph atlas. Characters the atlas doesn't have fall back to the
+    rendered text cache.
+
+    :param surface: The pygame Surface to draw onto
+    :param font: The pygame Font to draw with
+    :param text: The string to draw
+    :param pos: The (x, y) position of the top left corner, or of the centre when center is True
+    :param color: The text colour as an (r, g, b) tuple
+    :param antialias: Whether to antialias the text
+    :param center: Whether pos is the centre of the text instead of its top left corner
+    :return: the Rect that was drawn over
+    """
+    glyphs = atlas(font, color, antialias)
+    if not glyphs.covers(text):
+        rendered = render(font, text, antialias, color)
+        rect = rendered.get_rect(center=pos) if center else rendered.get_rect(topleft=pos)
+        surface.blit(rendered, rect)
+        return rect
+    if center:
+        width, height = glyphs.size(text)
+        pos = (pos[0] - width // 2, pos[1] - height // 2)
+    return glyphs.draw(surface, text, pos)